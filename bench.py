@@ -0,0 +1,340 @@
+# bench.py
+"""Benchmarks for the hot path stages.
+
+    python bench.py                              # run all, print a table
+    python bench.py --json results.json          # also write machine readable results
+    python bench.py --save-baseline base.json    # remember this machine's numbers
+    python bench.py --baseline base.json         # compare; exit 1 on regression
+    python bench.py --only detect,jpeg --quick
+
+Each benchmark times single calls with perf_counter_ns after a warmup and
+reports throughput and mean / p50 / p99 latency, then runs a few more calls
+under tracemalloc: alloc_kb is the largest amount of memory allocated at
+once on top of what was live before (a frame sized number means the stage
+allocates a frame per call; the frame pool keeps the hot path near zero). A benchmark regresses
+when its p50 is more than --tolerance slower than the baseline's. Numbers
+are only comparable on the same machine, so keep one baseline per device
+(the Pi, a laptop, ...).
+
+Detection runs BoxDetector.detect (what detect_brown_box wraps) on moving
+synthetic scenes from synthetic_scene.render_test_frame, with a textured
+box sized so the default profile detects it; the hit rate is reported so a
+benchmark that silently stopped detecting anything stands out. The
+detect_full_* runs repeat them with pyramid_levels=0, i.e. the whole
+pipeline at full resolution, to show what the pyramid buys, and
+detect_select_1920x1080 searches the whole coarse frame every frame instead
+of the ROI crop (DETECT_ROI_MODE). detect_parallel_{1,2,4}_1920x1080 run the
+same scene through ParallelDetector with that many worker processes.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+import config
+import overlay
+from detector import BoxDetector
+from frame_hub import FrameHub
+from mecanum_controller import MecanumController
+from motion_planner import MotionPlanner, MotionResult, SlidingLinearFit
+from odometry import MecanumOdometry
+from frame_pool import FramePool
+from parallel_detect import ParallelDetector
+from pipeline import FramePacket
+from synthetic_scene import TestScene, box_texture, render_test_frame
+from trajectory import TrajectoryBuffer
+
+
+BENCH_VERSION = 1
+RESOLUTIONS = ((640, 480), (1280, 720), (1920, 1080))
+TRAJECTORY_LENGTHS = (10, 50, 100, 250, 500)
+SCENE_FRAMES = 60       # distinct frames cycled through by the detection benchmarks
+
+
+def measure(fn, iterations: int, warmup: int) -> dict:
+    """Time `iterations` calls of fn(i) after `warmup` untimed ones."""
+    for i in range(warmup):
+        fn(i)
+    samples = np.empty(iterations, dtype=np.int64)
+    clock = time.perf_counter_ns
+    for k in range(iterations):
+        # i keeps counting from the warmup so scenes and timestamps don't jump back
+        t0 = clock()
+        fn(warmup + k)
+        samples[k] = clock() - t0
+    ms = samples / 1e6
+    return {
+        "iterations": iterations,
+        "ops_per_s": float(1000.0 / ms.mean()) if ms.mean() > 0 else float("inf"),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+def allocation_peak(fn, iterations: int, start: int = 0) -> float:
+    """KiB allocated at peak while calling fn(i) iterations times, over the starting point."""
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        for i in range(start, start + iterations):
+            fn(i)
+        return (tracemalloc.get_traced_memory()[1] - base) / 1024.0
+    finally:
+        tracemalloc.stop()
+
+
+# ----------------------------------------------------------------------
+# workloads: each returns (fn(i), extra fields for the result)
+# ----------------------------------------------------------------------
+def scene(width: int, height: int, frames: int = SCENE_FRAMES):
+    """Moving, textured, noisy box frames the default detector profile picks up."""
+    w, h = max(200, width // 8), max(170, height // 6)
+    texture = box_texture(w, h)
+    rng = np.random.default_rng(1)
+    return [
+        render_test_frame(width, height, i, box_size=(w, h), speed=8.0,
+                          texture=texture, noise=3.0, rng=rng, label=False)[0]
+        for i in range(frames)
+    ]
+
+
+def bench_detect(width: int, height: int, pyramid_levels: int = config.DETECT_PYRAMID_LEVELS,
+                 roi_mode: str = config.DETECT_ROI_MODE):
+    frames = scene(width, height)
+    detector = BoxDetector(pyramid_levels=pyramid_levels, roi_mode=roi_mode)
+    hits = [0, 0]
+
+    def fn(i):
+        box, _ = detector.detect(frames[i % len(frames)], i / 30.0)
+        hits[0] += box is not None
+        hits[1] += 1
+
+    return fn, lambda: {"hit_rate": hits[0] / hits[1] if hits[1] else 0.0}
+
+
+def bench_detect_parallel(width: int, height: int, workers: int):
+    """One frame at a time through ParallelDetector (submit, wait for it).
+
+    With the segmentation split into bands this is per-frame latency, so
+    it shows how the workers scale; the results match bench_detect's.
+    """
+    frames = scene(width, height)
+    detector = ParallelDetector(frames[0].shape, workers=workers)
+    seq = [0]
+    hits = [0, 0]
+
+    def fn(i):
+        seq[0] += 1
+        packet = FramePacket(seq=seq[0], frame=frames[i % len(frames)], timestamp=i / 30.0)
+        detector.submit(packet)
+        # frames sent while the workers are still starting up time out
+        while detector.stats()["in_flight"]:
+            detector.collect(timeout=1.0)
+        hits[0] += packet.box_position is not None
+        hits[1] += 1
+
+    def finish():
+        # runs once after timing, so it also shuts the workers down
+        timed_out = detector.stats()["timed_out"]
+        detector.close()
+        return {"hit_rate": hits[0] / hits[1] if hits[1] else 0.0, "timed_out": timed_out}
+
+    return fn, finish
+
+
+def trajectory_of(n: int):
+    traj = TrajectoryBuffer(capacity=max(n, 2), fit=SlidingLinearFit(stable=config.MOTION_FIT_STABLE))
+    t = np.arange(n) / 30.0
+    for x, y, ti in zip(900 + 300 * np.sin(t), 500 + 200 * np.cos(1.3 * t) + 40 * t, t):
+        traj.append(float(x), float(y), float(ti))
+    return traj
+
+
+def bench_planner(n: int, incremental: bool = True):
+    """incremental: the running fit the tracker keeps; else a full least squares pass."""
+    traj = trajectory_of(n)
+    last_t = traj[-1][2]
+    planner = MotionPlanner(width=1920, height=1080, clock=lambda: last_t)
+    window = traj.fit if incremental else None
+
+    def fn(i):
+        planner.compute(traj, window)
+
+    return fn, None
+
+
+def bench_mecanum():
+    controller = MecanumController()
+    motion = MotionResult(has_data=True, vx=120.0, vy=-80.0, ax=300.0, ay=-150.0)
+
+    def fn(i):
+        controller.compute(motion, 0.01)
+
+    return fn, None
+
+
+def bench_odometry():
+    odom = MecanumOdometry()
+    cmd = MecanumController().compute(
+        MotionResult(has_data=True, vx=120.0, vy=-80.0, ax=300.0, ay=-150.0), 0.01
+    )
+
+    def fn(i):
+        odom.step(cmd, 0.01)
+
+    return fn, None
+
+
+def bench_overlay(width: int, height: int, n: int = 500):
+    base = scene(width, height, frames=1)[0]
+    frame = base.copy()
+    traj = trajectory_of(n)
+    xs, ys, ts = traj.snapshot()
+    box = (int(xs[-1]), int(ys[-1]), 200, 170)
+
+    def fn(i):
+        # same work as the server overlay mode: copy, trail, box
+        np.copyto(frame, base)
+        overlay.draw_trail(frame, xs, ys, ts, ts[-1], config.TRAIL_SECONDS)
+        overlay.draw_box(frame, box)
+
+    return fn, None
+
+
+def bench_capture_test(width: int, height: int):
+    """The test mode capture stage: scene blitted into a pooled buffer."""
+    scene = TestScene(width, height)
+    pool = FramePool("bench")
+    held = []       # frames stay referenced for a while, like the pipeline queues
+
+    def fn(i):
+        frame, _ = scene.render(i, pool.acquire((height, width, 3)))
+        held.append(frame)
+        if len(held) > config.PIPELINE_QUEUE_SIZE * 3:
+            held.pop(0)
+
+    return fn, lambda: {"pool_misses": pool.misses}
+
+
+def bench_jpeg(width: int, height: int):
+    frames = scene(width, height, frames=4)
+    hub = FrameHub()
+    sizes = []
+
+    def fn(i):
+        sizes.append(len(hub.encode(frames[i % len(frames)])))
+
+    return fn, lambda: {"bytes": int(np.mean(sizes)) if sizes else 0}
+
+
+def benchmarks():
+    """name -> (factory, iterations, warmup)"""
+    table = {}
+    for w, h in RESOLUTIONS:
+        # warmup lets the background model settle before timing
+        table[f"detect_{w}x{h}"] = (lambda w=w, h=h: bench_detect(w, h), 200, 30)
+    for w, h in RESOLUTIONS:
+        # the same scenes without the pyramid, for comparison
+        table[f"detect_full_{w}x{h}"] = (lambda w=w, h=h: bench_detect(w, h, pyramid_levels=0), 100, 30)
+    # whole-frame search on every frame (DETECT_ROI_MODE = "select")
+    table["detect_select_1920x1080"] = (lambda: bench_detect(1920, 1080, roi_mode="select"), 200, 30)
+    for n in (1, 2, 4):
+        # DETECT_WORKERS scaling; only meaningful with at least n free cores
+        table[f"detect_parallel_{n}_1920x1080"] = (
+            lambda n=n: bench_detect_parallel(1920, 1080, n), 200, 30)
+    for n in TRAJECTORY_LENGTHS:
+        table[f"planner_{n}"] = (lambda n=n: bench_planner(n), 5000, 200)
+    table["planner_refit_500"] = (lambda: bench_planner(500, incremental=False), 1000, 50)
+    table["mecanum_compute"] = (bench_mecanum, 20000, 500)
+    table["odometry_step"] = (bench_odometry, 20000, 500)
+    table["overlay_1920x1080"] = (lambda: bench_overlay(1920, 1080), 300, 20)
+    table["capture_test_1920x1080"] = (lambda: bench_capture_test(1920, 1080), 300, 20)
+    for w, h in RESOLUTIONS:
+        table[f"jpeg_{w}x{h}"] = (lambda w=w, h=h: bench_jpeg(w, h), 200, 10)
+    return table
+
+
+def run(only=None, quick: bool = False) -> dict:
+    results = {}
+    for name, (factory, iterations, warmup) in benchmarks().items():
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        if quick:
+            iterations = max(20, iterations // 10)
+            warmup = min(warmup, max(5, warmup // 2))
+        fn, extra = factory()
+        result = measure(fn, iterations, warmup)
+        result["alloc_kb"] = allocation_peak(fn, min(iterations, 50), warmup + iterations)
+        if extra is not None:
+            result.update(extra())
+        results[name] = result
+        print(f"{name:<22} {result['ops_per_s']:>10.1f}/s  p50 {result['p50_ms']:>8.3f} ms"
+              f"  p99 {result['p99_ms']:>8.3f} ms  alloc {result['alloc_kb']:>8.1f} KiB"
+              + (f"  hit {100 * result['hit_rate']:.0f}%" if "hit_rate" in result else ""))
+    return {
+        "version": BENCH_VERSION,
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "cv_threads": cv2.getNumThreads(),
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Names of benchmarks whose p50 is more than tolerance slower than baseline."""
+    regressions = []
+    print(f"\n{'benchmark':<20} {'base p50':>10} {'now p50':>10} {'change':>8}")
+    for name, now in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"{name:<20} {'-':>10} {now['p50_ms']:>10.3f}      new")
+            continue
+        change = now["p50_ms"] / base["p50_ms"] - 1.0 if base["p50_ms"] > 0 else 0.0
+        flag = ""
+        if change > tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<20} {base['p50_ms']:>10.3f} {now['p50_ms']:>10.3f} {100 * change:>+7.1f}%{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the hot path stages")
+    parser.add_argument("--only", default=None, help="comma separated name prefixes, e.g. detect,jpeg")
+    parser.add_argument("--quick", action="store_true", help="10x fewer iterations")
+    parser.add_argument("--json", default=None, help="write results to this file")
+    parser.add_argument("--baseline", default=None, help="compare against this results file")
+    parser.add_argument("--save-baseline", default=None, help="write results as a new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed p50 slowdown (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    only = args.only.split(",") if args.only else None
+    current = run(only, args.quick)
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(current, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n✅ no regressions")
@@ -0,0 +1,154 @@
+# camera.py
+"""Low latency camera capture.
+
+Opens the camera with the fastest format it accepts (MJPG before YUYV: at
+1080p, raw YUYV over USB 2 tops out at a handful of fps) and the requested
+resolution, falling back to smaller ones. The driver queue is kept at one
+buffer. Drivers that ignore CAP_PROP_BUFFERSIZE are drained instead: a grab
+that returns much faster than the frame period was served from the queue,
+so it is thrown away and grabbed again.
+
+Every frame is stamped with time.monotonic() as soon as grab() returns,
+before the (relatively slow) decode in retrieve(), which is the closest
+host side estimate of when the frame left the sensor.
+"""
+
+import sys
+import time
+
+import cv2
+
+import config
+
+
+def fourcc_to_str(value) -> str:
+    code = int(value)
+    return "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4)).strip("\0")
+
+
+class CameraCapture:
+    def __init__(
+        self,
+        index: int = config.CAMERA_INDEX,
+        width: int = config.CAMERA_WIDTH,
+        height: int = config.CAMERA_HEIGHT,
+        fps: float = config.CAMERA_FPS,
+    ):
+        self.index = index
+        self.width = width
+        self.height = height
+        self.fps = fps
+
+        self.cap = None
+        self.fourcc = None
+        self.buffer_size = None         # what the driver reports after our request
+        self.drain = False              # grab-and-discard stale frames
+        self.drained = 0                # stale frames thrown away
+        self.frames = 0
+        self._last_grab = None
+
+    # ------------------------------------------------------------------
+    # negotiation
+    # ------------------------------------------------------------------
+    def _resolutions(self):
+        yield self.width, self.height
+        for w, h in config.CAMERA_FALLBACK_RESOLUTIONS:
+            if w * h < self.width * self.height:
+                yield w, h
+
+    def _apply(self, fourcc: str, width: int, height: int) -> bool:
+        """Request a mode; True if the driver accepted it as asked."""
+        cap = self.cap
+        # V4L2 wants the pixel format before the frame size
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if self.fps:
+            cap.set(cv2.CAP_PROP_FPS, self.fps)
+        return (
+            fourcc_to_str(cap.get(cv2.CAP_PROP_FOURCC)) == fourcc
+            and int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) == width
+            and int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) == height
+        )
+
+    def _negotiate(self):
+        for fourcc in config.CAMERA_FOURCCS:
+            for width, height in self._resolutions():
+                if self._apply(fourcc, width, height):
+                    return
+        # nothing matched exactly: keep whatever the driver settled on
+
+    def open(self) -> bool:
+        backend = cv2.CAP_V4L2 if sys.platform.startswith('linux') else cv2.CAP_ANY
+        self.cap = cv2.VideoCapture(self.index, backend)
+        if not self.cap.isOpened():
+            self.cap.release()
+            self.cap = None
+            return False
+
+        self._negotiate()
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, config.CAMERA_BUFFER_SIZE)
+        self.buffer_size = int(self.cap.get(cv2.CAP_PROP_BUFFERSIZE))
+        # 0 means the backend can't report it, assume the default queue
+        self.drain = config.CAMERA_DRAIN and self.buffer_size != 1
+
+        self.fourcc = fourcc_to_str(self.cap.get(cv2.CAP_PROP_FOURCC))
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        reported_fps = self.cap.get(cv2.CAP_PROP_FPS)
+        if reported_fps > 0:
+            self.fps = reported_fps
+
+        # one frame in the final mode proves the stream actually runs
+        frame, _ = self.read()
+        if frame is None:
+            self.release()
+            return False
+        return True
+
+    # ------------------------------------------------------------------
+    # capture
+    # ------------------------------------------------------------------
+    def read(self, out=None):
+        """Return (frame, monotonic capture time), or (None, None) on failure.
+
+        out is an optional array to decode into; the frame is out unless
+        its shape doesn't match the stream (then OpenCV allocates a new one).
+        """
+        if self.cap is None or not self.cap.grab():
+            return None, None
+        t = time.monotonic()
+
+        if self.drain and self._last_grab is not None and self.fps:
+            # a frame that arrives long before the next one is due was queued
+            fast = 0.25 / self.fps
+            for _ in range(config.CAMERA_MAX_DRAIN):
+                if t - self._last_grab >= fast:
+                    break
+                self._last_grab = t
+                if not self.cap.grab():
+                    return None, None
+                t = time.monotonic()
+                self.drained += 1
+        self._last_grab = t
+
+        ok, frame = self.cap.retrieve(out)
+        if not ok or frame is None:
+            return None, None
+        self.frames += 1
+        return frame, t
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def info(self) -> dict:
+        return {
+            "resolution": f"{self.width}x{self.height}",
+            "fourcc": self.fourcc,
+            "fps": self.fps,
+            "buffer_size": self.buffer_size,
+            "drain": self.drain,
+            "drained": self.drained,
+        }
@@ -0,0 +1,292 @@
+# checks.py
+"""Headless end-to-end checks for behavior the benchmarks don't cover.
+
+    python checks.py                     # run all
+    python checks.py --only two_targets
+
+Each check drives the real classes on synthetic input (no camera; the
+serial checks talk to fake_stm32 on a pty instead of the motor board) and
+returns a list of failure messages; the script exits 1 if any check fails.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import config
+from detector import BoxDetector
+from fake_stm32 import FakeSTM32
+from frame_pool import FramePool
+from mecanum_controller import MotorCommand
+from multi_tracker import MultiTargetTracker
+from pipeline import DropOldestQueue, FramePacket
+from serial_link import (
+    FrameParser, SerialLinkManager, SerialWriter, decode_binary, encode_binary, to_percents,
+)
+from synthetic_scene import box_texture
+
+
+# ----------------------------------------------------------------------
+# detection + multi-target tracking
+# ----------------------------------------------------------------------
+def two_target_frames(width: int = 1280, height: int = 720, frames: int = 120):
+    """Two textured boxes going back and forth in opposite directions.
+
+    Yields (frame, [(cx, cy), (cx, cy)]) with the true box centres.
+    """
+    w, h = 200, 170
+    textures = (box_texture(w, h, seed=0), box_texture(w, h, seed=5))
+    rows = (height // 4, 3 * height // 4)
+    rng = np.random.default_rng(0)
+    span = width - w
+    for i in range(frames):
+        frame = np.full((height, width, 3), 90, dtype=np.uint8)
+        noisy = frame + rng.normal(0.0, 3.0, frame.shape)
+        frame = np.clip(noisy, 0, 255).astype(np.uint8)
+
+        x_a = abs((24 * i) % (2 * span) - span)     # bounces off the edges
+        x_b = span - x_a
+        centres = []
+        for x, y, texture in ((x_a, rows[0], textures[0]), (x_b, rows[1], textures[1])):
+            y0 = y - h // 2
+            frame[y0:y0 + h, x:x + w] = texture
+            centres.append((x + w // 2, y))
+        yield frame, centres
+
+
+def check_two_targets(warmup: int = 30, tolerance_px: float = 60.0) -> list:
+    """Both boxes keep one track ID each once the background has settled.
+
+    Runs in both ROI modes. In "crop" mode the second box is only searched on
+    whole-frame refreshes, so it is scored on those frames; the selected
+    target must be updated on every frame.
+    """
+    failures = []
+    for mode in ("select", "crop"):
+        failures += [f"{mode}: {msg}" for msg in _two_targets(mode, warmup, tolerance_px)]
+    return failures
+
+
+def _two_targets(roi_mode: str, warmup: int, tolerance_px: float) -> list:
+    detector = BoxDetector(roi_mode=roi_mode)
+    tracker = MultiTargetTracker(1280, 720)
+    ids = ([], [])          # id of the track closest to each true box, per frame
+    lost = 0                # crop frames where the selected target wasn't updated
+    crop_frames = 0
+
+    for i, (frame, centres) in enumerate(two_target_frames()):
+        t = i / 30.0
+        box, _ = detector.detect(frame, t, tracker.predicted_box(t))
+        selected = tracker.step(detector.candidates, t)
+        if i < warmup:
+            continue
+        if not detector.searched_full:
+            crop_frames += 1
+            if selected is None or not selected.updated:
+                lost += 1
+            continue
+        for k, (cx, cy) in enumerate(centres):
+            hit = None
+            for tr in tracker.tracks:
+                if tr.updated and np.hypot(tr.box[0] - cx, tr.box[1] - cy) < tolerance_px:
+                    hit = tr.id
+            ids[k].append(hit)
+
+    failures = []
+    for k, seen in enumerate(ids):
+        missed = sum(tid is None for tid in seen)
+        distinct = {tid for tid in seen if tid is not None}
+        if missed > len(seen) // 10:
+            failures.append(f"box {k}: not tracked in {missed}/{len(seen)} frames")
+        if len(distinct) > 1:
+            failures.append(f"box {k}: track ID changed ({sorted(distinct)})")
+    if ids[0] and ids[1] and set(ids[0]) & set(ids[1]) - {None}:
+        failures.append("both boxes matched the same track")
+    if roi_mode == "crop" and crop_frames == 0:
+        failures.append("never searched only the ROI")
+    if lost > crop_frames // 10:
+        failures.append(f"selected target lost in {lost}/{crop_frames} ROI frames")
+    return failures
+
+
+# ----------------------------------------------------------------------
+# frame pool
+# ----------------------------------------------------------------------
+def _queued(buf):
+    queue = DropOldestQueue(2)
+    queue.put(buf)
+    return queue
+
+
+def check_frame_pool() -> list:
+    """Dropped buffers are reused; held ones (however held) are not.
+
+    Fails if the pool's idle reference count baseline stops matching the
+    interpreter: either nothing is ever reused or held buffers are.
+    """
+    shape = (36, 64, 3)
+    pool = FramePool("check")
+    failures = []
+
+    for _ in range(5):
+        pool.acquire(shape)     # dropped right away
+    if pool.misses != 1:
+        failures.append(f"dropped buffers not reused: {pool.misses} allocations for 5 acquires")
+
+    holders = {
+        "list": lambda buf: [buf],
+        "queue": _queued,
+        "packet": lambda buf: FramePacket(seq=1, frame=buf, timestamp=0.0),
+        "view": lambda buf: buf[1:],
+    }
+    for name, hold in holders.items():
+        buf = pool.acquire(shape)
+        held_id = id(buf)
+        holder = hold(buf)
+        del buf
+        other = pool.acquire(shape)
+        if id(other) == held_id:
+            failures.append(f"buffer held by a {name} was handed out again")
+        del holder, other
+        misses = pool.misses
+        pool.acquire(shape)
+        if pool.misses != misses:
+            failures.append(f"buffer not reused after its {name} was dropped")
+
+    # another thread acquiring sees the same baseline
+    misses = pool.misses
+    def drop_three():
+        for _ in range(3):
+            pool.acquire(shape)
+
+    worker = threading.Thread(target=drop_three)
+    worker.start()
+    worker.join()
+    if pool.misses != misses:
+        failures.append("idle buffers not reused from another thread")
+    return failures
+
+
+# ----------------------------------------------------------------------
+# motor link against fake_stm32 (pty, Linux / macOS)
+# ----------------------------------------------------------------------
+def wait_for(condition, timeout: float = 3.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def send_and_wait(writer: SerialWriter, fake: FakeSTM32, cmd: MotorCommand) -> bool:
+    """Submit cmd and wait until the fake board has received it."""
+    pcts = to_percents(cmd)
+    writer.submit(cmd)
+    return wait_for(lambda: bool(fake.commands) and fake.commands[-1][1] == pcts)
+
+
+def check_serial_crc() -> list:
+    """Binary frames survive the round trip, corrupt ones are rejected."""
+    failures = []
+    for seq, pcts in ((0, (0, 0, 0, 0)), (1, (100, -100, 50, -1)), (0xFFFF, (-100, 100, 7, 99))):
+        frame = encode_binary(pcts, seq)
+        if decode_binary(frame) != (seq, pcts):
+            failures.append(f"round trip of {pcts} seq {seq} gave {decode_binary(frame)}")
+        for i in range(2, len(frame)):
+            bad = bytearray(frame)
+            bad[i] ^= 0x10
+            if FrameParser().feed(bytes(bad)):
+                failures.append(f"frame with byte {i} flipped was accepted")
+                break
+
+    fake = FakeSTM32().plug()
+    writer = SerialWriter(protocol="binary")
+    link = SerialLinkManager(writer, ports=[fake.path])
+    writer.start()
+    link.start()
+    try:
+        if not wait_for(lambda: link.state == "connected"):
+            return failures + [f"no binary link to the fake board (state {link.state})"]
+        if link.device_id != config.SERIAL_DEVICE_ID:
+            failures.append(f"identify reply {link.device_id!r}")
+        for cmd in (MotorCommand(0.5, -0.5, 1.0, -1.0), MotorCommand(0.1, 0.2, 0.3, 0.4)):
+            if not send_and_wait(writer, fake, cmd):
+                failures.append(f"fake board never received {to_percents(cmd)}")
+        if not wait_for(lambda: link.latency_ms is not None):
+            failures.append("no ping reply")
+    finally:
+        link.stop()
+        writer.stop()
+        fake.unplug()
+    return failures
+
+
+def check_serial_reconnect() -> list:
+    """The link comes back after the board is unplugged and plugged in again."""
+    failures = []
+    path = os.path.join(tempfile.mkdtemp(), "ttyFAKE0")
+    fake = FakeSTM32(link=path).plug()
+    writer = SerialWriter(protocol="ascii")
+    link = SerialLinkManager(writer, ports=[path])
+    writer.start()
+    link.start()
+    try:
+        if not wait_for(lambda: link.state == "connected"):
+            return [f"no link to the fake board (state {link.state})"]
+        if fake.identifies:
+            failures.append("ascii probe sent ?ID to a board that may not know it")
+        if not send_and_wait(writer, fake, MotorCommand(0.3, 0.3, 0.3, 0.3)):
+            failures.append("no command before the unplug")
+
+        fake.unplug()
+        # the next write fails and drops the link
+        writer.submit(MotorCommand(-0.3, -0.3, -0.3, -0.3))
+        if not wait_for(lambda: link.state != "connected"):
+            failures.append("link still connected after the unplug")
+        fake.plug()
+        if not wait_for(lambda: link.state == "connected" and link.reconnects == 1, timeout=5.0):
+            return failures + [f"no reconnect (state {link.state}, {link.reconnects} reconnects)"]
+        if not send_and_wait(writer, fake, MotorCommand(0.6, 0.0, 0.0, 0.6)):
+            failures.append("no command after the reconnect")
+    finally:
+        link.stop()
+        writer.stop()
+        fake.unplug()
+        os.rmdir(os.path.dirname(path))
+    return failures
+
+
+CHECKS = {
+    "two_targets": check_two_targets,
+    "frame_pool": check_frame_pool,
+    "serial_crc": check_serial_crc,
+    "serial_reconnect": check_serial_reconnect,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the headless end-to-end checks")
+    parser.add_argument("--only", default=None, help="comma separated check names")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(CHECKS)
+    failed = 0
+    for name in names:
+        failures = CHECKS[name]()
+        if failures:
+            failed += 1
+            print(f"❌ {name}")
+            for msg in failures:
+                print(f"   {msg}")
+        else:
+            print(f"✅ {name}")
+
+    if failed:
+        print(f"\n{failed} check(s) failed")
+        sys.exit(1)
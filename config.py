@@ -9,6 +9,13 @@ hardware endpoints live here.
 CAMERA_INDEX = 0
 CAMERA_WIDTH = 1920
 CAMERA_HEIGHT = 1080
+CAMERA_FPS = 30
+# capture negotiation: first accepted format wins, then smaller resolutions
+CAMERA_FOURCCS = ["MJPG", "YUYV"]
+CAMERA_FALLBACK_RESOLUTIONS = [(1920, 1080), (1280, 720), (640, 480)]
+CAMERA_BUFFER_SIZE = 1        # driver side frame queue
+CAMERA_DRAIN = True           # grab-and-discard when the driver ignores the above
+CAMERA_MAX_DRAIN = 4          # stale frames dropped per read at most
 
 # minimum number of trajectory points required before computing a
 # regression line / desired motion
@@ -34,3 +41,151 @@ PID_OUTPUT_CLAMP = (-1.5, 1.5)
 SERIAL_PORT = "/dev/ttyACM0"
 SERIAL_BAUDRATE = 115200
 SERIAL_TIMEOUT = 0.02
+SERIAL_PROTOCOL = "ascii"    # "ascii" (existing firmware) or "binary" (framed, seq + CRC)
+SERIAL_KEEPALIVE_S = 0.2     # resend an unchanged command this often
+# link manager: SERIAL_PORT is probed first, then these patterns
+SERIAL_PORT_PATTERNS = ["/dev/ttyACM*", "/dev/ttyUSB*"]
+SERIAL_PORT_PATTERNS_MAC = ["/dev/tty.usbmodem*", "/dev/tty.usbserial*"]
+SERIAL_DEVICE_ID = "TCAN"    # identify reply expected from our STM32 (4 chars)
+SERIAL_HANDSHAKE_TIMEOUT_S = 0.5
+SERIAL_REQUIRE_HANDSHAKE = False  # False: fall back to a silent port (old firmware)
+SERIAL_ASCII_IDENTIFY = False  # ascii: send "?ID" when probing (firmware that answers it)
+SERIAL_PING_S = 1.0          # latency probe interval on a verified link
+SERIAL_PING_MISSES = 3       # unanswered pings before the link counts as lost
+SERIAL_RECONNECT_MIN_S = 0.5 # reconnect backoff, doubles up to the max
+SERIAL_RECONNECT_MAX_S = 8.0
+
+# vision pipeline
+PIPELINE_QUEUE_SIZE = 2   # frames buffered between stages (oldest dropped)
+TRAIL_SECONDS = 3.0       # how long trajectory points are kept
+TEST_MODE_FPS = 30.0      # synthetic frame rate when no camera is present
+
+# MJPEG stream
+STREAM_MAX_WIDTH = 1280     # frames wider than this are downscaled once per tick
+STREAM_JPEG_QUALITY = 80
+# per-viewer stream profiles; /video_feed?profile=low (or width=, quality=,
+# fps=, adaptive=0). Slow viewers step down this ladder and back up.
+STREAM_PROFILES = {
+    "high": {"max_width": STREAM_MAX_WIDTH, "quality": STREAM_JPEG_QUALITY, "fps": 30.0},
+    "medium": {"max_width": 960, "quality": 65, "fps": 15.0},
+    "low": {"max_width": 640, "quality": 50, "fps": 8.0},
+}
+STREAM_PROFILE_ORDER = ["high", "medium", "low"]
+STREAM_DEFAULT_PROFILE = "high"
+STREAM_SLOW_FRACTION = 0.5    # a send longer than this share of the frame budget is slow
+STREAM_FAST_FRACTION = 0.15   # ...shorter than this share is fast
+STREAM_DOWNGRADE_AFTER = 3    # consecutive slow sends before stepping down
+STREAM_UPGRADE_AFTER = 60     # consecutive fast sends before stepping up
+STREAM_SNAPSHOT_QUALITY = 95  # /snapshot JPEG quality (full resolution)
+# "client": the browser draws trail / box / fit on a canvas over the raw
+# stream; "server": drawn into the frame before encoding (old behavior)
+OVERLAY_MODE = "client"
+
+# detector pyramid / ROI
+DETECT_PYRAMID_LEVELS = 2       # motion segmentation at 1/2**N scale (0 = full res)
+DETECT_ROI_TRACKING = True      # use the predicted position while tracking
+# "crop": search only the ROI around the predicted position (cheapest), with a
+#   whole-frame search every DETECT_ROI_FULL_EVERY frames and after a miss so
+#   the multi-target tracker still sees the other blobs; between refreshes
+#   those tracks coast on their Kalman prediction.
+# "select": always search the whole coarse frame; the ROI only picks which
+#   blob is refined as the primary box (every target updated every frame)
+DETECT_ROI_MODE = "crop"
+# Higher saves more, but the other tracks coast longer: at 3+ a box reversing
+# at 24 px/frame leaves the track gate and gets a new ID (checks.py two_targets)
+DETECT_ROI_FULL_EVERY = 2       # 0 = whole frame only after a miss
+DETECT_ROI_MARGIN = 2.0         # ROI size as a multiple of the last box size
+DETECT_TRACK_MAX_MISSES = 5     # frames without a hit before the ROI is dropped
+DETECT_FILTER_MODE = "components"  # "contours" (per-contour loop) or "components" (vectorized)
+DETECT_REFINE_EDGE_THRESH = 40  # min 3x3 gray level spread counted as an edge when refining
+
+# hybrid detection: full detector every N frames, LK optical flow in between
+DETECT_HYBRID = False
+HYBRID_MIN_INTERVAL = 1       # N bounds; N adapts to CPU headroom
+HYBRID_MAX_INTERVAL = 8
+HYBRID_MIN_CONFIDENCE = 0.5   # fraction of flow points kept; below -> full detection
+HYBRID_LOW_LOAD = 0.5         # detect more often below this share of the frame period
+HYBRID_HIGH_LOAD = 0.8        # detect less often above it
+
+# multi-core detection: each worker process downscales and background
+# subtracts one horizontal band of every frame from shared memory slots; the
+# search and refine (with the ROI) then run once per frame in the pipeline.
+# Same results as the single process path when the frame height is a
+# multiple of 2**DETECT_PYRAMID_LEVELS. Scaling: bench.py --only detect_parallel
+# (0 = detect in the pipeline thread; overrides DETECT_HYBRID)
+DETECT_WORKERS = 0
+DETECT_REORDER_TIMEOUT_S = 0.5  # stop waiting for a frame's result after this
+
+# detector profiles: overrides on top of detector.DetectorProfile defaults
+# (defaults = any color, box-sized moving blob). Selectable from the dashboard.
+DETECTOR_PROFILE = "moving_box"
+DETECTOR_PROFILES = {
+    "moving_box": {},
+    "cardboard_box": {
+        "color_h_min": 5, "color_h_max": 30,
+        "color_s_min": 40, "color_s_max": 200,
+        "color_v_min": 40, "color_v_max": 230,
+    },
+    "any_moving_object": {
+        "area_min": 2000, "width_min": 40, "height_min": 40,
+        "aspect_min": 0.1, "aspect_max": 10.0, "solidity_min": 0.0,
+    },
+}
+
+# trajectory regression: Welford style centered sums (True) or raw sums (False)
+MOTION_FIT_STABLE = True
+
+# target Kalman filter (constant acceleration, image space)
+KALMAN_MEAS_STD = 8.0        # centroid noise in px
+KALMAN_JERK_STD = 2000.0     # process noise, px/s^3
+KALMAN_INIT_VEL_STD = 1500.0 # px/s uncertainty for a new track
+KALMAN_INIT_ACC_STD = 3000.0 # px/s^2 uncertainty for a new track
+KALMAN_MAX_COAST_S = 0.5     # drop the track after this long without a hit
+CONTROL_LATENCY_S = 0.1      # camera-to-motor latency the planner leads by
+
+# fixed-rate control loop (PID, odometry, STM32 writes)
+CONTROL_RATE_HZ = 100.0
+
+# dashboard telemetry: one coalesced 'telemetry' packet per tick
+TELEMETRY_HZ = 20.0          # independent of camera fps and control rate
+TELEMETRY_MAX_IN_FLIGHT = 2  # unacked packets before a client gets skipped
+TELEMETRY_ACK_TIMEOUT_S = 2.0  # give up on lost acks after this long
+TELEMETRY_KEYFRAME_EVERY = 20  # every Nth packet repeats all values (0 = only on connect)
+TELEMETRY_BINARY = True      # packed float32 arrays instead of JSON (see wire.py)
+TRAJECTORY_SNAPSHOT_POINTS = 800  # cap / default for the decimated snapshot on connect
+
+# latency metrics: /metrics (Prometheus text) and the pipeline_stats event
+METRICS_BUCKETS_S = [
+    0.0005, 0.001, 0.002, 0.003, 0.005, 0.0075, 0.010, 0.015, 0.020, 0.030,
+    0.040, 0.050, 0.075, 0.100, 0.150, 0.200, 0.300, 0.500, 1.0, 2.0, 5.0,
+]
+METRICS_WINDOW_S = 60.0      # rolling window for p50 / p99
+METRICS_WINDOW_SLOTS = 6     # window resolution (slots of WINDOW_S / SLOTS seconds)
+METRICS_EMIT_S = 1.0         # pipeline_stats event interval
+
+# reusable frame buffers (frame_pool.py). Frames held by the pipeline queues,
+# the stream and the recorder's queue count against this; beyond it every
+# frame is a fresh allocation again (FramePool.misses keeps counting)
+FRAME_POOL_MAX_BUFFERS = 12
+
+# session recording (replay with: python replay.py recordings/<session>)
+RECORD_DIR = None            # e.g. "recordings"; None = don't record
+RECORD_ENCODING = "jpeg"     # "jpeg" (compact) or "raw" (exact, ~6 MB per 1080p frame)
+RECORD_JPEG_QUALITY = 90
+RECORD_CHUNK_FRAMES = 300    # frames per chunk file
+RECORD_QUEUE_SIZE = 64       # frames / commands waiting for the writer before dropping
+
+# multi-target tracking
+TRACK_GATE_PX = 150.0        # max prediction-to-detection distance for a match
+TRACK_MIN_HITS = 3           # hits before a track may become the target
+TRACK_MAX_TRACKS = 12
+TARGET_POLICY = "largest"    # "largest", "center" or "oldest"; sticky until lost
+
+# split deployment: Flask / Socket.IO in a separate web process, fed encoded
+# frames through shared memory and telemetry through a local queue
+WEB_SPLIT_PROCESS = False
+WEB_HOST = "0.0.0.0"
+WEB_PORT = 5000
+WEB_EVENT_QUEUE_SIZE = 256    # telemetry events buffered before dropping
+WEB_COMMAND_QUEUE_SIZE = 64   # dashboard commands buffered before dropping
+WEB_PROCESS_NICE = 5          # lower the web process priority (0 = unchanged)
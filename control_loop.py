@@ -0,0 +1,104 @@
+# control_loop.py
+"""Fixed-rate control thread, decoupled from the camera frame rate.
+
+The vision pipeline only updates the target state (tracks, trajectory).
+PID, odometry and the STM32 write run here on a steady cadence, with dt
+measured on the monotonic clock instead of derived from frame timestamps,
+so a camera stall no longer stretches the controller's time step.
+
+Ticks are scheduled against absolute deadlines (next += period) so the
+rate does not drift. A tick that runs past its deadline counts as an
+overrun; the schedule then restarts from now instead of bursting through
+the missed ticks.
+"""
+
+import threading
+import time
+from typing import Callable
+
+
+class FixedRateLoop:
+    """Call fn(dt, now) at rate_hz on its own thread; now is time.monotonic()."""
+
+    def __init__(self, name: str, fn: Callable, rate_hz: float):
+        if rate_hz <= 0:
+            raise ValueError("rate_hz must be positive")
+        self.name = name
+        self.fn = fn
+        self.rate_hz = rate_hz
+        self.period = 1.0 / rate_hz
+
+        self.ticks = 0
+        self.overruns = 0
+        self.errors = 0
+        self.period_ms = 0.0        # measured tick-to-tick period (EMA)
+        self.jitter_ms = 0.0        # |measured period - nominal| (EMA)
+        self.max_jitter_ms = 0.0
+        self.work_ms = 0.0          # time spent inside fn (EMA)
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._loop, name=f"loop-{self.name}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 1.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        deadline = time.monotonic()
+        last = None
+        while not self._stop.is_set():
+            now = time.monotonic()
+            dt = self.period if last is None else now - last
+            last = now
+
+            try:
+                self.fn(dt, now)
+            except Exception as e:
+                self.errors += 1
+                print(f"{self.name} loop error: {e}")
+            done = time.monotonic()
+            self._record(dt, done - now)
+
+            deadline += self.period
+            if done > deadline:
+                self.overruns += 1
+                deadline = done
+            else:
+                self._stop.wait(deadline - done)
+
+    def _record(self, dt: float, work: float):
+        a = 0.05
+        period_ms = dt * 1000.0
+        jitter_ms = abs(dt - self.period) * 1000.0
+        work_ms = work * 1000.0
+        self.ticks += 1
+        if self.ticks == 1:
+            self.period_ms, self.jitter_ms, self.work_ms = period_ms, 0.0, work_ms
+            return
+        self.period_ms += a * (period_ms - self.period_ms)
+        self.jitter_ms += a * (jitter_ms - self.jitter_ms)
+        self.work_ms += a * (work_ms - self.work_ms)
+        if jitter_ms > self.max_jitter_ms:
+            self.max_jitter_ms = jitter_ms
+
+    def stats(self) -> dict:
+        return {
+            "rate_hz": self.rate_hz,
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "errors": self.errors,
+            "period_ms": round(self.period_ms, 3),
+            "jitter_ms": round(self.jitter_ms, 3),
+            "max_jitter_ms": round(self.max_jitter_ms, 3),
+            "work_ms": round(self.work_ms, 3),
+        }
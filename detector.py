@@ -0,0 +1,608 @@
+# detector.py
+"""Moving box detector used by ArducamTracker.detect_brown_box.
+
+Pyramid mode runs motion segmentation on a downscaled copy of the frame and
+then refines the box at full resolution inside a region of interest (ROI)
+around the coarse hit. While a track is active, the blob near the
+predicted position is the primary box that gets refined. In "crop" ROI mode
+only a crop around that position is searched, with a whole-frame search
+every few frames so the other blobs still become candidates; in "select"
+mode every frame is searched whole.
+"""
+
+from dataclasses import dataclass, asdict
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+import config
+from frame_pool import FramePool
+
+
+@dataclass
+class DetectorProfile:
+    """Color / motion / shape thresholds for one kind of target."""
+    name: str = "moving_box"
+
+    # ==========================
+    # TUNABLE PARAMETERS - COLOR
+    # ==========================
+    # OpenCV HSV ranges:
+    #   H: 0..179, S: 0..255, V: 0..255
+    # h_min > h_max wraps around through red (e.g. 170..10)
+    color_h_min: int = 0      # min hue (0 = red, 30 = yellow, 60 = green)
+    color_h_max: int = 179    # max hue (up to olive / muted green)
+    color_s_min: int = 0      # min saturation (increase to reject gray/skin)
+    color_s_max: int = 255    # max saturation (decrease to reject vivid colors)
+    color_v_min: int = 0      # min value (increase to ignore very dark areas)
+    color_v_max: int = 255    # max value (decrease to ignore very bright glare)
+
+    # ============================
+    # TUNABLE PARAMETERS - MOTION
+    # ============================
+    # Background subtractor learning rate:
+    #   higher -> adapts faster, background updates quickly
+    #   lower  -> adapts slower, motion persists longer
+    motion_learning_rate: float = 0.9
+
+    # Threshold on bg subtractor output:
+    #   lower -> more pixels considered moving (noisier)
+    #   higher -> fewer pixels considered moving
+    motion_binary_thresh: int = 15
+
+    # ==========================
+    # TUNABLE PARAMETERS - SHAPE
+    # ==========================
+    # All sizes are in full resolution pixels; they are scaled to the
+    # pyramid level automatically.
+    area_min: float = 15000      # min area for a contour to be considered
+    area_max: float = 500_000    # max area (probably never hit but kept as guard)
+
+    # Minimum width and height of bounding rectangle
+    width_min: float = 150
+    height_min: float = 150
+
+    # Acceptable width / height ratio
+    aspect_min: float = 0.3
+    aspect_max: float = 3.0
+
+    # Solidity filter (area / convex_hull_area)
+    #   closer to 1 -> filled, compact shapes
+    solidity_min: float = 0.7
+
+    # Kernel size for morphology (noise cleaning)
+    morph_kernel_size: int = 3
+
+    @classmethod
+    def from_config(cls, name: str) -> "DetectorProfile":
+        """Build a named profile from config.DETECTOR_PROFILES overrides."""
+        overrides = config.DETECTOR_PROFILES.get(name)
+        if overrides is None:
+            raise KeyError(f"unknown detector profile: {name}")
+        return cls(name=name, **overrides)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class CompiledProfile:
+    """Immutable, precomputed form of a DetectorProfile.
+
+    Everything that used to be rebuilt on each call (kernels, HSV bounds) is
+    built here once. The color gate is a per-channel uint8 lookup table, and
+    `color_gate_active` is False when the bounds cover the whole HSV cube so
+    the detector can skip the HSV stage entirely.
+    """
+
+    def __init__(self, profile: DetectorProfile):
+        self.profile = profile
+        self.name = profile.name
+        self.learning_rate = profile.motion_learning_rate
+        self.binary_thresh = profile.motion_binary_thresh
+        self.aspect_min = profile.aspect_min
+        self.aspect_max = profile.aspect_max
+        self.solidity_min = profile.solidity_min
+
+        k = max(1, int(profile.morph_kernel_size))
+        self.kernel = np.ones((k, k), np.uint8)
+
+        h_band = self._band(profile.color_h_min, profile.color_h_max, 180, wrap=True)
+        s_band = self._band(profile.color_s_min, profile.color_s_max, 256)
+        v_band = self._band(profile.color_v_min, profile.color_v_max, 256)
+        self.color_gate_active = not (h_band[:180].all() and s_band.all() and v_band.all())
+
+        # (256, 1, 3) table for cv2.LUT on an HSV image: 255 inside the band
+        lut = np.zeros((256, 1, 3), dtype=np.uint8)
+        lut[:, 0, 0] = h_band * 255
+        lut[:, 0, 1] = s_band * 255
+        lut[:, 0, 2] = v_band * 255
+        self.color_lut = lut
+
+        self._thresholds = {}
+
+    @staticmethod
+    def _band(lo: int, hi: int, size: int, wrap: bool = False):
+        idx = np.arange(256)
+        lo = int(max(0, lo))
+        hi = int(min(size - 1, hi))
+        if wrap and lo > hi:
+            band = (idx >= lo) | (idx <= hi)
+        else:
+            band = (idx >= lo) & (idx <= hi)
+        return band.astype(np.uint8)
+
+    def thresholds(self, scale: float) -> dict:
+        """Shape thresholds expressed in pixels of an image scaled by `scale`."""
+        thr = self._thresholds.get(scale)
+        if thr is None:
+            p = self.profile
+            thr = {
+                "area_min": p.area_min * scale * scale,
+                "area_max": p.area_max * scale * scale,
+                "width_min": p.width_min * scale,
+                "height_min": p.height_min * scale,
+            }
+            self._thresholds[scale] = thr
+        return thr
+
+    def color_mask(self, bgr, scratch=None, out=None):
+        """255 where the pixel falls inside the HSV band, else 0.
+
+        scratch is an optional (H, W, 3) uint8 array at least as large as
+        bgr; the HSV conversion and lookup then happen in place in it. out
+        is an optional (H, W) uint8 array for the result.
+        """
+        if scratch is not None:
+            scratch = scratch[:bgr.shape[0], :bgr.shape[1]]
+        hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV, scratch)
+        hsv = cv2.LUT(hsv, self.color_lut, hsv)
+        # the table maps each channel to 0 or 255: inside the band = all three 255
+        return cv2.inRange(hsv, (255, 255, 255), (255, 255, 255), out)
+
+
+class BoxDetector:
+    def __init__(
+        self,
+        profile: Optional[DetectorProfile] = None,
+        pyramid_levels: int = config.DETECT_PYRAMID_LEVELS,
+        roi_tracking: bool = config.DETECT_ROI_TRACKING,
+        filter_mode: str = config.DETECT_FILTER_MODE,
+        roi_mode: str = config.DETECT_ROI_MODE,
+    ):
+        if profile is None:
+            profile = DetectorProfile.from_config(config.DETECTOR_PROFILE)
+        self.profile = CompiledProfile(profile)
+
+        # =====================
+        #    PYRAMID / ROI
+        # =====================
+        self.pyramid_levels = max(0, int(pyramid_levels))
+        self.scale = 1.0 / (2 ** self.pyramid_levels)
+        self.roi_tracking = roi_tracking
+        # "crop": search only the ROI, whole frame every full_every frames
+        # "select": search the whole frame, the ROI picks the primary blob
+        if roi_mode not in ("crop", "select"):
+            raise ValueError(f"unknown ROI mode: {roi_mode}")
+        self.roi_mode = roi_mode
+        self.full_every = max(0, int(config.DETECT_ROI_FULL_EVERY))   # 0 = only after a miss
+        self._since_full = 0
+        # True if the last detect() searched the whole coarse frame
+        self.searched_full = True
+        self.roi_margin = config.DETECT_ROI_MARGIN      # ROI size relative to box size
+        self.track_max_misses = config.DETECT_TRACK_MAX_MISSES
+        # refine without a color gate: 3x3 gradient for edges, and one coarse
+        # pixel (odd sized) to grow the upsampled blob by
+        self._edge_kernel = np.ones((3, 3), dtype=np.uint8)
+        grow = int(round(1 / self.scale)) | 1
+        self._support_kernel = np.ones((grow, grow), dtype=np.uint8)
+
+        # "contours": per-contour Python loop
+        # "components": vectorized connectedComponentsWithStats gates
+        if filter_mode not in ("contours", "components"):
+            raise ValueError(f"unknown filter mode: {filter_mode}")
+        self.filter_mode = filter_mode
+
+        # every blob that passed the gates on the last frame, full resolution
+        # rows of [cx, cy, w, h, area], largest first
+        self.candidates = np.empty((0, 5), dtype=np.float32)
+
+        self.bg_subtractor = cv2.createBackgroundSubtractorMOG2(
+            history=200,
+            varThreshold=16,
+            detectShadows=False
+        )
+
+        # per frame buffers, reused while the frame size stays the same
+        self._coarse = None
+        self._motion_raw = None
+        self._hsv = None
+        self._work = {}             # name -> work array, see _buffer()
+        self._cc_stats = None       # connectedComponentsWithStats outputs,
+        self._cc_centroids = None   # reused while the component count repeats
+        self._mask_pool = FramePool("detector_mask")
+
+        # last confirmed detection (cx, cy, w, h, t) and velocity in px/s
+        self._track = None
+        self._track_v = (0.0, 0.0)
+        self._misses = 0
+
+    def set_profile(self, profile: DetectorProfile):
+        """Swap thresholds at runtime. The background model is kept."""
+        # a single reference assignment, so the detection thread sees either
+        # the old or the new profile, never a mix
+        self.profile = CompiledProfile(profile)
+
+    def stats(self) -> dict:
+        return {"mask_pool": self._mask_pool.stats()}
+
+    def _buffer(self, name: str, shape, dtype=np.uint8):
+        """Work array of exactly `shape`: a view into one kept per name.
+
+        The kept array only grows (to the coarse frame, or the largest
+        refine crop, with some headroom so a slowly growing box doesn't
+        reallocate every frame), so at steady state nothing is allocated.
+        """
+        buf = self._work.get(name)
+        if buf is None or buf.dtype != dtype or any(b < n for b, n in zip(buf.shape, shape)):
+            if buf is not None and buf.dtype == dtype:
+                shape_kept = tuple(b if b >= n else n + n // 4 for b, n in zip(buf.shape, shape))
+            else:
+                shape_kept = tuple(shape)
+            buf = self._work[name] = np.empty(shape_kept, dtype=dtype)
+        return buf[:shape[0], :shape[1]]
+
+    # ------------------------------------------------------------------
+    # helpers
+    # ------------------------------------------------------------------
+    def _contour_candidates(self, mask, p: CompiledProfile, thr: dict):
+        """Candidates from findContours, gated one contour at a time."""
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        rows = []
+        for contour in contours:
+            area = cv2.contourArea(contour)
+            if not (thr["area_min"] <= area <= thr["area_max"]):
+                continue
+
+            x, y, w, h = cv2.boundingRect(contour)
+            if w < thr["width_min"] or h < thr["height_min"]:
+                continue
+
+            aspect_ratio = w / float(h)
+            if not (p.aspect_min <= aspect_ratio <= p.aspect_max):
+                continue
+
+            # Solidity filter
+            hull_area = cv2.contourArea(cv2.convexHull(contour))
+            if hull_area == 0:
+                continue
+            if float(area) / hull_area < p.solidity_min:
+                continue
+
+            rows.append((x, y, w, h, area))
+
+        return self._sorted_candidates(np.array(rows, dtype=np.float32).reshape(-1, 5))
+
+    def _component_candidates(self, mask, p: CompiledProfile, thr: dict):
+        """Candidates from connectedComponentsWithStats.
+
+        Size, aspect and area bounds run on the whole stats table at once.
+        Pixel counts exclude holes while the contour filter counts the filled
+        outline, so the vectorized area gate uses safe bounds (pixels <= filled
+        area <= w * h); the exact filled area and the solidity are only
+        computed for the few components that survive.
+        """
+        n, labels, stats, centroids = cv2.connectedComponentsWithStats(
+            mask, self._buffer("labels", mask.shape, np.int32),
+            self._cc_stats, self._cc_centroids, 8,
+        )
+        self._cc_stats, self._cc_centroids = stats, centroids
+        if n <= 1:
+            return np.empty((0, 5), dtype=np.float32)
+
+        st = stats[1:]      # label 0 is the background
+        ws = st[:, cv2.CC_STAT_WIDTH]
+        hs = st[:, cv2.CC_STAT_HEIGHT]
+        pixels = st[:, cv2.CC_STAT_AREA]
+        aspect = ws / hs.astype(np.float32)
+
+        keep = (
+            (ws >= thr["width_min"]) & (hs >= thr["height_min"])
+            & (aspect >= p.aspect_min) & (aspect <= p.aspect_max)
+            & (ws * hs >= thr["area_min"]) & (pixels <= thr["area_max"])
+        )
+
+        rows = []
+        for i in np.flatnonzero(keep):
+            x, y, w, h = (int(v) for v in st[i, :4])
+            blob = cv2.compare(labels[y:y + h, x:x + w], float(i + 1), cv2.CMP_EQ,
+                               self._buffer("blob", (h, w)))
+            contours, _ = cv2.findContours(blob, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            contour = max(contours, key=len)
+
+            area = cv2.contourArea(contour)
+            if not (thr["area_min"] <= area <= thr["area_max"]):
+                continue
+
+            # Solidity filter
+            if p.solidity_min > 0.0:
+                hull_area = cv2.contourArea(cv2.convexHull(contour))
+                if hull_area == 0 or area / hull_area < p.solidity_min:
+                    continue
+
+            rows.append((x, y, w, h, area))
+
+        return self._sorted_candidates(np.array(rows, dtype=np.float32).reshape(-1, 5))
+
+    @staticmethod
+    def _sorted_candidates(cands):
+        """(K, 5) [x, y, w, h, area] rows, largest area first."""
+        if len(cands) > 1:
+            cands = cands[np.argsort(-cands[:, 4], kind="stable")]
+        return cands
+
+    def _predicted_roi(self, shape, t: float, focus=None) -> Optional[Tuple[int, int, int, int]]:
+        """Full resolution ROI (x0, y0, x1, y1) around the predicted position.
+
+        `focus` is an already predicted (cx, cy, w, h), e.g. the selected
+        track's Kalman prediction; without it the detector extrapolates its
+        own last hit.
+        """
+        if not self.roi_tracking:
+            return None
+
+        if focus is not None:
+            px, py, w, h = focus
+            half_w = 0.5 * w * self.roi_margin
+            half_h = 0.5 * h * self.roi_margin
+            return self._clip_roi(px - half_w, py - half_h, px + half_w, py + half_h, shape)
+
+        if self._track is None:
+            return None
+
+        cx, cy, w, h, t_last = self._track
+        vx, vy = self._track_v
+        dt = max(0.0, t - t_last)
+        px = cx + vx * dt
+        py = cy + vy * dt
+
+        half_w = 0.5 * w * self.roi_margin + abs(vx) * dt
+        half_h = 0.5 * h * self.roi_margin + abs(vy) * dt
+        return self._clip_roi(px - half_w, py - half_h, px + half_w, py + half_h, shape)
+
+    @staticmethod
+    def _clip_roi(x0, y0, x1, y1, shape):
+        height, width = shape[:2]
+        x0 = int(max(0, min(width, x0)))
+        x1 = int(max(0, min(width, x1)))
+        y0 = int(max(0, min(height, y0)))
+        y1 = int(max(0, min(height, y1)))
+        if x1 - x0 < 2 or y1 - y0 < 2:
+            return None
+        return x0, y0, x1, y1
+
+    def _update_track(self, box, t: float):
+        if box is None:
+            self._misses += 1
+            if self._misses > self.track_max_misses:
+                self._track = None
+                self._track_v = (0.0, 0.0)
+            return
+
+        cx, cy, w, h = box
+        if self._track is not None:
+            pcx, pcy, _, _, pt = self._track
+            dt = t - pt
+            if dt > 0:
+                self._track_v = ((cx - pcx) / dt, (cy - pcy) / dt)
+        self._track = (cx, cy, w, h, t)
+        self._misses = 0
+
+    # ------------------------------------------------------------------
+    # main entry
+    # ------------------------------------------------------------------
+    def detect(self, frame, t: float, focus=None):
+        """Return ((cx, cy, w, h) or None, motion mask at the coarse level).
+
+        All blobs that passed the gates are left in self.candidates. `focus`
+        is an optional predicted (cx, cy, w, h) of the target being followed.
+        """
+        p = self.profile   # read once so a concurrent swap can't split a frame
+        # returned to the caller (FramePacket.mask), so from a pool
+        shape = self.coarse_shape(frame.shape)
+        coarse = self._coarse if self._coarse is not None and self._coarse.shape[:2] == shape else None
+        coarse, motion_mask = self._segment(p, frame, coarse, self._mask_pool.acquire(shape))
+        if self.pyramid_levels > 0:
+            self._coarse = coarse
+        box = self._locate(p, frame, coarse, motion_mask, t, focus)
+        return box, motion_mask
+
+    def coarse_shape(self, shape) -> tuple:
+        """(height, width) of the pyramid level for a frame of this shape."""
+        if self.pyramid_levels == 0:
+            return tuple(shape[:2])
+        s = self.scale
+        return (int(round(shape[0] * s)), int(round(shape[1] * s)))
+
+    def segment(self, frame, coarse=None, mask=None):
+        """Downscale frame and update the background model.
+
+        Returns (coarse frame, thresholded motion mask); coarse / mask are
+        optional output arrays. The first half of detect(): ParallelDetector
+        runs it per horizontal band in its workers.
+        """
+        return self._segment(self.profile, frame, coarse, mask)
+
+    def locate(self, frame, coarse, motion_mask, t: float, focus=None):
+        """Primary box from segment() output; the second half of detect()."""
+        return self._locate(self.profile, frame, coarse, motion_mask, t, focus)
+
+    def _segment(self, p: CompiledProfile, frame, coarse, mask):
+        if self.pyramid_levels > 0:
+            # an output array sets the size (a band of a larger frame)
+            h, w = coarse.shape[:2] if coarse is not None else self.coarse_shape(frame.shape)
+            coarse = cv2.resize(frame, (w, h), coarse, interpolation=cv2.INTER_AREA)
+        else:
+            coarse = frame
+
+        # Motion mask from background subtractor. The model always sees the
+        # whole coarse frame so the background stays consistent.
+        motion_raw = self._motion_raw = self.bg_subtractor.apply(
+            coarse, self._motion_raw, learningRate=p.learning_rate
+        )
+        mask = cv2.threshold(motion_raw, p.binary_thresh, 255, cv2.THRESH_BINARY, mask)[1]
+        return coarse, mask
+
+    def _locate(self, p: CompiledProfile, frame, coarse, motion_mask, t: float, focus):
+        if self._hsv is None or self._hsv.shape != frame.shape:
+            # color masks run on coarse crops and full resolution refine crops
+            self._hsv = np.empty(frame.shape, dtype=np.uint8)
+
+        roi = self._predicted_roi(frame.shape, t, focus)
+        crop = None
+        if roi is not None and self.roi_mode == "crop":
+            # Only search around the predicted position while tracking, but
+            # the whole frame now and then so other blobs stay candidates
+            self._since_full += 1
+            if not self.full_every or self._since_full < self.full_every:
+                crop = roi
+        box = self._search(p, frame, coarse, motion_mask, roi, crop)
+        if box is None and crop is not None:
+            # lost it inside the ROI, fall back to a full coarse search
+            box = self._search(p, frame, coarse, motion_mask, roi, None)
+            crop = None
+        self.searched_full = crop is None
+        if self.searched_full:
+            self._since_full = 0
+
+        self._update_track(box, t)
+        return box
+
+    def _search(self, p: CompiledProfile, frame, coarse, motion_mask, roi, crop):
+        """Primary box from the coarse frame, or only its `crop` if given.
+
+        `roi` (full resolution, or None) picks the primary among the blobs.
+        """
+        s = self.scale
+        if crop is None:
+            cx0 = cy0 = 0
+            cx1, cy1 = coarse.shape[1], coarse.shape[0]
+        else:
+            x0, y0, x1, y1 = crop
+            cx0, cy0 = int(x0 * s), int(y0 * s)
+            cx1 = max(cx0 + 1, int(np.ceil(x1 * s)))
+            cy1 = max(cy0 + 1, int(np.ceil(y1 * s)))
+
+        size = (cy1 - cy0, cx1 - cx0)
+        box_mask = motion_mask[cy0:cy1, cx0:cx1]
+        if p.color_gate_active:
+            # Only moving pixels inside the color band
+            color = p.color_mask(coarse[cy0:cy1, cx0:cx1], self._hsv, self._buffer("color", size))
+            box_mask = cv2.bitwise_and(color, box_mask, color)
+
+        # Morphology to clean noise
+        box_mask = cv2.morphologyEx(box_mask, cv2.MORPH_CLOSE, p.kernel, self._buffer("closed", size))
+        box_mask = cv2.morphologyEx(box_mask, cv2.MORPH_OPEN, p.kernel, self._buffer("opened", size))
+
+        thr = p.thresholds(s)
+        if self.filter_mode == "components":
+            cands = self._component_candidates(box_mask, p, thr)
+        else:
+            cands = self._contour_candidates(box_mask, p, thr)
+
+        # candidates in full resolution [cx, cy, w, h, area]
+        full = np.empty_like(cands)
+        full[:, 0] = (cx0 + cands[:, 0] + cands[:, 2] / 2.0) / s
+        full[:, 1] = (cy0 + cands[:, 1] + cands[:, 3] / 2.0) / s
+        full[:, 2] = cands[:, 2] / s
+        full[:, 3] = cands[:, 3] / s
+        full[:, 4] = cands[:, 4] / (s * s)
+        self.candidates = full
+
+        if len(cands) == 0:
+            return None
+
+        # primary: the largest blob centred inside the ROI, else the largest
+        i = 0
+        if roi is not None:
+            x0, y0, x1, y1 = roi
+            inside = np.flatnonzero(
+                (full[:, 0] >= x0) & (full[:, 0] < x1)
+                & (full[:, 1] >= y0) & (full[:, 1] < y1)
+            )
+            if len(inside):
+                i = int(inside[0])
+
+        x, y, w, h = (int(v) for v in cands[i, :4])
+        if self.pyramid_levels == 0:
+            return (cx0 + x + w // 2, cy0 + y + h // 2, w, h)
+
+        box = self._refine(p, frame, box_mask, (x, y, w, h), (cx0, cy0))
+        if box is not None:
+            # keep the refined box in place of its coarse row
+            full[i, :4] = box
+        return box
+
+    def _refine(self, p: CompiledProfile, frame, coarse_mask, coarse_box, offset):
+        """Refine a coarse hit at full resolution inside a padded ROI.
+
+        coarse_box is relative to coarse_mask, which starts at `offset` in
+        the coarse frame.
+        """
+        s = self.scale
+        x, y, w, h = coarse_box
+        ox, oy = offset
+
+        # padded crop in coarse coordinates (one coarse pixel on each side)
+        pad = 1
+        mx0, my0 = max(0, x - pad), max(0, y - pad)
+        mx1 = min(coarse_mask.shape[1], x + w + pad)
+        my1 = min(coarse_mask.shape[0], y + h + pad)
+
+        # same crop at full resolution
+        fx0, fy0 = int((ox + mx0) / s), int((oy + my0) / s)
+        fx1 = min(frame.shape[1], int((ox + mx1) / s))
+        fy1 = min(frame.shape[0], int((oy + my1) / s))
+        if fx1 <= fx0 or fy1 <= fy0:
+            return None
+
+        # upsample the coarse blob; linear interpolation + threshold gives a
+        # smooth sub-coarse-pixel boundary
+        size = (fy1 - fy0, fx1 - fx0)
+        fine = cv2.resize(
+            coarse_mask[my0:my1, mx0:mx1], (size[1], size[0]), self._buffer("fine", size),
+            interpolation=cv2.INTER_LINEAR,
+        )
+        cv2.threshold(fine, 127, 255, cv2.THRESH_BINARY, fine)
+
+        crop = frame[fy0:fy1, fx0:fx1]
+        if p.color_gate_active:
+            # color evidence at full resolution sharpens the edges
+            color = p.color_mask(crop, self._hsv, self._buffer("fine_color", size))
+            fine = cv2.bitwise_and(fine, color, fine)
+        else:
+            # no color band to test: keep the full resolution edges that fall
+            # on the blob (grown by a coarse pixel). The motion blob also
+            # covers where the box was a moment ago, which has no edges now.
+            gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY, self._buffer("gray", size))
+            edges = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, self._edge_kernel,
+                                     self._buffer("edges", size))
+            cv2.threshold(edges, config.DETECT_REFINE_EDGE_THRESH, 255, cv2.THRESH_BINARY, edges)
+            support = cv2.dilate(fine, self._support_kernel, dst=self._buffer("support", size))
+            fine = cv2.bitwise_and(edges, support, edges)
+
+        rx, ry, rw, rh = cv2.boundingRect(fine)
+        if not p.color_gate_active and rw > 2 and rh > 2:
+            # the 3x3 gradient marks one pixel on each side of an edge
+            rx, ry, rw, rh = rx + 1, ry + 1, rw - 2, rh - 2
+        if rw == 0 or rh == 0:
+            # nothing left after refinement, trust the coarse box
+            return (
+                int((ox + x + w / 2.0) / s),
+                int((oy + y + h / 2.0) / s),
+                int(w / s),
+                int(h / s),
+            )
+
+        return (fx0 + rx + rw // 2, fy0 + ry + rh // 2, rw, rh)
@@ -0,0 +1,183 @@
+# fake_stm32.py
+"""Pseudo-terminal stand-in for the STM32 motor board.
+
+Speaks both wire formats from serial_link.py: answers identify and ping
+requests and records every motor command it receives. The host side opens
+`fake.port` (or the stable symlink, if one was requested) like any other
+serial device.
+
+unplug() / plug() simulate a USB disconnect: the pty goes away, so host
+reads and writes fail, and a new one appears behind the same symlink.
+
+    python fake_stm32.py --link /tmp/ttyFAKE0
+
+then set config.SERIAL_PORT = "/tmp/ttyFAKE0" and start the tracker.
+"""
+
+import argparse
+import os
+import pty
+import select
+import threading
+import time
+import tty
+
+import config
+from serial_link import (
+    MOTOR_PAYLOAD, MSG_IDENT, MSG_MOTOR, MSG_PING, MSG_REPLY, FrameParser, encode_frame,
+)
+
+
+class FakeSTM32:
+    def __init__(
+        self,
+        device_id: str = config.SERIAL_DEVICE_ID,
+        link: str = None,
+        respond: bool = True,
+        reply_delay: float = 0.0,
+        verbose: bool = False,
+    ):
+        self.device_id = device_id
+        self.link = link                # optional stable path (symlink to the pty)
+        self.respond = respond          # False = old firmware that ignores ?ID / PING
+        self.reply_delay = reply_delay  # simulated round trip on top of the pty
+        self.verbose = verbose
+
+        self.port = None
+        self.commands = []              # (monotonic time, (fl, fr, rl, rr))
+        self.pings = 0
+        self.identifies = 0
+
+        self._master = None
+        self._slave = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # lifecycle
+    # ------------------------------------------------------------------
+    def plug(self):
+        """Create a fresh pty and start answering on it."""
+        if self._master is not None:
+            return
+        master, slave = pty.openpty()
+        tty.setraw(slave)
+        self._master, self._slave = master, slave
+        self.port = os.ttyname(slave)
+        if self.link:
+            tmp = self.link + ".tmp"
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+            os.symlink(self.port, tmp)
+            os.replace(tmp, self.link)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="fake-stm32", daemon=True)
+        self._thread.start()
+        return self
+
+    start = plug
+
+    def unplug(self):
+        """Tear the pty down, as if the USB cable was pulled."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(1.0)
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._master = self._slave = None
+        if self.link and os.path.lexists(self.link):
+            os.unlink(self.link)
+
+    stop = unplug
+
+    @property
+    def path(self):
+        return self.link or self.port
+
+    # ------------------------------------------------------------------
+    # protocol
+    # ------------------------------------------------------------------
+    def _reply(self, data: bytes):
+        if self.reply_delay:
+            time.sleep(self.reply_delay)
+        try:
+            os.write(self._master, data)
+        except OSError:
+            pass
+
+    def _handle(self, item):
+        if isinstance(item, str):
+            if item == "?ID":
+                self.identifies += 1
+                if self.respond:
+                    self._reply(f"ID {self.device_id}\n".encode("ascii"))
+            elif item.startswith("PING "):
+                self.pings += 1
+                if self.respond:
+                    self._reply(("PONG " + item[5:] + "\n").encode("ascii"))
+            else:
+                try:
+                    pcts = tuple(int(v) for v in item.split(","))
+                except ValueError:
+                    return
+                if len(pcts) == 4:
+                    self._record(pcts)
+            return
+
+        msg, seq, payload = item
+        if msg == MSG_MOTOR:
+            self._record(MOTOR_PAYLOAD.unpack(payload))
+        elif msg == MSG_PING:
+            self.pings += 1
+            if self.respond:
+                self._reply(encode_frame(MSG_PING | MSG_REPLY, seq))
+        elif msg == MSG_IDENT:
+            self.identifies += 1
+            if self.respond:
+                ident = self.device_id.encode("ascii")[:4].ljust(4, b"\0")
+                self._reply(encode_frame(MSG_IDENT | MSG_REPLY, seq, ident))
+
+    def _record(self, pcts):
+        self.commands.append((time.monotonic(), pcts))
+        if self.verbose:
+            print(f"motor {pcts}")
+
+    def _loop(self):
+        parser = FrameParser()
+        master = self._master
+        while not self._stop.is_set():
+            ready, _, _ = select.select([master], [], [], 0.05)
+            if not ready:
+                continue
+            try:
+                data = os.read(master, 1024)
+            except OSError:
+                # nobody has the slave open right now
+                time.sleep(0.01)
+                continue
+            for item in parser.feed(data):
+                self._handle(item)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake STM32 motor board on a pty")
+    parser.add_argument("--link", default="/tmp/ttyFAKE0", help="stable symlink to the pty")
+    parser.add_argument("--id", default=config.SERIAL_DEVICE_ID, help="identify reply")
+    parser.add_argument("--silent", action="store_true", help="ignore ?ID / PING like old firmware")
+    args = parser.parse_args()
+
+    fake = FakeSTM32(device_id=args.id, link=args.link, respond=not args.silent, verbose=True)
+    fake.plug()
+    print(f"Fake STM32 on {fake.port} (link {fake.link})")
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.unplug()
@@ -0,0 +1,247 @@
+# flow_tracker.py
+"""Intermittent detection with optical flow tracking in between.
+
+The full MOG2 + morphology + contour pipeline runs every N frames, or
+right away when tracking confidence drops. On the frames in between the
+target box is followed with sparse Lucas-Kanade optical flow on a small
+grayscale patch around it, which costs a fraction of a full detection.
+
+N adapts to measured CPU headroom. Full detection and flow frames keep
+separate cost averages, so the expected load of one period of N frames
+(one detection, N - 1 flow frames) doesn't swing with the mix of frames
+just seen: if it leaves plenty of the camera frame period unused we detect
+more often, if it gets close to the period we detect less often.
+
+Note that the background model only learns on full detection frames.
+"""
+
+import time
+from typing import Optional
+
+import cv2
+import numpy as np
+
+import config
+from detector import BoxDetector
+
+
+class HybridDetector:
+    def __init__(
+        self,
+        detector: BoxDetector,
+        min_interval: int = config.HYBRID_MIN_INTERVAL,
+        max_interval: int = config.HYBRID_MAX_INTERVAL,
+        min_confidence: float = config.HYBRID_MIN_CONFIDENCE,
+    ):
+        self.detector = detector
+        self.min_interval = max(1, min_interval)
+        self.max_interval = max(self.min_interval, max_interval)
+        self.min_confidence = min_confidence
+        self.interval = self.min_interval   # current N
+
+        # headroom band as a fraction of the frame period
+        self.low_load = config.HYBRID_LOW_LOAD
+        self.high_load = config.HYBRID_HIGH_LOAD
+
+        self.lk_params = dict(
+            winSize=(21, 21),
+            maxLevel=2,
+            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03),
+        )
+        self.max_features = 40
+        self.patch_margin = 0.5     # patch padding as a fraction of box size
+
+        self.candidates = np.empty((0, 5), dtype=np.float32)
+        self.confidence = 0.0
+
+        self._box = None            # (cx, cy, w, h) currently followed
+        self._prev_gray = None      # grayscale patch from the previous frame
+        self._patch = None          # (x0, y0, x1, y1) of that patch
+        self._points = None         # (K, 1, 2) float32 features, patch coords
+        self._since_full = 0
+
+        # timing for the adaptive interval (exponential moving averages)
+        self._full_cost = None      # seconds per full detection frame
+        self._flow_cost = None      # seconds per optical flow frame
+        self._period = None         # seconds between frames
+        self._last_t = None
+
+        self.full_frames = 0
+        self.flow_frames = 0
+        self.forced_full = 0        # full detections triggered by low confidence
+
+    # ------------------------------------------------------------------
+    # patch helpers
+    # ------------------------------------------------------------------
+    def _patch_for(self, box, shape):
+        cx, cy, w, h = box
+        half_w = 0.5 * w * (1.0 + 2.0 * self.patch_margin)
+        half_h = 0.5 * h * (1.0 + 2.0 * self.patch_margin)
+        height, width = shape[:2]
+        x0 = int(max(0, cx - half_w))
+        y0 = int(max(0, cy - half_h))
+        x1 = int(min(width, cx + half_w))
+        y1 = int(min(height, cy + half_h))
+        if x1 - x0 < 8 or y1 - y0 < 8:
+            return None
+        return x0, y0, x1, y1
+
+    def _seed(self, frame, box):
+        """Pick features inside the box on the current frame."""
+        self._box = box
+        self._patch = self._patch_for(box, frame.shape)
+        self._points = None
+        self._prev_gray = None
+        if self._patch is None:
+            return
+
+        x0, y0, x1, y1 = self._patch
+        gray = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+
+        cx, cy, w, h = box
+        feature_mask = np.zeros_like(gray)
+        bx0, by0 = int(cx - w / 2 - x0), int(cy - h / 2 - y0)
+        cv2.rectangle(feature_mask, (bx0, by0), (bx0 + int(w), by0 + int(h)), 255, -1)
+
+        points = cv2.goodFeaturesToTrack(
+            gray, self.max_features, 0.01, 5, mask=feature_mask
+        )
+        if points is None or len(points) < 4:
+            return
+        self._prev_gray = gray
+        self._points = points
+
+    def _flow(self, frame):
+        """Follow the box with LK flow; returns (box, confidence)."""
+        if self._points is None or self._patch is None:
+            return None, 0.0
+
+        # the same patch rectangle on the new frame, so coordinates line up
+        x0, y0, x1, y1 = self._patch
+        gray = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+
+        nxt, status, _ = cv2.calcOpticalFlowPyrLK(
+            self._prev_gray, gray, self._points, None, **self.lk_params
+        )
+        if nxt is None:
+            return None, 0.0
+
+        # forward-backward check rejects points that drifted
+        back, status_b, _ = cv2.calcOpticalFlowPyrLK(
+            gray, self._prev_gray, nxt, None, **self.lk_params
+        )
+        fb_err = np.linalg.norm((back - self._points).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (status_b.ravel() == 1) & (fb_err < 1.0)
+
+        confidence = float(good.sum()) / len(self._points)
+        if good.sum() < 4:
+            return None, confidence
+
+        shift = np.median((nxt - self._points).reshape(-1, 2)[good], axis=0)
+        cx, cy, w, h = self._box
+        box = (int(round(cx + shift[0])), int(round(cy + shift[1])), w, h)
+
+        # re-anchor the patch on the moved box for the next frame
+        self._box = box
+        new_patch = self._patch_for(box, frame.shape)
+        if new_patch is None:
+            return None, 0.0
+        px0, py0, px1, py1 = new_patch
+        if new_patch == self._patch:
+            self._prev_gray = gray
+            self._points = nxt[good].reshape(-1, 1, 2)
+        else:
+            self._patch = new_patch
+            self._prev_gray = cv2.cvtColor(frame[py0:py1, px0:px1], cv2.COLOR_BGR2GRAY)
+            moved = nxt[good].reshape(-1, 2) + np.array([x0 - px0, y0 - py0], dtype=np.float32)
+            self._points = moved.reshape(-1, 1, 2)
+        return box, confidence
+
+    # ------------------------------------------------------------------
+    # adaptive interval
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _ema(avg, value, a=0.1):
+        return value if avg is None else avg + a * (value - avg)
+
+    def expected_load(self, interval: int) -> Optional[float]:
+        """Average share of the frame period used at a given interval."""
+        if self._period is None or self._full_cost is None:
+            return None
+        # until a flow frame has been timed, assume it costs a full one
+        flow = self._full_cost if self._flow_cost is None else self._flow_cost
+        cost = (self._full_cost + (interval - 1) * flow) / interval
+        return cost / self._period
+
+    def _adapt(self, cost: float, t: float, full: bool):
+        if full:
+            self._full_cost = self._ema(self._full_cost, cost)
+        else:
+            self._flow_cost = self._ema(self._flow_cost, cost)
+        if self._last_t is not None and t > self._last_t:
+            self._period = self._ema(self._period, t - self._last_t)
+        self._last_t = t
+
+        load = self.expected_load(self.interval)
+        if load is None:
+            return
+        if load > self.high_load and self.interval < self.max_interval:
+            self.interval += 1
+        elif (self.interval > self.min_interval
+              and self.expected_load(self.interval - 1) < self.low_load):
+            # only step down if the shorter interval would still be light
+            self.interval -= 1
+
+    # ------------------------------------------------------------------
+    # main entry, same shape as BoxDetector.detect
+    # ------------------------------------------------------------------
+    def detect(self, frame, t: float, focus=None):
+        t0 = time.perf_counter()
+        box = None
+        mask = None
+
+        # full detection on every interval-th frame (interval 1 = every frame)
+        use_flow = self._box is not None and self._since_full + 1 < self.interval
+        if use_flow:
+            box, self.confidence = self._flow(frame)
+            if box is None or self.confidence < self.min_confidence:
+                self.forced_full += 1
+                use_flow = False
+
+        if use_flow:
+            self.flow_frames += 1
+            self._since_full += 1
+            cx, cy, w, h = box
+            self.candidates = np.array([[cx, cy, w, h, w * h]], dtype=np.float32)
+        else:
+            box, mask = self.detector.detect(frame, t, focus)
+            self.candidates = self.detector.candidates
+            self.full_frames += 1
+            self._since_full = 0
+            self.confidence = 1.0 if box is not None else 0.0
+            if box is not None:
+                self._seed(frame, box)
+            else:
+                self._box = None
+
+        self._adapt(time.perf_counter() - t0, t, not use_flow)
+        return box, mask
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "full_ms": round(self._full_cost * 1000.0, 3) if self._full_cost is not None else None,
+            "flow_ms": round(self._flow_cost * 1000.0, 3) if self._flow_cost is not None else None,
+            "full_frames": self.full_frames,
+            "flow_frames": self.flow_frames,
+            "forced_full": self.forced_full,
+            "confidence": round(self.confidence, 3),
+        }
+
+    # profile handling stays with the wrapped detector
+    @property
+    def profile(self):
+        return self.detector.profile
+
+    def set_profile(self, profile):
+        self.detector.set_profile(profile)
@@ -0,0 +1,332 @@
+# frame_hub.py
+"""Encode-once MJPEG broadcast for /video_feed viewers.
+
+The presentation stage hands each frame to the hub once per tick. Viewers
+pick a stream profile (resolution, JPEG quality, frame rate); each profile
+is encoded at most once per frame, on demand, and every viewer on that
+profile streams the same bytes object. With no subscribers the hub reports
+it is idle so the caller can skip drawing and encoding altogether.
+
+Each viewer adapts on its own: the time the server spends writing a JPEG
+to that client's socket is its backpressure signal. A client whose writes
+eat into its frame budget steps down a profile, one that keeps up easily
+steps back up to what it asked for. A slow client never queues frames, it
+always jumps to the newest one and skips the rest.
+"""
+
+import threading
+import time
+from dataclasses import dataclass, replace
+
+import cv2
+
+import config
+from frame_pool import FramePool
+
+
+BOUNDARY = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
+PART_END = b"\r\n"
+
+
+@dataclass(frozen=True)
+class StreamProfile:
+    name: str
+    max_width: int
+    quality: int
+    fps: float
+
+    @classmethod
+    def from_config(cls, name: str) -> "StreamProfile":
+        """Raises KeyError for unknown names."""
+        return cls(name=name, **config.STREAM_PROFILES[name])
+
+    @classmethod
+    def from_query(cls, args) -> "StreamProfile":
+        """Profile from /video_feed query params (?profile=, width, quality, fps)."""
+        name = args.get("profile", config.STREAM_DEFAULT_PROFILE)
+        if name not in config.STREAM_PROFILES:
+            name = config.STREAM_DEFAULT_PROFILE
+        profile = cls.from_config(name)
+        overrides = {}
+        for key, field, cast, lo, hi in (
+            ("width", "max_width", int, 160, 4096),
+            ("quality", "quality", int, 10, 95),
+            ("fps", "fps", float, 1.0, 60.0),
+        ):
+            if key in args:
+                try:
+                    overrides[field] = min(hi, max(lo, cast(args[key])))
+                except ValueError:
+                    pass
+        if overrides:
+            profile = replace(profile, name="custom", **overrides)
+        return profile
+
+    def key(self):
+        return (self.max_width, self.quality)
+
+
+def profile_ladder(top: StreamProfile) -> list:
+    """top, followed by the configured profiles that are cheaper than it."""
+    ladder = [top]
+    for name in config.STREAM_PROFILE_ORDER:
+        p = StreamProfile.from_config(name)
+        if p.max_width <= top.max_width and p.quality <= top.quality and p.key() != top.key():
+            ladder.append(p)
+    return ladder
+
+
+class ClientStream:
+    """Adaptive state of one /video_feed viewer."""
+
+    def __init__(self, profile: StreamProfile, adaptive: bool = True):
+        self.ladder = profile_ladder(profile) if adaptive else [profile]
+        self.level = 0              # index into ladder, 0 = what the client asked for
+        self.send_ms = 0.0          # EMA of the time to write one JPEG
+        self.sent = 0
+        self.skipped = 0            # newer frames arrived before we were ready
+        self._slow = 0
+        self._fast = 0
+
+    @property
+    def profile(self) -> StreamProfile:
+        return self.ladder[self.level]
+
+    def record_send(self, seconds: float):
+        ms = seconds * 1000.0
+        self.sent += 1
+        self.send_ms = ms if self.sent == 1 else self.send_ms + 0.2 * (ms - self.send_ms)
+
+        budget = 1.0 / self.profile.fps
+        if seconds > config.STREAM_SLOW_FRACTION * budget:
+            self._slow += 1
+            self._fast = 0
+        elif seconds < config.STREAM_FAST_FRACTION * budget:
+            self._fast += 1
+            self._slow = 0
+        else:
+            self._slow = self._fast = 0
+
+        if self._slow >= config.STREAM_DOWNGRADE_AFTER and self.level < len(self.ladder) - 1:
+            self.level += 1
+            self._slow = 0
+        elif self._fast >= config.STREAM_UPGRADE_AFTER and self.level > 0:
+            self.level -= 1
+            self._fast = 0
+
+    def to_dict(self):
+        return {
+            "profile": self.profile.name,
+            "level": self.level,
+            "send_ms": round(self.send_ms, 3),
+            "sent": self.sent,
+            "skipped": self.skipped,
+        }
+
+
+class FrameHub:
+    def __init__(
+        self,
+        max_width: int = config.STREAM_MAX_WIDTH,
+        jpeg_quality: int = config.STREAM_JPEG_QUALITY,
+        on_subscribers=None,
+        metrics=None,
+    ):
+        self.max_width = max_width
+        self.jpeg_quality = jpeg_quality
+        self.on_subscribers = on_subscribers   # called with viewers + pending snapshots
+        self.metrics = metrics                 # optional metrics.PipelineMetrics
+
+        self._cond = threading.Condition()
+        self._frame = None     # latest raw frame, never modified once published
+        self._seq = -1
+        self._timestamp = None # capture time of the latest frame, if known
+        self._cache = {}       # profile key -> jpeg bytes for self._seq
+        self._encode_locks = {}
+        self._subscribers = 0
+        self._snapshot_waiters = 0
+        self._clients = {}     # id -> ClientStream
+        self.encoded = 0       # frames actually encoded
+        self._resize_pool = FramePool("stream_resize")
+
+    @property
+    def subscribers(self) -> int:
+        return self._subscribers
+
+    @property
+    def has_subscribers(self) -> bool:
+        return self.subscribers > 0
+
+    @property
+    def wants_frames(self) -> bool:
+        """True if viewers or a pending /snapshot need the next frame."""
+        return self.has_subscribers or self._snapshot_waiters > 0
+
+    def encode(self, frame, max_width: int = None, quality: int = None):
+        """Resize to the stream width and JPEG encode; returns bytes or None."""
+        max_width = max_width or self.max_width
+        quality = quality or self.jpeg_quality
+        t0 = time.perf_counter()
+        h, w = frame.shape[:2]
+        if w > max_width:
+            scale = max_width / float(w)
+            size = (max_width, int(round(h * scale)))
+            dst = self._resize_pool.acquire((size[1], size[0]) + frame.shape[2:], frame.dtype)
+            # default (linear) filter: INTER_AREA looks a little better but
+            # costs several times the JPEG encode itself. /snapshot is sent at
+            # full resolution and never resized
+            frame = cv2.resize(frame, size, dst)
+
+        ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            return None
+        self.encoded += 1
+        if self.metrics is not None:
+            self.metrics.observe_stage("encode", time.perf_counter() - t0)
+        return buffer.tobytes()
+
+    def publish_frame(self, frame, seq: int, timestamp: float = None) -> bool:
+        """Make frame the latest slot; profiles encode it on demand.
+
+        No-op when nobody needs frames. The caller must not modify frame
+        afterwards. timestamp is the capture time, for latency metrics.
+        """
+        if not self.wants_frames:
+            return False
+        with self._cond:
+            self._frame = frame
+            self._seq = seq
+            self._timestamp = timestamp
+            self._cache = {}
+            self._cond.notify_all()
+        return True
+
+    def jpeg_for(self, profile: StreamProfile, seq: int):
+        """JPEG of frame seq in the given profile, encoding it at most once."""
+        key = profile.key()
+        with self._cond:
+            if seq != self._seq:
+                return None
+            jpeg = self._cache.get(key)
+            if jpeg is not None:
+                return jpeg
+            frame = self._frame
+            lock = self._encode_locks.setdefault(key, threading.Lock())
+
+        with lock:
+            # another viewer on the same profile may have just encoded it
+            with self._cond:
+                if seq == self._seq and key in self._cache:
+                    return self._cache[key]
+            jpeg = self.encode(frame, profile.max_width, profile.quality)
+            with self._cond:
+                captured = self._timestamp if seq == self._seq else None
+                if seq == self._seq and jpeg is not None:
+                    self._cache[key] = jpeg
+        if self.metrics is not None:
+            self.metrics.observe_latency("encode", captured)
+        return jpeg
+
+    def latest(self):
+        """Return (jpeg, seq) for the most recent frame in the default profile."""
+        with self._cond:
+            seq = self._seq
+        if seq < 0:
+            return None, seq
+        return self.jpeg_for(StreamProfile.from_config(config.STREAM_DEFAULT_PROFILE), seq), seq
+
+    def wait_next(self, last_seq: int, timeout: float = 1.0) -> int:
+        """Block until a frame newer than last_seq exists; returns its seq."""
+        with self._cond:
+            if self._seq == last_seq:
+                self._cond.wait(timeout)
+            return self._seq
+
+    def snapshot(self, quality: int = config.STREAM_SNAPSHOT_QUALITY, timeout: float = 2.0):
+        """Full resolution JPEG of the next frame (or the latest one on timeout)."""
+        with self._cond:
+            self._snapshot_waiters += 1
+            self._notify_demand()
+            try:
+                start_seq = self._seq
+                self._cond.wait_for(lambda: self._seq != start_seq, timeout)
+                frame = self._frame
+            finally:
+                self._snapshot_waiters -= 1
+                self._notify_demand()
+        if frame is None:
+            return None
+        h, w = frame.shape[:2]
+        return self.encode(frame, max_width=w, quality=quality)
+
+    def stream(self, profile: StreamProfile = None, adaptive: bool = True):
+        """multipart/x-mixed-replace generator for one HTTP client.
+
+        The JPEG bytes are yielded as their own chunk so the shared object is
+        written straight to the socket without being concatenated per viewer.
+        The generator resumes only once the server has written the previous
+        chunk, so the time around `yield jpeg` is the client's send time.
+        """
+        if profile is None:
+            profile = StreamProfile.from_config(config.STREAM_DEFAULT_PROFILE)
+        client = ClientStream(profile, adaptive)
+        self._add_subscriber(1, client)
+        try:
+            last_seq = -1
+            next_due = 0.0
+            while True:
+                # frame rate cap: skip frames until this client is due
+                wait = next_due - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                seq = self.wait_next(last_seq)
+                if seq == last_seq or seq < 0:
+                    continue
+                if last_seq >= 0 and seq > last_seq + 1:
+                    client.skipped += seq - last_seq - 1
+                last_seq = seq
+
+                jpeg = self.jpeg_for(client.profile, seq)
+                if jpeg is None:
+                    continue
+                captured = self._timestamp if seq == self._seq else None
+                # anchored schedule so a source at exactly the cap isn't halved,
+                # but never more than one frame of catch-up burst
+                period = 1.0 / client.profile.fps
+                next_due = max(next_due + period, time.monotonic() - period)
+                yield BOUNDARY
+                t0 = time.monotonic()
+                yield jpeg
+                sent = time.monotonic()
+                client.record_send(sent - t0)
+                if self.metrics is not None:
+                    self.metrics.observe_stage("send", sent - t0)
+                    self.metrics.observe_latency("send", captured, sent)
+                yield PART_END
+        finally:
+            self._add_subscriber(-1, client)
+
+    def _add_subscriber(self, delta: int, client: ClientStream = None):
+        with self._cond:
+            self._subscribers += delta
+            if client is not None:
+                if delta > 0:
+                    self._clients[id(client)] = client
+                else:
+                    self._clients.pop(id(client), None)
+            self._notify_demand()
+
+    def _notify_demand(self):
+        """Report viewers plus pending snapshots (caller holds self._cond)."""
+        if self.on_subscribers is not None:
+            self.on_subscribers(self._subscribers + self._snapshot_waiters)
+
+    def stats(self) -> dict:
+        with self._cond:
+            clients = [c.to_dict() for c in self._clients.values()]
+        return {
+            "subscribers": self.subscribers,
+            "encoded": self.encoded,
+            "resize_pool": self._resize_pool.stats(),
+            "clients": clients,
+        }
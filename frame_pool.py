@@ -0,0 +1,92 @@
+# frame_pool.py
+"""Reusable image buffers for the per-frame hot path.
+
+Allocating a fresh 1920x1080x3 array for every capture, overlay copy and
+resize costs more than the memset: each one is a multi-megabyte mmap /
+munmap pair, and the page faults of touching it land on the frame that
+happens to pay for them, which shows up as frame-time jitter.
+
+A FramePool hands out arrays of a requested shape and takes them back
+without an explicit release: a buffer is free again once nothing but the
+pool refers to it. That makes it safe to give pooled frames to code that
+holds on to them for a while (pipeline queues, FrameHub's latest frame,
+Recorder's write queue) - those buffers are simply skipped until they are
+dropped. If every buffer is busy a new one is allocated (and kept, up to
+max_buffers); `misses` counts those allocations and stops growing once the
+pool has reached its steady-state size.
+
+"Nothing but the pool refers to it" is a reference count check. The count
+an idle buffer has depends on the interpreter and on how it is looked at,
+so the pool keeps a probe array in its list that is never handed out and
+reads its count in the same loop, on every acquire: the baseline can't
+drift from what the other buffers are compared with. checks.py frame_pool
+covers reuse and the holders that must block it.
+
+    pool = FramePool("capture")
+    frame = pool.acquire((1080, 1920, 3))      # write into it, pass it on
+"""
+
+import sys
+import threading
+
+import numpy as np
+
+import config
+
+
+class FramePool:
+    def __init__(self, name: str, max_buffers: int = config.FRAME_POOL_MAX_BUFFERS):
+        self.name = name
+        self.max_buffers = max_buffers
+        # [0] is the idle probe (see the module docstring), never handed out
+        self._buffers = [np.empty(0, dtype=np.uint8)]
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.allocated_bytes = 0        # total bytes of all misses
+
+    def acquire(self, shape, dtype=np.uint8) -> np.ndarray:
+        """An array of shape / dtype nobody else is using. Contents are undefined."""
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        with self._lock:
+            # the returned reference is taken before the lock is released,
+            # so a concurrent acquire can't hand out the same buffer
+            idle = None
+            evict = None            # an idle buffer of another shape
+            for i, buf in enumerate(self._buffers):
+                refs = sys.getrefcount(buf)
+                if idle is None:
+                    idle = refs     # the probe, first in the list
+                    continue
+                if refs > idle:
+                    continue
+                if buf.shape == shape and buf.dtype == dtype:
+                    self.hits += 1
+                    return buf
+                if evict is None:
+                    evict = i
+
+            buf = np.empty(shape, dtype=dtype)
+            self.misses += 1
+            self.allocated_bytes += buf.nbytes
+            if len(self._buffers) > self.max_buffers and evict is not None:
+                # make room by forgetting an idle buffer of another shape
+                del self._buffers[evict]
+            if len(self._buffers) <= self.max_buffers:
+                self._buffers.append(buf)
+            return buf
+
+    def stats(self) -> dict:
+        with self._lock:
+            buffers = len(self._buffers) - 1
+            nbytes = sum(buf.nbytes for buf in self._buffers)
+        return {
+            "name": self.name,
+            "buffers": buffers,
+            "bytes": nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "allocated_bytes": self.allocated_bytes,
+        }
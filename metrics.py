@@ -0,0 +1,214 @@
+# metrics.py
+"""Per-stage latency histograms for the pipeline, /metrics and pipeline_stats.
+
+Every frame carries its capture time (FramePacket.timestamp). Each stage
+records two things:
+
+- how long its own work took ("stage" histograms)
+- how long after capture it finished ("latency" histograms, glass-to-X)
+
+glass-to-motor is latency["serial_write"]: capture of the frame a motor
+command was planned from, to that command leaving on the serial port.
+
+RollingHistogram is written without locks. Each histogram has one writer
+thread in practice (the stage that owns it); "send" is shared by the
+/video_feed threads, where an increment can very rarely be lost, which is
+fine for monitoring. Counts are kept twice: cumulative for Prometheus, and
+in time slots for a rolling window (METRICS_WINDOW_S) the dashboard shows
+as p50 / p99.
+"""
+
+import time
+from bisect import bisect_left
+
+import config
+
+
+STAGES = (
+    "capture", "detection", "tracking", "planning", "control",
+    "serial_write", "encode", "send",
+)
+# glass-to-X: every stage after the frame exists
+LATENCY_STAGES = STAGES[1:]
+
+# split mode: rendered /metrics text pushed to the web process (not a Socket.IO event)
+METRICS_TEXT_EVENT = "_metrics"
+# split mode: the web process's encode / send histograms, sent back to be
+# exported with the rest (a dashboard command, not a Socket.IO event)
+WEB_METRICS_EVENT = "_web_metrics"
+WEB_STAGES = ("encode", "send")
+
+
+class RollingHistogram:
+    def __init__(
+        self,
+        buckets=config.METRICS_BUCKETS_S,
+        window_s: float = config.METRICS_WINDOW_S,
+        slots: int = config.METRICS_WINDOW_SLOTS,
+    ):
+        self.bounds = list(buckets)             # upper bounds, seconds; +Inf implied
+        self.total = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+        self._slot_s = window_s / slots
+        self._slots = [[0] * len(self.total) for _ in range(slots)]
+        self._slot_epoch = [-1] * slots
+
+    def observe(self, value: float, now: float = None):
+        i = bisect_left(self.bounds, value)
+        self.total[i] += 1
+        self.count += 1
+        self.sum += value
+
+        epoch = int((time.monotonic() if now is None else now) / self._slot_s)
+        k = epoch % len(self._slots)
+        if self._slot_epoch[k] != epoch:
+            # slot last used a full window ago: start it over (one reference swap)
+            self._slots[k] = [0] * len(self.total)
+            self._slot_epoch[k] = epoch
+        self._slots[k][i] += 1
+
+    def window(self, now: float = None) -> list:
+        """Bucket counts over the rolling window."""
+        epoch = int((time.monotonic() if now is None else now) / self._slot_s)
+        oldest = epoch - len(self._slots) + 1
+        counts = [0] * len(self.total)
+        for slot, slot_epoch in zip(self._slots, self._slot_epoch):
+            if slot_epoch >= oldest:
+                for i, c in enumerate(slot):
+                    counts[i] += c
+        return counts
+
+    def quantile(self, q: float, counts: list = None):
+        """Estimate from bucket counts (linear within a bucket); None if empty."""
+        counts = self.window() if counts is None else counts
+        n = sum(counts)
+        if n == 0:
+            return None
+        target = q * n
+        seen = 0
+        for i, c in enumerate(counts):
+            if c and seen + c >= target:
+                if i == len(self.bounds):
+                    return self.bounds[-1]      # beyond the last bound
+                lo = self.bounds[i - 1] if i > 0 else 0.0
+                return lo + (self.bounds[i] - lo) * (target - seen) / c
+            seen += c
+        return self.bounds[-1]
+
+    def state(self) -> dict:
+        """Plain copy of the counts, to rebuild the histogram in another process."""
+        return {
+            "total": list(self.total),
+            "count": self.count,
+            "sum": self.sum,
+            "slots": [list(slot) for slot in self._slots],
+            "slot_epoch": list(self._slot_epoch),
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "RollingHistogram":
+        h = cls()
+        h.total = list(state["total"])
+        h.count = state["count"]
+        h.sum = state["sum"]
+        h._slots = [list(slot) for slot in state["slots"]]
+        h._slot_epoch = list(state["slot_epoch"])
+        return h
+
+    def summary(self) -> dict:
+        counts = self.window()
+        p50 = self.quantile(0.5, counts)
+        p99 = self.quantile(0.99, counts)
+        return {
+            "count": sum(counts),
+            "p50_ms": round(p50 * 1000.0, 3) if p50 is not None else None,
+            "p99_ms": round(p99 * 1000.0, 3) if p99 is not None else None,
+        }
+
+
+class PipelineMetrics:
+    def __init__(self):
+        self.stage = {name: RollingHistogram() for name in STAGES}
+        self.latency = {name: RollingHistogram() for name in LATENCY_STAGES}
+
+    def observe_stage(self, name: str, seconds: float):
+        self.stage[name].observe(seconds)
+
+    def observe_latency(self, name: str, captured_at: float, now: float = None):
+        """Record now - capture time for a frame that just finished stage `name`."""
+        if captured_at is None:
+            return
+        now = time.monotonic() if now is None else now
+        self.latency[name].observe(now - captured_at, now)
+
+    def export(self, names) -> dict:
+        """Histogram states of the given stages (stage and latency tables)."""
+        return {
+            "stage": {n: self.stage[n].state() for n in names if n in self.stage},
+            "latency": {n: self.latency[n].state() for n in names if n in self.latency},
+        }
+
+    def load(self, exported: dict):
+        """Replace histograms with ones from export() of another process.
+
+        time.monotonic() is system wide, so the rolling window slots line up.
+        """
+        for name, state in exported.get("stage", {}).items():
+            if name in self.stage:
+                self.stage[name] = RollingHistogram.from_state(state)
+        for name, state in exported.get("latency", {}).items():
+            if name in self.latency:
+                self.latency[name] = RollingHistogram.from_state(state)
+
+    def summary(self) -> dict:
+        """Rolling p50 / p99 per stage, for the pipeline_stats event."""
+        return {
+            "window_s": config.METRICS_WINDOW_S,
+            "stage": {name: h.summary() for name, h in self.stage.items()},
+            "latency": {name: h.summary() for name, h in self.latency.items()},
+            "glass_to_motor": self.latency["serial_write"].summary(),
+        }
+
+    def render_prometheus(self, gauges: dict = None) -> str:
+        """Prometheus text exposition format (version 0.0.4).
+
+        gauges maps a metric name to (value, help); names ending in _total
+        are exported as counters.
+        """
+        lines = []
+        for metric, help_text, table in (
+            ("trashcan_stage_seconds", "Time spent in each pipeline stage", self.stage),
+            ("trashcan_latency_seconds", "Time from frame capture to the end of each stage", self.latency),
+        ):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for name, h in table.items():
+                cumulative = 0
+                for bound, c in zip(h.bounds + ["+Inf"], list(h.total)):
+                    cumulative += c
+                    lines.append(f'{metric}_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{stage="{name}"}} {h.sum:.6f}')
+                lines.append(f'{metric}_count{{stage="{name}"}} {h.count}')
+
+            rolling = metric.replace("_seconds", "_rolling_seconds")
+            lines.append(f"# HELP {rolling} {help_text}, quantiles over the last "
+                         f"{config.METRICS_WINDOW_S:g} s")
+            lines.append(f"# TYPE {rolling} gauge")
+            for name, h in table.items():
+                counts = h.window()
+                for q in (0.5, 0.9, 0.99):
+                    value = h.quantile(q, counts)
+                    if value is not None:
+                        lines.append(f'{rolling}{{stage="{name}",quantile="{q}"}} {value:.6f}')
+
+        # by Prometheus convention a *_total name is a monotonic counter
+        for name, (value, help_text) in (gauges or {}).items():
+            if value is None:
+                continue
+            kind = "counter" if name.endswith("_total") else "gauge"
+            lines.append(f"# HELP trashcan_{name} {help_text}")
+            lines.append(f"# TYPE trashcan_{name} {kind}")
+            lines.append(f"trashcan_{name} {float(value):g}")
+        return "\n".join(lines) + "\n"
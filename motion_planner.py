@@ -1,5 +1,5 @@
 from dataclasses import dataclass, asdict
-from typing import List, Tuple, Optional
+from typing import List, Optional, Sequence, Tuple
 import time
 import config
 
@@ -25,13 +25,115 @@ class RegressionResult:
         return asdict(self)
 
 
+class SlidingLinearFit:
+    """Least squares line y = slope * x + intercept over a sliding window.
+
+    Points are added as they are appended to the trajectory and removed as
+    they expire, so the fit costs O(1) per frame instead of a full pass.
+
+    stable=True keeps Welford style centered sums (means and co-moments),
+    which do not lose precision over long sessions. stable=False keeps raw
+    sums (Σx, Σy, Σxy, Σx², n), the cheapest but drift prone variant.
+    """
+
+    # den below this is treated as a vertical line (x is constant)
+    VERTICAL_EPS = 1e-9
+
+    def __init__(self, stable: bool = True):
+        self.stable = stable
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        # stable variant: running means and centered co-moments
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.c_xy = 0.0   # Σ (x - mean_x)(y - mean_y)
+        self.m2_x = 0.0   # Σ (x - mean_x)^2
+        # raw variant
+        self.sum_x = 0.0
+        self.sum_y = 0.0
+        self.sum_xy = 0.0
+        self.sum_xx = 0.0
+
+    def add(self, x: float, y: float):
+        self.n += 1
+        if self.stable:
+            dx = x - self.mean_x
+            self.mean_x += dx / self.n
+            self.mean_y += (y - self.mean_y) / self.n
+            self.c_xy += dx * (y - self.mean_y)
+            self.m2_x += dx * (x - self.mean_x)
+        else:
+            self.sum_x += x
+            self.sum_y += y
+            self.sum_xy += x * y
+            self.sum_xx += x * x
+
+    def remove(self, x: float, y: float):
+        """Remove a point that was previously added (usually the oldest)."""
+        if self.n <= 1:
+            self.reset()
+            return
+
+        n_prev = self.n - 1
+        if self.stable:
+            # exact inverse of add(): undo the means first, then the moments
+            mean_x_prev = self.mean_x - (x - self.mean_x) / n_prev
+            mean_y_prev = self.mean_y - (y - self.mean_y) / n_prev
+            self.c_xy -= (x - mean_x_prev) * (y - self.mean_y)
+            self.m2_x -= (x - mean_x_prev) * (x - self.mean_x)
+            if self.m2_x < 0.0:
+                self.m2_x = 0.0
+            self.mean_x = mean_x_prev
+            self.mean_y = mean_y_prev
+        else:
+            self.sum_x -= x
+            self.sum_y -= y
+            self.sum_xy -= x * y
+            self.sum_xx -= x * x
+        self.n = n_prev
+
+    def fit(self, min_points: int = 2) -> Optional[dict]:
+        """Same result layout as MotionPlanner._compute_linear_fit."""
+        n = self.n
+        if n < max(1, min_points):
+            return None
+
+        if self.stable:
+            mean_x = self.mean_x
+            mean_y = self.mean_y
+            num = self.c_xy
+            den = self.m2_x
+        else:
+            mean_x = self.sum_x / n
+            mean_y = self.sum_y / n
+            num = self.sum_xy - n * mean_x * mean_y
+            den = self.sum_xx - n * mean_x * mean_x
+
+        if den <= self.VERTICAL_EPS:
+            # vertical line x = mean_x
+            slope = None
+            intercept = None
+        else:
+            slope = num / den
+            intercept = mean_y - slope * mean_x
+
+        return {
+            "slope": slope,
+            "intercept": intercept,
+            "mean_x": mean_x,
+            "mean_y": mean_y,
+        }
+
+
 class MotionPlanner:
     """Pure backend motion planning in image space.
 
     Inputs: list of (x, y, t) points in pixel coordinates, where
       - x grows to the right
       - y grows downward
-      - t is a timestamp in seconds (time.time())
+      - t is a capture timestamp in seconds (time.monotonic())
 
     Outputs:
       - MotionResult with desired velocity / acceleration in px/s, px/s^2
@@ -39,9 +141,11 @@ class MotionPlanner:
         best fit across the image width.
     """
 
-    def __init__(self, width: int, height: int):
+    def __init__(self, width: int, height: int, clock=time.monotonic):
         self.width = width
         self.height = height
+        # "now" for the staleness check; replay substitutes recorded time
+        self.clock = clock
 
         # gains from config
         self.k_v = config.MOTION_K_V
@@ -87,8 +191,24 @@ class MotionPlanner:
             "mean_y": mean_y,
         }
 
-    def compute(self, pts: List[Tuple[float, float, float]]) -> tuple[MotionResult, RegressionResult]:
-        """Compute desired motion and regression from a trajectory segment."""
+    def compute(
+        self,
+        pts: Sequence[Tuple[float, float, float]],
+        window: Optional[SlidingLinearFit] = None,
+        target=None,
+    ) -> tuple[MotionResult, RegressionResult]:
+        """Compute desired motion and regression from a trajectory segment.
+
+        pts only needs len() and indexing at both ends, so the trajectory
+        deque can be passed as is. When `window` holds the running fit for
+        exactly these points the regression is O(1); otherwise a full
+        least squares pass is done.
+
+        `target` is an optional filtered / predicted state (anything with
+        x, y, vx, vy, e.g. target_tracker.TargetEstimate). When given, the
+        planner steers toward that point with that velocity instead of the
+        last raw detection and a two point finite difference.
+        """
 
         # Basic validation
         if len(pts) < self.min_points or self.width <= 0 or self.height <= 0:
@@ -97,7 +217,7 @@ class MotionPlanner:
         # 1. SAFETY TIMEOUT CHECK
         # Check if the last data point is older than 0.5 seconds
         last_timestamp = pts[-1][2]
-        if (time.time() - last_timestamp) > self.timeout:
+        if (self.clock() - last_timestamp) > self.timeout:
             # Return explicit zero motion to stop motors
             return (
                 MotionResult(has_data=True, vx=0.0, vy=0.0, ax=0.0, ay=0.0),
@@ -123,8 +243,18 @@ class MotionPlanner:
             vx_meas = (x_last - x_prev) / dt
             vy_meas = (y_last - y_prev) / dt
 
+        # aim at the predicted intercept point when a tracker estimate exists
+        if target is not None:
+            ex = target.x - cx
+            ey = target.y - cy
+            vx_meas = target.vx
+            vy_meas = target.vy
+
         # regression fit for direction
-        fit = self._compute_linear_fit(pts)
+        if window is not None:
+            fit = window.fit(self.min_points)
+        else:
+            fit = self._compute_linear_fit(pts)
         if fit is None:
             return MotionResult(has_data=False), RegressionResult(has_data=False)
 
@@ -0,0 +1,199 @@
+# multi_tracker.py
+"""Multi-object tracker with persistent track IDs.
+
+Every detector candidate is associated to an existing track or starts a new
+one, so two moving objects (or a flickering background blob) no longer make
+the trail jump between them. Each track owns a KalmanTargetTracker; a track
+ages out when its filter has coasted for too long.
+
+Association is gated nearest neighbor on a vectorized distance matrix
+between predicted track positions and detections, assigned greedily in
+order of increasing distance. With a dozen candidates the whole step is a
+few small NumPy ops.
+
+A target selection policy picks the track that drives MotionPlanner. The
+selection is sticky: it only changes once the current target is lost.
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+import config
+from target_tracker import KalmanTargetTracker
+
+
+@dataclass(eq=False)
+class Track:
+    id: int
+    filter: KalmanTargetTracker
+    box: tuple                  # (cx, cy, w, h) of the last hit
+    area: float
+    first_seen: float
+    last_seen: float
+    hits: int = 1
+    updated: bool = True        # matched a detection this frame
+
+    def to_dict(self):
+        est = self.filter.estimate()
+        return {
+            "id": self.id,
+            "box": list(self.box),
+            "hits": self.hits,
+            "age": self.last_seen - self.first_seen,
+            "estimate": est.to_dict() if est is not None else None,
+        }
+
+
+POLICIES = ("largest", "center", "oldest")
+
+
+class MultiTargetTracker:
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        gate_px: float = config.TRACK_GATE_PX,
+        min_hits: int = config.TRACK_MIN_HITS,
+        max_tracks: int = config.TRACK_MAX_TRACKS,
+        policy: str = config.TARGET_POLICY,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown target policy: {policy}")
+        self.width = width
+        self.height = height
+        self.gate_px = gate_px          # max distance between prediction and detection
+        self.min_hits = min_hits        # hits before a track can become the target
+        self.max_tracks = max_tracks
+        self.policy = policy
+
+        self.tracks: List[Track] = []
+        self.selected: Optional[Track] = None
+        self._next_id = 1
+
+    def reset(self):
+        self.tracks = []
+        self.selected = None
+
+    # ------------------------------------------------------------------
+    # association
+    # ------------------------------------------------------------------
+    def _associate(self, preds, dets):
+        """Greedy gated nearest neighbor; returns list of (track_idx, det_idx)."""
+        if len(preds) == 0 or len(dets) == 0:
+            return []
+
+        diff = preds[:, None, :] - dets[None, :, :2]
+        dist = np.hypot(diff[..., 0], diff[..., 1])
+
+        # gate grows with the detection size so big, close objects still match
+        gate = np.maximum(self.gate_px, 0.5 * np.maximum(dets[:, 2], dets[:, 3]))
+        dist[dist > gate[None, :]] = np.inf
+
+        pairs = []
+        used_t = np.zeros(len(preds), dtype=bool)
+        used_d = np.zeros(len(dets), dtype=bool)
+        for flat in np.argsort(dist, axis=None):
+            ti, di = divmod(int(flat), dist.shape[1])
+            if not np.isfinite(dist[ti, di]):
+                break
+            if used_t[ti] or used_d[di]:
+                continue
+            used_t[ti] = used_d[di] = True
+            pairs.append((ti, di))
+        return pairs
+
+    def step(self, detections, t: float) -> Optional[Track]:
+        """Fold in one frame of (K, 5) [cx, cy, w, h, area] candidates.
+
+        Returns the selected target track (or None). `track.updated` tells
+        whether it was seen this frame.
+        """
+        if detections is None:
+            detections = ()
+        dets = np.asarray(detections, dtype=np.float64).reshape(-1, 5)
+
+        preds = np.empty((len(self.tracks), 2))
+        for i, tr in enumerate(self.tracks):
+            est = tr.filter.predict(t)
+            preds[i] = (est.x, est.y)
+
+        pairs = self._associate(preds, dets)
+        matched_t = {ti for ti, _ in pairs}
+        matched_d = {di for _, di in pairs}
+
+        for ti, di in pairs:
+            tr = self.tracks[ti]
+            cx, cy, w, h, area = dets[di]
+            tr.filter.update(cx, cy, t)
+            tr.box = (int(cx), int(cy), int(w), int(h))
+            tr.area = float(area)
+            tr.last_seen = t
+            tr.hits += 1
+            tr.updated = True
+
+        # coast unmatched tracks; the filter resets itself once it has
+        # coasted past its limit, which is when the track is dropped
+        alive = []
+        for i, tr in enumerate(self.tracks):
+            if i not in matched_t:
+                tr.updated = False
+                tr.filter.coast(t)
+            if tr.filter.active:
+                alive.append(tr)
+        self.tracks = alive
+
+        # unmatched detections start new tracks (detector rows are largest first)
+        for di in range(len(dets)):
+            if di in matched_d or len(self.tracks) >= self.max_tracks:
+                continue
+            cx, cy, w, h, area = dets[di]
+            kf = KalmanTargetTracker()
+            kf.update(cx, cy, t)
+            self.tracks.append(Track(
+                id=self._next_id,
+                filter=kf,
+                box=(int(cx), int(cy), int(w), int(h)),
+                area=float(area),
+                first_seen=t,
+                last_seen=t,
+            ))
+            self._next_id += 1
+
+        self.selected = self._select()
+        return self.selected
+
+    def predicted_box(self, t: float) -> Optional[tuple]:
+        """(cx, cy, w, h) of the selected target, extrapolated to time t."""
+        tr = self.selected
+        if tr is None:
+            return None
+        est = tr.filter.predict(t)
+        if est is None:
+            return None
+        return (est.x, est.y, tr.box[2], tr.box[3])
+
+    # ------------------------------------------------------------------
+    # target selection
+    # ------------------------------------------------------------------
+    def _select(self) -> Optional[Track]:
+        if self.selected is not None and self.selected in self.tracks:
+            return self.selected
+
+        confirmed = [tr for tr in self.tracks if tr.hits >= self.min_hits]
+        if not confirmed:
+            return None
+
+        if self.policy == "largest":
+            return max(confirmed, key=lambda tr: tr.area)
+        if self.policy == "center":
+            cx, cy = self.width / 2.0, self.height / 2.0
+            return min(confirmed, key=lambda tr: (tr.box[0] - cx) ** 2 + (tr.box[1] - cy) ** 2)
+        return min(confirmed, key=lambda tr: tr.first_seen)
+
+    def to_dict(self):
+        return {
+            "selected": self.selected.id if self.selected is not None else None,
+            "tracks": [tr.to_dict() for tr in self.tracks],
+        }
@@ -3,45 +3,72 @@ import numpy as np
 import time
 import json
 import os
-from flask import Flask, render_template, Response
+from flask import Flask, render_template, request, Response
 from flask_socketio import SocketIO
 import threading
-from collections import deque
 from datetime import datetime
-import serial
 import config
-from motion_planner import MotionPlanner
+from motion_planner import MotionPlanner, SlidingLinearFit
+from trajectory import TrajectoryBuffer
+import overlay
 from mecanum_controller import MecanumController, MotorCommand
 from odometry import MecanumOdometry
-import sys
-import glob
+from multi_tracker import MultiTargetTracker
+from detector import BoxDetector, DetectorProfile
+from flow_tracker import HybridDetector
+from camera import CameraCapture
+from frame_hub import FrameHub, StreamProfile
+from parallel_detect import ParallelDetector
+from control_loop import FixedRateLoop
+from serial_link import SerialLinkManager, SerialWriter
+from telemetry import TelemetryBus, TelemetryFanout
+from metrics import METRICS_TEXT_EVENT, WEB_METRICS_EVENT, PipelineMetrics
+from recording import Recorder
+from frame_pool import FramePool
+from synthetic_scene import TestScene
+from pipeline import DropOldestQueue, FramePacket, Pipeline, PipelineStage
+from web_bridge import FrameChannel, SharedFrameSink, TelemetryLink
+from web_server import run_web_server
+import wire
+import multiprocessing as mp
 
 class ArducamTracker:
     def __init__(self, camera_index=0, width=1980, height=1080):
         print("Initializing Arducam Tracker...")
         
         # Camera setup
-        self.cap = None
+        self.camera = None
         self.test_mode = False
         self.camera_index = camera_index
         self.width = width
         self.height = height
 
+        # Initialize camera with Arducam-specific settings
+        self.initialize_arducam()
+
         self.motion_planner = MotionPlanner(width=self.width, height=self.height)
         self.mecanum = MecanumController()
         self.last_control_time = None
-        self.motor_serial = self._init_motor_serial()
+        # per-stage and glass-to-X latency histograms (/metrics, pipeline_stats)
+        self.metrics = PipelineMetrics()
+        self._last_origin = None    # capture time of the newest frame a plan used
+        # motor port is found and (re)connected in the background
+        self.motor_writer = SerialWriter(on_write=self._on_serial_write)
+        self.motor_link = SerialLinkManager(self.motor_writer, on_state=self._on_serial_state)
         self.last_motion = None
         self.last_regression = None
         self.odom = MecanumOdometry()
+        self.targets = MultiTargetTracker(width=self.width, height=self.height)
+        self.target_id = None
+        self.last_target = None
         self.last_control_time = None
 
-        
-        # Initialize camera with Arducam-specific settings
-        self.initialize_arducam()
-        
+
         # Tracking variables
-        self.trajectory = deque(maxlen=500)
+        # ring buffer of (x, y, t) plus the running regression over it
+        self.trajectory = TrajectoryBuffer(
+            capacity=500, fit=SlidingLinearFit(stable=config.MOTION_FIT_STABLE)
+        )
         self.detection_log = []
         self.current_position = None
         self.tracking_enabled = True
@@ -50,75 +77,135 @@ class ArducamTracker:
         self.frame_count = 0
         self.start_time = time.time()
         self.test_counter = 0
-
-        self.bg_subtractor = cv2.createBackgroundSubtractorMOG2(
-            history=200,
-            varThreshold=16,
-            detectShadows=False
-        )
+        self._test_scene = None
+
+        if config.DETECT_WORKERS > 0:
+            # detection in worker processes, frames shared via shared memory
+            self.detector = ParallelDetector(self._frame_shape(), workers=config.DETECT_WORKERS)
+        elif config.DETECT_HYBRID:
+            # full detection every N frames, optical flow in between
+            self.detector = HybridDetector(BoxDetector())
+        else:
+            self.detector = BoxDetector()
         
-        # Flask setup
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        template_dir = os.path.join(current_dir, 'templates')
-        self.app = Flask(__name__, template_folder=template_dir)
-        self.socketio = SocketIO(self.app, cors_allowed_origins="*")
-        self.setup_flask_routes()
-
         self.manual_vx = 0.0
         self.manual_vy = 0.0
         self.last_manual_time = 0
         self.manual_timeout = 0.5 # seconds before stopping if no key sent
 
+        # Background pipeline: capture -> detection -> tracking -> presentation
+        self.frame_hub = FrameHub(metrics=self.metrics)
+        # captured frames and overlay copies are written into reused buffers
+        self.frame_pool = FramePool("capture")
+        self.overlay_pool = FramePool("overlay")
+        self._next_test_frame_time = time.monotonic()
+        self.pipeline = self._build_pipeline()
+
+        # optional session recording for headless replay (replay.py)
+        self.recorder = None
+        if config.RECORD_DIR:
+            session = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+            self.recorder = Recorder(os.path.join(config.RECORD_DIR, session))
+
+        # PID, odometry and motor output at a fixed rate, independent of fps;
+        # the lock guards the target state shared with the tracking stage
+        self._state_lock = threading.Lock()
+        self.control_loop = FixedRateLoop("control", self._control_tick, config.CONTROL_RATE_HZ)
+        self.metrics_loop = FixedRateLoop("metrics", self._publish_metrics, 1.0 / config.METRICS_EMIT_S)
+
+        self.split_web = config.WEB_SPLIT_PROCESS
+        if self.split_web:
+            # this process keeps camera, detection, planning and serial;
+            # Flask and Socket.IO move to a child process
+            self.app = None
+            self._init_split_web()
+        else:
+            # Flask setup
+            current_dir = os.path.dirname(os.path.abspath(__file__))
+            template_dir = os.path.join(current_dir, 'templates')
+            self.app = Flask(__name__, template_folder=template_dir)
+            self.socketio = SocketIO(self.app, cors_allowed_origins="*")
+            self.telemetry_fanout = TelemetryFanout(self.socketio)
+            self.setup_flask_routes()
+
+        # everything that changes per frame / per tick goes out as one
+        # coalesced 'telemetry' packet at TELEMETRY_HZ
+        if self.split_web:
+            emit = self.socketio.emit
+        else:
+            emit = self.telemetry_fanout.send
+        encode = wire.encode_telemetry if config.TELEMETRY_BINARY else None
+        self.telemetry = TelemetryBus(emit, encode=encode)
 
         
     def initialize_arducam(self):
-        """Initialize Arducam on Raspberry Pi"""
+        """Open the Arducam in its fastest mode, or fall back to test mode"""
         print(f"Initializing Arducam at index {self.camera_index}...")
 
         self.test_mode = False
-        self.cap = None
+        self.camera = None
+        camera = None
 
         try:
-            # On Pi, use the default backend (V4L2)
-            self.cap = cv2.VideoCapture(self.camera_index)
-
-            if not self.cap.isOpened():
+            camera = CameraCapture(self.camera_index, self.width, self.height)
+            if not camera.open():
                 print(f"Could not open camera {self.camera_index}")
-                self.cap = None
                 self.test_mode = True
                 return
 
-            # Try to grab one test frame
-            print("Testing first frame from Arducam...")
-            for _ in range(10):
-                ret, frame = self.cap.read()
-                if ret and frame is not None:
-                    break
-                time.sleep(0.05)
-
-            if not ret or frame is None:
-                print("Camera opened but cannot read frames")
-                self.cap.release()
-                self.cap = None
-                self.test_mode = True
-                return
-
-            # Set resolution
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
-
-            actual_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            actual_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            print(f"Frame capture successful! Resolution: {actual_width}x{actual_height}")
+            self.camera = camera
+            # the planner and tracker work in the negotiated frame size
+            self.width, self.height = camera.width, camera.height
+            info = camera.info()
+            print(
+                f"Frame capture successful! Resolution: {info['resolution']} "
+                f"{info['fourcc']} @ {info['fps']:.0f} fps, buffer {info['buffer_size']}"
+                + (" (draining)" if info['drain'] else "")
+            )
 
         except Exception as e:
             print(f"Camera initialization error: {e}")
-            if self.cap:
-                self.cap.release()
-                self.cap = None
+            if camera is not None:
+                camera.release()
+            self.camera = None
             self.test_mode = True
 
         
+    def _frame_shape(self):
+        """(height, width, 3) of the frames the capture stage will produce."""
+        if self.camera and not self.test_mode:
+            return (self.camera.height, self.camera.width, 3)
+        return (self.height, self.width, 3)
+
+    def _build_pipeline(self):
+        qsize = config.PIPELINE_QUEUE_SIZE
+        to_detect = DropOldestQueue(qsize)
+        to_track = DropOldestQueue(qsize)
+        to_present = DropOldestQueue(qsize)
+
+        if isinstance(self.detector, ParallelDetector):
+            # fan out to worker processes, merge back in capture order
+            detection = [
+                PipelineStage("detection", self._dispatch_stage, inbox=to_detect),
+                PipelineStage("collect", self._collect_stage, outbox=to_track),
+            ]
+        else:
+            detection = [
+                PipelineStage("detection", self._detection_stage, inbox=to_detect, outbox=to_track,
+                              histogram=self.metrics.stage["detection"]),
+            ]
+
+        return Pipeline(
+            [PipelineStage("capture", self._capture_stage, outbox=to_detect,
+                           histogram=self.metrics.stage["capture"])]
+            + detection
+            + [
+                PipelineStage("tracking", self._tracking_stage, inbox=to_track, outbox=to_present,
+                              histogram=self.metrics.stage["tracking"]),
+                PipelineStage("presentation", self._presentation_stage, inbox=to_present),
+            ]
+        )
+
     def setup_flask_routes(self):
         @self.app.route('/')
         def index():
@@ -126,8 +213,17 @@ class ArducamTracker:
             
         @self.app.route('/video_feed')
         def video_feed():
-            return Response(self.generate_frames(), 
+            profile = StreamProfile.from_query(request.args)
+            adaptive = request.args.get('adaptive', '1') != '0'
+            return Response(self.generate_frames(profile, adaptive), 
                           mimetype='multipart/x-mixed-replace; boundary=frame')
+
+        @self.app.route('/snapshot')
+        def snapshot():
+            jpeg = self.frame_hub.snapshot()
+            if jpeg is None:
+                return "No frame available", 503
+            return Response(jpeg, mimetype='image/jpeg')
         
         @self.app.route('/test')
         def test():
@@ -135,428 +231,427 @@ class ArducamTracker:
         
         @self.app.route('/camera_info')
         def camera_info():
-            if self.cap and not self.test_mode:
-                width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                fps = self.cap.get(cv2.CAP_PROP_FPS)
-                return {
-                    'status': 'connected',
-                    'resolution': f"{width}x{height}",
-                    'fps': fps,
-                    'test_mode': False
-                }
-            else:
-                return {
-                    'status': 'test_mode',
-                    'resolution': '640x480',
-                    'fps': 30,
-                    'test_mode': True
-                }
+            return self.get_camera_info()
+
+        @self.app.route('/metrics')
+        def metrics():
+            return Response(self.metrics.render_prometheus(self.get_metric_gauges()),
+                            mimetype='text/plain; version=0.0.4')
         
         @self.socketio.on('manual_drive')
         def handle_manual_drive(data):
-            self.manual_vx = data.get('vx', 0.0)
-            self.manual_vy = data.get('vy', 0.0)
-            self.last_manual_time = time.time()
+            self.on_manual_drive(data, request.sid)
 
         @self.socketio.on('connect')
         def handle_connect():
             print('Client connected to WebSocket')
-            self.socketio.emit('trajectory_update', list(self.trajectory))
-            self.socketio.emit('system_stats', self.get_system_stats())
+            self.telemetry_fanout.connect(request.sid)
+            self.on_client_connect(None, request.sid)
+
+        @self.socketio.on('disconnect')
+        def handle_disconnect(*args):
+            self.telemetry_fanout.disconnect(request.sid)
             
         @self.socketio.on('toggle_tracking')
         def toggle_tracking(data):
-            self.tracking_enabled = data['enabled']
-            self.socketio.emit('system_stats', self.get_system_stats())
-    
-            
-
-    def detect_brown_box(self, frame):
-        """Box detection with motion gating and clearly tunable parameters."""
-        try:
-            # ==========================
-            # TUNABLE PARAMETERS - COLOR
-            # ==========================
-            # OpenCV HSV ranges:
-            #   H: 0..179, S: 0..255, V: 0..255
-            COLOR_H_MIN = 0      # min hue (0 = red, 30 = yellow, 60 = green)
-            COLOR_H_MAX = 255     # max hue (up to olive / muted green)
-            COLOR_S_MIN = 0     # min saturation (increase to reject gray/skin)
-            COLOR_S_MAX = 255    # max saturation (decrease to reject vivid colors)
-            COLOR_V_MIN = 0     # min value (increase to ignore very dark areas)
-            COLOR_V_MAX = 255    # max value (decrease to ignore very bright glare)
-
-            # ============================
-            # TUNABLE PARAMETERS - MOTION
-            # ============================
-            # Background subtractor learning rate:
-            #   higher -> adapts faster, background updates quickly
-            #   lower  -> adapts slower, motion persists longer
-            MOTION_LEARNING_RATE = 0.9
-
-            # Threshold on bg subtractor output:
-            #   lower -> more pixels considered moving (noisier)
-            #   higher -> fewer pixels considered moving
-            MOTION_BINARY_THRESH = 15
-
-            # ==========================
-            # TUNABLE PARAMETERS - SHAPE
-            # ==========================
-            # Area in pixels. Set based on how big the box appears.
-            AREA_MIN = 15000      # min area for a contour to be considered
-            AREA_MAX = 500_000 # max area (probably never hit but kept as guard)
-
-            # Minimum width and height of bounding rectangle
-            WIDTH_MIN = 150
-            HEIGHT_MIN = 150
-
-            # Acceptable width / height ratio
-            ASPECT_MIN = 0.3
-            ASPECT_MAX = 3.0
-
-            # Solidity filter (area / convex_hull_area)
-            #   closer to 1 -> filled, compact shapes
-            SOLIDITY_MIN = 0.7
-
-            # Kernel size for morphology (noise cleaning)
-            MORPH_KERNEL_SIZE = 3
-
-            # =====================
-            #     PIPELINE
-            # =====================
-
-            # Convert to HSV
-            hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-
-            # Color mask for muted cardboard like stuff
-            lower_cardboard = np.array(
-                [COLOR_H_MIN, COLOR_S_MIN, COLOR_V_MIN],
-                dtype=np.uint8
-            )
-            upper_cardboard = np.array(
-                [COLOR_H_MAX, COLOR_S_MAX, COLOR_V_MAX],
-                dtype=np.uint8
-            )
-            color_mask = cv2.inRange(hsv, lower_cardboard, upper_cardboard)
-
-            # Motion mask from background subtractor
-            motion_raw = self.bg_subtractor.apply(
-                frame, learningRate=MOTION_LEARNING_RATE
-            )
-            _, motion_mask = cv2.threshold(
-                motion_raw, MOTION_BINARY_THRESH, 255, cv2.THRESH_BINARY
-            )
-
-            # Only moving cardboard colored pixels
-            box_mask = cv2.bitwise_and(color_mask, motion_mask)
-
-            # Morphology to clean noise
-            kernel = np.ones((MORPH_KERNEL_SIZE, MORPH_KERNEL_SIZE), np.uint8)
-            box_mask = cv2.morphologyEx(box_mask, cv2.MORPH_CLOSE, kernel)
-            box_mask = cv2.morphologyEx(box_mask, cv2.MORPH_OPEN, kernel)
-
-            # Find contours
-            contours, _ = cv2.findContours(
-                box_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-            )
-
-            if not contours:
-                return None, frame, box_mask
-
-            valid_contours = []
-            for contour in contours:
-                area = cv2.contourArea(contour)
-                if not (AREA_MIN <= area <= AREA_MAX):
-                    continue
-
-                x, y, w, h = cv2.boundingRect(contour)
-                if w < WIDTH_MIN or h < HEIGHT_MIN:
-                    continue
+            self.on_toggle_tracking(data, request.sid)
 
-                aspect_ratio = w / float(h)
-                if not (ASPECT_MIN <= aspect_ratio <= ASPECT_MAX):
-                    continue
+        @self.socketio.on('set_detector_profile')
+        def set_detector_profile(data):
+            self.on_set_detector_profile(data, request.sid)
 
-                # Solidity filter
-                hull = cv2.convexHull(contour)
-                hull_area = cv2.contourArea(hull)
-                if hull_area == 0:
-                    continue
-                solidity = float(area) / hull_area
-                if solidity < SOLIDITY_MIN:
-                    continue
+        @self.socketio.on('get_trajectory')
+        def get_trajectory(data=None):
+            self.on_get_trajectory(data, request.sid)
 
-                valid_contours.append(contour)
-
-            if not valid_contours:
-                return None, frame, box_mask
+    def get_camera_info(self):
+        if self.camera and not self.test_mode:
+            info = self.camera.info()
+            info.update(status='connected', test_mode=False)
+            return info
+        else:
+            return {
+                'status': 'test_mode',
+                'resolution': '640x480',
+                'fps': 30,
+                'test_mode': True
+            }
+
+    # ------------------------------------------------------------------
+    # dashboard commands (Socket.IO handlers, or the command queue in split mode)
+    # sid is the sender, for replies that only concern that client
+    # ------------------------------------------------------------------
+    def on_manual_drive(self, data, sid=None):
+        self.manual_vx = data.get('vx', 0.0)
+        self.manual_vy = data.get('vy', 0.0)
+        self.last_manual_time = time.time()
+
+    def on_client_connect(self, data=None, sid=None):
+        # full telemetry state for the newcomer, deltas after that
+        self.telemetry.request_keyframe()
+        # the trajectory comes on request, decimated to the client's plot
+        self.socketio.emit('system_stats', self.get_system_stats(), to=sid)
+        self.socketio.emit('detector_profiles', self.get_detector_profiles(), to=sid)
+        self.socketio.emit('serial_status', self.motor_link.stats(), to=sid)
+        self.socketio.emit('overlay_config', self.get_overlay_config(), to=sid)
+
+    def on_web_metrics(self, data=None, sid=None):
+        """Split mode: encode / send histograms recorded by the web process."""
+        if data:
+            self.metrics.load(data)
+
+    def on_get_trajectory(self, data=None, sid=None):
+        """Binary trajectory snapshot, LTTB-decimated to data['width'] points."""
+        limit = config.TRAJECTORY_SNAPSHOT_POINTS
+        try:
+            points = min(limit, max(3, int((data or {}).get('width', limit))))
+        except (TypeError, ValueError):
+            points = limit
+        with self._state_lock:
+            xs, ys, ts = self.trajectory.snapshot()
+            track_id = self.target_id
+        payload = wire.encode_trajectory(xs, ys, ts, points, time.monotonic(), track_id)
+        self.socketio.emit('trajectory_update', payload, to=sid)
+
+    def on_toggle_tracking(self, data, sid=None):
+        self.tracking_enabled = data['enabled']
+        self.socketio.emit('system_stats', self.get_system_stats())
+
+    def on_set_detector_profile(self, data, sid=None):
+        name = data.get('name')
+        try:
+            self.detector.set_profile(DetectorProfile.from_config(name))
+            print(f"Detector profile -> {name}")
+        except (KeyError, TypeError) as e:
+            print(f"Detector profile error: {e}")
+        self.socketio.emit('detector_profiles', self.get_detector_profiles())
+
+    # ------------------------------------------------------------------
+    # split deployment: dashboard in its own process
+    # ------------------------------------------------------------------
+    def _init_split_web(self):
+        """Route frames and telemetry to a separate web process."""
+        ctx = mp.get_context("spawn")
+        self._web_events = ctx.Queue(config.WEB_EVENT_QUEUE_SIZE)
+        self._web_commands = ctx.Queue(config.WEB_COMMAND_QUEUE_SIZE)
+        self._web_frame_cond = ctx.Condition()
+        self._web_subscribers = ctx.Value('i', 0, lock=False)
+        self._web_channel = FrameChannel(self._frame_shape(), cond=self._web_frame_cond)
+
+        # same interfaces the pipeline already uses
+        self.frame_hub = SharedFrameSink(self._web_channel, self._web_subscribers)
+        self.socketio = TelemetryLink(self._web_events)
+
+        self._command_handlers = {
+            'connect': self.on_client_connect,
+            'manual_drive': self.on_manual_drive,
+            'toggle_tracking': self.on_toggle_tracking,
+            'set_detector_profile': self.on_set_detector_profile,
+            'get_trajectory': self.on_get_trajectory,
+            WEB_METRICS_EVENT: self.on_web_metrics,
+        }
+        self._web_process = ctx.Process(
+            target=run_web_server,
+            args=(
+                self._web_channel.name, self._web_channel.shape, self._web_frame_cond,
+                self._web_subscribers,
+                self._web_events, self._web_commands, self.get_camera_info(),
+                config.WEB_HOST, config.WEB_PORT,
+            ),
+            name="web",
+            daemon=True,
+        )
 
-            largest_contour = max(valid_contours, key=cv2.contourArea)
-            x, y, w, h = cv2.boundingRect(largest_contour)
-            center_x = x + w // 2
-            center_y = y + h // 2
+    def _command_loop(self):
+        while True:
+            try:
+                event, data, sid = self._web_commands.get()
+            except (EOFError, OSError):
+                break
+            handler = self._command_handlers.get(event)
+            if handler is None:
+                continue
+            try:
+                handler(data, sid)
+            except Exception as e:
+                print(f"Dashboard command error ({event}): {e}")
 
-            return (center_x, center_y, w, h), frame, box_mask
+    def detect_brown_box(self, frame, timestamp=None, focus=None):
+        """Box detection with motion gating; see BoxDetector for the tunables."""
+        try:
+            if timestamp is None:
+                timestamp = time.monotonic()
+            box, mask = self.detector.detect(frame, timestamp, focus)
+            return box, frame, mask
 
         except Exception as e:
             print(f"Detection error: {e}")
             return None, frame, None
 
-
-
-    def create_test_frame(self):
+    def create_test_frame(self, out=None):
         """Create test frame that simulates Arducam high resolution"""
-        # Create background
-        frame = np.ones((self.height, self.width, 3), dtype=np.uint8) * 100
-        
-        # Create moving brown box
         self.test_counter += 1
-        center_x = self.width // 2 + int(300 * np.sin(self.test_counter * 0.02))
-        center_y = self.height // 2 + int(200 * np.cos(self.test_counter * 0.03))
-        w, h = 80, 60
-        
-        # Draw brown box
-        brown_color = (42, 42, 165)  # Brown in BGR
-        cv2.rectangle(frame, 
-                     (center_x - w//2, center_y - h//2),
-                     (center_x + w//2, center_y + h//2),
-                     brown_color, -1)
-        
-        # Add info text
-        cv2.putText(frame, "ARDUCAM TEST MODE - No Camera Detected", 
-                   (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-        cv2.putText(frame, f"Resolution: {self.width}x{self.height}", 
-                   (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-        cv2.putText(frame, "Check USB connection and run arducam_setup.py", 
-                   (50, 140), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        
-        return frame, (center_x, center_y, w, h)
-    
-    def _init_motor_serial(self):
+        if self._test_scene is None:
+            # background and banner text are rendered once, then blitted
+            self._test_scene = TestScene(self.width, self.height)
+        return self._test_scene.render(self.test_counter, out)
+
+    def _on_serial_state(self, stats):
+        """Link manager callback: push link state changes to the dashboard."""
+        self.telemetry.set('serial', stats)
+
+    def _send_motor_command(self, cmd: MotorCommand, origin: float = None):
         """
-        Initialize serial connection, handling macOS and Linux naming differences.
+        Hand motor powers to the background serial writer.
+        Returns immediately; see serial_link.py for the wire formats.
+        origin is the capture time of the frame cmd was planned from.
         """
-        # 1. Define patterns based on OS
-        if sys.platform.startswith('darwin'):
-            # macOS patterns
-            patterns = ['/dev/tty.usbmodem*', '/dev/tty.usbserial*']
+        self.motor_writer.submit(cmd, origin)
+
+    def _on_serial_write(self, origin, written_at, seconds):
+        """Serial writer callback: a command just left on the port."""
+        self.metrics.observe_stage("serial_write", seconds)
+        # glass-to-motor: only the first command planned from a new frame has an origin
+        self.metrics.observe_latency("serial_write", origin, written_at)
+
+    def _capture_stage(self):
+        """Pipeline source: grab one frame from the camera (or the test scene)."""
+        if self.test_mode:
+            # pace the synthetic scene like a real camera would
+            period = 1.0 / config.TEST_MODE_FPS
+            wait = self._next_test_frame_time - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._next_test_frame_time = max(self._next_test_frame_time + period, time.monotonic())
+            timestamp = time.monotonic()
+            frame, box_position = self.create_test_frame(self.frame_pool.acquire(self._frame_shape()))
+            synthetic = True
         else:
-            # Linux/Pi patterns
-            patterns = ['/dev/ttyACM*', '/dev/ttyUSB*']
-
-        # 2. Find matching ports
-        possible_ports = []
-        for pattern in patterns:
-            possible_ports.extend(glob.glob(pattern))
-
-        if not possible_ports:
-            print(f"⚠ No serial devices found matching patterns: {patterns}")
-            print("  - Check USB cable (ensure it has data wires)")
-            print("  - On Mac, run 'ls /dev/tty.*' in terminal to verify")
-            return None
+            frame, timestamp = self.camera.read(self.frame_pool.acquire(self._frame_shape()))
+            if frame is None:
+                print("Failed to read from Arducam - switching to test mode")
+                self.test_mode = True
+                return None
+            box_position = None
+            synthetic = False
+
+        # FPS calculation
+        self.frame_count += 1
+        if self.frame_count % 30 == 0:
+            elapsed = time.time() - self.start_time
+            self.fps = 30 / elapsed if elapsed > 0 else 0.0
+            self.start_time = time.time()
+
+        return FramePacket(
+            seq=self.frame_count,
+            frame=frame,
+            timestamp=timestamp,
+            synthetic=synthetic,
+            box_position=box_position,
+        )
 
-        # 3. Connect to the first found port
-        port = possible_ports[0]
-        baud = getattr(config, 'SERIAL_BAUDRATE', 115200)
+    def _detection_stage(self, packet: FramePacket):
+        """Run the detector on live frames; test frames carry their own box."""
+        if not packet.synthetic:
+            focus = self._focus(packet.timestamp)
+            box_position, _, mask = self.detect_brown_box(packet.frame, packet.timestamp, focus)
+            packet.box_position = box_position
+            packet.mask = mask
+            packet.candidates = self.detector.candidates
+        elif packet.box_position is not None:
+            cx, cy, w, h = packet.box_position
+            packet.candidates = np.array([[cx, cy, w, h, w * h]], dtype=np.float32)
+        self.metrics.observe_latency("detection", packet.timestamp)
+        return packet
+
+    def _focus(self, t: float):
+        """Predicted box of the selected target at time t, for the detector ROI."""
+        with self._state_lock:
+            return self.targets.predicted_box(t)
+
+    def _dispatch_stage(self, packet: FramePacket):
+        """Hand a frame to the detection worker processes."""
+        if packet.synthetic and packet.box_position is not None:
+            cx, cy, w, h = packet.box_position
+            packet.candidates = np.array([[cx, cy, w, h, w * h]], dtype=np.float32)
+        self.detector.submit(packet)
+        return None
+
+    def _collect_stage(self):
+        """Pipeline source: detection results, in capture order."""
+        packets = self.detector.collect(timeout=0.1, focus=self._focus)
+        for packet in packets:
+            self.metrics.observe_latency("detection", packet.timestamp)
+        return packets or None
+
+    def _tracking_stage(self, packet: FramePacket):
+        """Fold one frame's detections into the target state.
+
+        Planning and motor output run separately in _control_tick at a fixed
+        rate; this stage only updates what the control loop reads.
+        """
+        now = packet.timestamp
+
+        # --- 1. Associate candidates to tracks and pick the target ---
+        track = None
+        box_position = None
+        with self._state_lock:
+            if self.tracking_enabled:
+                track = self.targets.step(packet.candidates, now)
+                track_id = track.id if track is not None else None
+                if track_id != self.target_id:
+                    # new target: restart the trail so the fit never mixes objects
+                    self.trajectory.clear()
+                    self.target_id = track_id
+                if track is not None and track.updated:
+                    box_position = track.box
+            packet.box_position = box_position
+
+            # --- 2. Update trajectory (only if tracking enabled + target seen) ---
+            if box_position:
+                center_x, center_y, w, h = box_position
+                self.current_position = (center_x, center_y)
+                self.detection_count += 1
+                # store (x, y, t)
+                self.trajectory.append(center_x, center_y, now)
+
+            # Drop old points so trail is at most TRAIL_SECONDS long
+            self.trajectory.expire(now - config.TRAIL_SECONDS)
+
+            # server side overlay needs a snapshot only when someone is watching
+            if config.OVERLAY_MODE == "server" and self.frame_hub.wants_frames:
+                packet.trail = self.trajectory.snapshot()
+
+        if self.recorder is not None:
+            self.recorder.record_frame(packet.frame, now, packet.seq, box_position)
+        self.metrics.observe_latency("tracking", packet.timestamp)
+
+        if box_position:
+            self.telemetry.append(
+                "detections",
+                {
+                    "x": center_x,
+                    "y": center_y,
+                    "width": w,
+                    "height": h,
+                    "track_id": track.id,
+                    "speed": 0,
+                    "direction": 0,
+                    "timestamp": now,
+                },
+            )
 
-        try:
-            ser = serial.Serial(port, baud, timeout=0.1)
-            print(f"✓ Motor link established: {port} @ {baud}")
-            return ser
-        except Exception as e:
-            print(f"⚠ Failed to open {port}: {e}")
-            return None
+        # --- 3. Housekeeping ---
+        # Emit stats every 10 frames
+        if packet.seq % 10 == 0:
+            self.telemetry.set("stats", self.get_system_stats())
+        return packet
 
-    def _send_motor_command(self, cmd: MotorCommand):
-        """
-        Send motor powers as comma-separated percentages over serial.
-        Format: "FL,FR,RL,RR\n" (e.g., "100,100,50,0")
+    def _control_tick(self, dt: float, now: float):
+        """One fixed-rate control step: plan, PID, STM32 write, odometry.
+
+        dt is the measured monotonic time since the previous tick. Between
+        camera frames the target filter is predicted forward, so the plan
+        keeps moving with the target instead of repeating the last frame.
         """
-        if self.motor_serial is None:
+        motor_cmd = None
+        motion = None
+        reg = None
+        origin = None       # capture time of the newest trajectory point
+
+        # Check if manual input was received recently (within 0.5s)
+        manual_active = (time.time() - self.last_manual_time) < self.manual_timeout
+
+        if manual_active:
+            # >>> MANUAL MODE <<<
+            motor_cmd = self.mecanum.compute_manual(self.manual_vx, self.manual_vy)
+
+        elif self.tracking_enabled:
+            # >>> AUTONOMOUS MODE <<<
+            # Plan toward where the target will be when the command takes
+            # effect (frame timestamps and now are both time.monotonic())
+            t0 = time.perf_counter()
+            with self._state_lock:
+                if len(self.trajectory) >= 2:
+                    origin = self.trajectory[-1][2]
+                    target = None
+                    track = self.targets.selected
+                    if track is not None:
+                        target = track.filter.predict(now + config.CONTROL_LATENCY_S)
+                    self.last_target = target
+                    motion, reg = self.motion_planner.compute(
+                        self.trajectory, self.trajectory.fit, target
+                    )
+            if origin is not None:
+                self.metrics.observe_stage("planning", time.perf_counter() - t0)
+            if motion is not None:
+                self.last_motion = motion
+                self.last_regression = reg
+                motor_cmd = self.mecanum.compute(motion, dt)
+
+        if motor_cmd is None:
             return
 
-        try:
-            # 1. Scale normalized float (-1.0 to 1.0) to percentage (-100 to 100)
-            # 2. Clamp between -100 and 100 to ensure safety
-            # 3. Convert to integer
-            def to_pct(val):
-                return int(max(-100, min(100, val * 100)))
-
-            fl_pct = to_pct(cmd.fl)
-            fr_pct = to_pct(cmd.fr)
-            rl_pct = to_pct(cmd.rl)
-            rr_pct = to_pct(cmd.rr)
-
-            # Format: "100,100,50,0"
-            line = f"{fl_pct},{fr_pct},{rl_pct},{rr_pct}\n"
-            
-            # Write bytes to serial
-            self.motor_serial.write(line.encode("ascii"))
-            
-        except Exception as e:
-            print(f"Motor serial error: {e}")
-            # Optional: Attempt to reconnect if error persists
-
-
-    def generate_frames(self):
-        """Generate video frames with Arducam optimization and Manual/Auto control mixing."""
-        TAIL_SECONDS = 3.0  # how long the trail should live
+        # ticks between frames re-plan from the same frame; its latency
+        # counts once, for the first command that reflects it
+        fresh = origin is not None and origin != self._last_origin
+        if fresh:
+            self._last_origin = origin
+            self.metrics.observe_latency("planning", origin)
+
+        # Send to STM32 via Serial, every tick
+        t0 = time.perf_counter()
+        self._send_motor_command(motor_cmd, origin if fresh else None)
+        if self.recorder is not None:
+            self.recorder.record_motor(motor_cmd, now)
+        self.last_control_time = now
+
+        # Update Odometry with the real elapsed time
+        pose = self.odom.step(motor_cmd, dt)
+        self.metrics.observe_stage("control", time.perf_counter() - t0)
+        if fresh:
+            self.metrics.observe_latency("control", origin)
+
+        # latest values only; to_dict() runs at TELEMETRY_HZ, not every tick
+        if motion is not None:
+            self.telemetry.set("motion", motion)
+            self.telemetry.set("fit", reg)
+        self.telemetry.set("motor", motor_cmd)
+        # odometry updates its pose in place, so hand over a copy
+        self.telemetry.set("pose", pose.to_dict())
+
+    def _presentation_stage(self, packet: FramePacket):
+        """Encode the frame for /video_feed viewers, drawing overlays if asked."""
+        # nobody watching -> no drawing and no encoding
+        if not self.frame_hub.wants_frames:
+            return None
 
-        while True:
-            try:
-                # --- 1. Acquire frame and detection ---
-                if self.test_mode:
-                    frame, box_position = self.create_test_frame()
-                    mask = None
-                else:
-                    ret, frame = self.cap.read()
-                    if not ret:
-                        print("Failed to read from Arducam - switching to test mode")
-                        self.test_mode = True
-                        continue
-                    box_position, frame, mask = self.detect_brown_box(frame)
-
-                # --- 2. FPS calculation ---
-                self.frame_count += 1
-                if self.frame_count % 30 == 0:
-                    elapsed = time.time() - self.start_time
-                    self.fps = 30 / elapsed if elapsed > 0 else 0.0
-                    self.start_time = time.time()
-
-                processed_frame = frame.copy()
-                now = time.time()
-
-                # --- 3. Update trajectory (only if tracking enabled + box detected) ---
-                if self.tracking_enabled and box_position:
-                    center_x, center_y, w, h = box_position
-                    self.current_position = (center_x, center_y)
-                    self.detection_count += 1
-                    # store (x, y, t)
-                    self.trajectory.append((center_x, center_y, now))
-
-                # Drop old points so trail is at most TAIL_SECONDS long
-                cutoff = now - TAIL_SECONDS
-                while self.trajectory and self.trajectory[0][2] < cutoff:
-                    self.trajectory.popleft()
-
-                # --- 4. CONTROL LOGIC (Manual vs Autonomous) ---
-                motor_cmd = None
-                
-                # Check if manual input was received recently (within 0.5s)
-                # Defaults to 0 if variables aren't set yet to prevent crashes
-                last_manual = getattr(self, 'last_manual_time', 0)
-                manual_active = (now - last_manual) < 0.5
-
-                if manual_active:
-                    # >>> MANUAL MODE <<<
-                    vx = getattr(self, 'manual_vx', 0.0)
-                    vy = getattr(self, 'manual_vy', 0.0)
-                    # Use the new compute_manual method you added to MecanumController
-                    motor_cmd = self.mecanum.compute_manual(vx, vy)
-                
-                elif self.tracking_enabled and len(self.trajectory) >= 2:
-                    # >>> AUTONOMOUS MODE <<<
-                    # 1. Plan Motion
-                    motion, reg = self.motion_planner.compute(list(self.trajectory))
-                    self.last_motion = motion
-                    self.last_regression = reg
-
-                    # 2. Update Web Interface with Plan
-                    self.socketio.emit("motion_update", motion.to_dict())
-                    self.socketio.emit("trajectory_fit", reg.to_dict())
-
-                    # 3. Calculate DT for PID
-                    if self.last_control_time is None:
-                        dt = 0.0
-                    else:
-                        dt = max(1e-3, now - self.last_control_time)
-                    
-                    # 4. Compute Motor Command via PID
-                    motor_cmd = self.mecanum.compute(motion, dt)
-
-                # --- 5. Execute Motor Command ---
-                if motor_cmd is not None:
-                    self.last_control_time = now
-                    
-                    # Send to Web UI
-                    self.socketio.emit("motor_update", motor_cmd.to_dict())
-                    
-                    # Send to STM32 via Serial
-                    self._send_motor_command(motor_cmd)
-
-                    # Update Odometry
-                    dt_odom = 0.1 # approximate if dt not available
-                    pose = self.odom.step(motor_cmd, dt_odom)
-                    self.socketio.emit("pose_update", pose.to_dict())
-
-                # --- 6. Visualization: Draw Trajectory ---
-                points = list(self.trajectory)
-                if len(points) >= 2:
-                    for i in range(1, len(points)):
-                        x1, y1, t1 = points[i - 1]
-                        x2, y2, t2 = points[i]
-
-                        # Newer segments brighter
-                        age = now - t2
-                        frac = max(0.0, min(1.0, 1.0 - age / TAIL_SECONDS))
-                        intensity = int(60 + 195 * frac)
-                        color = (intensity, 0, 0) # BGR: Blue
-
-                        cv2.line(
-                            processed_frame,
-                            (int(x1), int(y1)),
-                            (int(x2), int(y2)),
-                            color,
-                            6
-                        )
-
-                # --- 7. Visualization: Draw Box ---
-                if self.tracking_enabled and box_position:
-                    center_x, center_y, w, h = box_position
-                    cv2.rectangle(
-                        processed_frame,
-                        (center_x - w // 2, center_y - h // 2),
-                        (center_x + w // 2, center_y + h // 2),
-                        (0, 255, 0),
-                        3,
-                    )
-                    cv2.circle(processed_frame, (center_x, center_y), 8, (0, 0, 255), -1)
-
-                    self.socketio.emit(
-                        "detection_update",
-                        {
-                            "x": center_x,
-                            "y": center_y,
-                            "width": w,
-                            "height": h,
-                            "speed": 0,
-                            "direction": 0,
-                            "timestamp": now,
-                        },
-                    )
+        if config.OVERLAY_MODE != "server":
+            # the dashboard draws trail, box and fit itself: stream the raw
+            # frame, no copy and no drawing
+            self.frame_hub.publish_frame(packet.frame, packet.seq, packet.timestamp)
+            return None
 
-                # --- 8. Housekeeping ---
-                # Emit stats every 10 frames
-                if self.frame_count % 10 == 0:
-                    self.socketio.emit("system_stats", self.get_system_stats())
+        processed_frame = self.overlay_pool.acquire(packet.frame.shape)
+        np.copyto(processed_frame, packet.frame)
+        now = packet.timestamp
+        box_position = packet.box_position
 
-                # Resize for streaming if needed
-                if processed_frame.shape[1] > 1280:
-                    processed_frame = cv2.resize(processed_frame, (1280, 720))
+        # --- Visualization: Draw Trajectory ---
+        if packet.trail is not None:
+            xs, ys, ts = packet.trail
+            overlay.draw_trail(processed_frame, xs, ys, ts, now, config.TRAIL_SECONDS)
 
-                # Encode and yield
-                ret, buffer = cv2.imencode(".jpg", processed_frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-                frame_bytes = buffer.tobytes()
+        # --- Visualization: Draw Box ---
+        if self.tracking_enabled and box_position:
+            overlay.draw_box(processed_frame, box_position)
 
-                yield (
-                    b"--frame\r\n"
-                    b"Content-Type: image/jpeg\r\n\r\n" + frame_bytes + b"\r\n"
-                )
+        self.frame_hub.publish_frame(processed_frame, packet.seq, packet.timestamp)
+        return None
 
-            except Exception as e:
-                print(f"Frame generation error: {e}")
-                time.sleep(0.1)
+    def generate_frames(self, profile=None, adaptive=True):
+        """MJPEG stream for one /video_feed client, served from the shared hub."""
+        return self.frame_hub.stream(profile, adaptive)
 
     def _apply_motion_to_motors(self, motion):
         """
@@ -580,6 +675,56 @@ class ArducamTracker:
 
 
 
+    def get_overlay_config(self):
+        return {
+            'mode': config.OVERLAY_MODE,
+            'trail_seconds': config.TRAIL_SECONDS,
+            'width': self.width,
+            'height': self.height,
+        }
+
+    def get_detector_profiles(self):
+        return {
+            'available': list(config.DETECTOR_PROFILES.keys()),
+            'active': self.detector.profile.name,
+        }
+
+    def get_metric_gauges(self):
+        """Plain gauges and *_total counters exported next to the latency histograms on /metrics."""
+        control = self.control_loop.stats()
+        writer = self.motor_writer.stats()
+        return {
+            'fps': (self.fps, "Tracking stage frames per second"),
+            'detections_total': (self.detection_count, "Frames with a detected box"),
+            'track_count': (len(self.targets.tracks), "Live tracks"),
+            'trajectory_points': (len(self.trajectory), "Points in the target trajectory"),
+            'control_overruns_total': (control['overruns'], "Control ticks that missed their deadline"),
+            'control_jitter_ms': (control['jitter_ms'], "Control loop jitter"),
+            'serial_connected': (writer['connected'], "1 if a motor port is attached"),
+            'serial_sent_total': (writer['sent'], "Motor commands written"),
+            'serial_errors_total': (writer['errors'], "Motor port write errors"),
+            'stream_subscribers': (self.frame_hub.subscribers, "Open /video_feed streams"),
+            'frame_pool_misses_total': (
+                sum(p['misses'] for p in self.frame_pool_stats()),
+                "Frame buffers allocated because every pooled one was in use",
+            ),
+        }
+
+    def frame_pool_stats(self):
+        pools = [self.frame_pool.stats(), self.overlay_pool.stats(),
+                 self.frame_hub.stats()['resize_pool']]
+        if isinstance(self.detector, BoxDetector):
+            pools.append(self.detector.stats()['mask_pool'])
+        return pools
+
+    def _publish_metrics(self, dt: float, now: float):
+        """Metrics loop tick: rolling latency summary for the dashboard."""
+        self.socketio.emit('pipeline_stats', self.metrics.summary())
+        if self.split_web:
+            # the web process serves /metrics from the latest copy
+            self.socketio.emit(METRICS_TEXT_EVENT,
+                               self.metrics.render_prometheus(self.get_metric_gauges()))
+
     def get_system_stats(self):
         return {
             'detection_count': self.detection_count,
@@ -587,9 +732,21 @@ class ArducamTracker:
             'tracking_enabled': self.tracking_enabled,
             'trajectory_length': len(self.trajectory),
             'current_position': self.current_position,
+            'target_id': self.target_id,
+            'track_count': len(self.targets.tracks),
             'log_entries': len(self.detection_log),
             'test_mode': self.test_mode,
-            'resolution': f"{self.width}x{self.height}"
+            'resolution': f"{self.width}x{self.height}",
+            'pipeline': self.pipeline.stats(),
+            'control': self.control_loop.stats(),
+            'serial': self.motor_link.stats(),
+            'stream': self.frame_hub.stats(),
+            'detector': self.detector.stats() if hasattr(self.detector, 'stats') else None,
+            'web': self.socketio.stats() if self.split_web else None,
+            'telemetry': self.telemetry.stats(),
+            'recorder': self.recorder.stats() if self.recorder is not None else None,
+            'metrics': self.metrics.summary(),
+            'frame_pools': self.frame_pool_stats(),
         }
 
     def run(self):
@@ -598,23 +755,54 @@ class ArducamTracker:
             print("🚀 Starting Arducam Tracking System...")
             print(f"📷 Camera status: {'TEST MODE' if self.test_mode else 'LIVE'}")
             print(f"📊 Resolution: {self.width}x{self.height}")
-            print("🌐 Web dashboard: http://localhost:5000")
+            print(f"🌐 Web dashboard: http://localhost:{config.WEB_PORT}"
+                  + (" (separate process)" if self.split_web else ""))
             print("   - /camera_info for camera status")
             print("   - /video_feed for live stream")
-            
-            self.socketio.run(
-                self.app, 
-                host='0.0.0.0', 
-                port=5000, 
-                debug=False, 
-                allow_unsafe_werkzeug=True
-            )
+
+            # vision + control run whether or not anyone watches the dashboard
+            if self.recorder is not None:
+                self.recorder.start()
+            self.motor_writer.start()
+            self.motor_link.start()
+            self.pipeline.start()
+            self.control_loop.start()
+            self.telemetry.start()
+            self.metrics_loop.start()
+
+            if self.split_web:
+                self._web_process.start()
+                threading.Thread(target=self._command_loop, name="web-commands", daemon=True).start()
+                self._web_process.join()
+            else:
+                self.socketio.run(
+                    self.app, 
+                    host=config.WEB_HOST, 
+                    port=config.WEB_PORT, 
+                    debug=False, 
+                    allow_unsafe_werkzeug=True
+                )
                 
         except KeyboardInterrupt:
             print("Shutting down...")
         finally:
-            if self.cap and not self.test_mode:
-                self.cap.release()
+            self.metrics_loop.stop()
+            self.telemetry.stop()
+            self.control_loop.stop()
+            self.pipeline.stop()
+            if self.recorder is not None:
+                self.recorder.stop()
+            self.motor_link.stop()
+            self.motor_writer.stop()
+            if isinstance(self.detector, ParallelDetector):
+                self.detector.close()
+            if self.split_web:
+                if self._web_process.is_alive():
+                    self._web_process.terminate()
+                    self._web_process.join(timeout=1.0)
+                self._web_channel.close()
+            if self.camera:
+                self.camera.release()
 
 if __name__ == "__main__":
     # Try different resolutions for Arducam
@@ -0,0 +1,51 @@
+# overlay.py
+"""Server side drawing of the trajectory trail and detection box."""
+
+import cv2
+import numpy as np
+
+
+# trail segments are grouped into this many brightness levels so each level
+# is a single cv2.polylines call instead of one cv2.line per segment
+TRAIL_LEVELS = 16
+
+
+def draw_trail(frame, xs, ys, ts, now: float, tail_seconds: float, thickness: int = 6):
+    """Draw the trail with newer segments brighter (BGR blue)."""
+    n = len(xs)
+    if n < 2:
+        return frame
+
+    pts = np.empty((n, 2), dtype=np.int32)
+    pts[:, 0] = xs
+    pts[:, 1] = ys
+    # (n - 1, 2, 2): one two-point polyline per segment
+    segments = np.stack((pts[:-1], pts[1:]), axis=1)
+
+    # Newer segments brighter: age of each segment's end point
+    frac = np.clip(1.0 - (now - np.asarray(ts[1:])) / tail_seconds, 0.0, 1.0)
+    level = np.minimum((frac * TRAIL_LEVELS).astype(np.int32), TRAIL_LEVELS - 1)
+
+    for lv in np.unique(level):
+        intensity = int(60 + 195 * (lv + 0.5) / TRAIL_LEVELS)
+        cv2.polylines(
+            frame,
+            list(segments[level == lv]),
+            False,
+            (intensity, 0, 0),
+            thickness,
+        )
+    return frame
+
+
+def draw_box(frame, box_position):
+    center_x, center_y, w, h = box_position
+    cv2.rectangle(
+        frame,
+        (center_x - w // 2, center_y - h // 2),
+        (center_x + w // 2, center_y + h // 2),
+        (0, 255, 0),
+        3,
+    )
+    cv2.circle(frame, (center_x, center_y), 8, (0, 0, 255), -1)
+    return frame
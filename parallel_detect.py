@@ -0,0 +1,339 @@
+# parallel_detect.py
+"""Multi-core detection backend using shared memory frames.
+
+Captured frames are copied into a small pool of
+multiprocessing.shared_memory slots. Every frame goes to every worker
+process, and each worker owns one horizontal band of it: it downscales its
+band and runs the background subtractor on it, writing the coarse band and
+its motion mask into shared memory next to the frame. MOG2 models each
+pixel on its own and the pyramid downscale averages whole blocks (band
+edges are aligned to the pyramid factor), so the bands together give the
+same mask as BoxDetector.detect on the whole frame, and each band's model
+sees every frame. (Exactly the same only if the frame height is a multiple
+of the factor, as in all the camera modes; otherwise the band edges
+interpolate slightly differently.) Only the slot index and sequence
+number travel through the task queues; frames themselves are never pickled.
+
+The rest of detection (color gate, morphology, component filter, refine)
+runs once per frame on the assembled mask in collect(), in capture order,
+so the ROI around the predicted position (DETECT_ROI_MODE) works as in the
+single process path. A frame whose bands don't all come back within
+max_wait is dropped and its slot reused; a worker that died is restarted
+(its band's background model starts over).
+"""
+
+import multiprocessing as mp
+import queue
+import threading
+import time
+from dataclasses import asdict
+from multiprocessing import shared_memory
+from typing import Optional
+
+import cv2
+import numpy as np
+
+import config
+from detector import BoxDetector, CompiledProfile, DetectorProfile
+
+
+def _bands(height: int, coarse_height: int, workers: int, factor: int):
+    """Full resolution and coarse row ranges [(r0, r1, c0, c1), ...], top to bottom.
+
+    Band edges fall on multiples of the pyramid factor so a band downscales
+    to exactly its rows of the whole frame's coarse image.
+    """
+    blocks = coarse_height
+    bands = []
+    for i in range(workers):
+        c0 = blocks * i // workers
+        c1 = blocks * (i + 1) // workers
+        r0 = c0 * factor
+        r1 = height if i == workers - 1 else c1 * factor
+        bands.append((r0, r1, c0, c1))
+    return bands
+
+
+def _worker_main(band, shm_names, shape, coarse_shape, task_q, result_q, profile: dict,
+                 pyramid_levels: int):
+    """Entry point of one detection process: segmentation of one band."""
+    # the workers already fill the cores, don't let OpenCV add threads on top
+    cv2.setNumThreads(1)
+    frame_names, coarse_names, mask_names = shm_names
+    shms = [shared_memory.SharedMemory(name=name)
+            for name in frame_names + coarse_names + mask_names]
+    n = len(frame_names)
+    frames = [np.ndarray(shape, dtype=np.uint8, buffer=shm.buf) for shm in shms[:n]]
+    coarses = [np.ndarray(coarse_shape + shape[2:], dtype=np.uint8, buffer=shm.buf)
+               for shm in shms[n:n + len(coarse_names)]]
+    masks = [np.ndarray(coarse_shape, dtype=np.uint8, buffer=shm.buf)
+             for shm in shms[n + len(coarse_names):]]
+    detector = BoxDetector(DetectorProfile(**profile), pyramid_levels=pyramid_levels)
+    r0, r1, c0, c1 = band
+
+    try:
+        while True:
+            task = task_q.get()
+            if task is None:
+                break
+            if task[0] == "profile":
+                detector.set_profile(DetectorProfile(**task[1]))
+                continue
+
+            _, slot, seq = task
+            mask = masks[slot][c0:c1]
+            try:
+                coarse = coarses[slot][c0:c1] if coarses else None
+                detector.segment(frames[slot][r0:r1], coarse, mask)
+            except Exception as e:
+                print(f"Detection worker error: {e}")
+                mask[:] = 0
+            result_q.put((seq, slot))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # drop the numpy views before closing the mappings
+        del frames, coarses, masks
+        for shm in shms:
+            shm.close()
+
+
+class ParallelDetector:
+    def __init__(
+        self,
+        shape,
+        workers: int = config.DETECT_WORKERS,
+        profile: Optional[DetectorProfile] = None,
+        max_wait: float = config.DETECT_REORDER_TIMEOUT_S,
+    ):
+        if profile is None:
+            profile = DetectorProfile.from_config(config.DETECTOR_PROFILE)
+        self.profile = CompiledProfile(profile)
+        self.shape = tuple(shape)
+        self.max_wait = max_wait    # give up on a frame a worker never returns
+
+        # search / refine side, run in collect(); its background model is unused
+        self._detector = BoxDetector(profile)
+        self.pyramid_levels = self._detector.pyramid_levels
+        self.coarse_shape = self._detector.coarse_shape(self.shape)
+        self.workers = max(1, min(workers, self.coarse_shape[0]))
+        self._bands = _bands(self.shape[0], self.coarse_shape[0], self.workers,
+                             2 ** self.pyramid_levels)
+
+        # two frames in flight per worker is plenty: each frame only takes a
+        # band's worth of time
+        nslots = 2 * self.workers
+        nbytes = int(np.prod(self.shape))
+        coarse_bytes = int(np.prod(self.coarse_shape + self.shape[2:]))
+        self._shms = [shared_memory.SharedMemory(create=True, size=nbytes) for _ in range(nslots)]
+        # without a pyramid the coarse image is the frame itself
+        self._coarse_shms = [
+            shared_memory.SharedMemory(create=True, size=coarse_bytes)
+            for _ in range(nslots if self.pyramid_levels > 0 else 0)
+        ]
+        self._mask_shms = [
+            shared_memory.SharedMemory(create=True, size=int(np.prod(self.coarse_shape)))
+            for _ in range(nslots)
+        ]
+        self._slots = [
+            np.ndarray(self.shape, dtype=np.uint8, buffer=shm.buf) for shm in self._shms
+        ]
+        self._coarse = [
+            np.ndarray(self.coarse_shape + self.shape[2:], dtype=np.uint8, buffer=shm.buf)
+            for shm in self._coarse_shms
+        ] or self._slots
+        self._masks = [
+            np.ndarray(self.coarse_shape, dtype=np.uint8, buffer=shm.buf) for shm in self._mask_shms
+        ]
+        self._free = queue.Queue()
+        for i in range(nslots):
+            self._free.put(i)
+
+        self._ctx = mp.get_context("spawn")
+        self._result_q = self._ctx.Queue()
+        self._task_qs = [self._ctx.Queue() for _ in range(self.workers)]
+        self._procs = [self._spawn(i, profile) for i in range(self.workers)]
+
+        # reorder buffer: packets waiting for their bands, keyed by seq
+        self._lock = threading.Lock()
+        self._pending = {}          # seq -> [packet, submit time, slot, bands done]
+        self._slot_owner = {}       # slot -> seq it was handed out for
+
+        self.candidates = np.empty((0, 5), dtype=np.float32)
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0            # no free slot when the frame arrived
+        self.timed_out = 0
+        self.restarts = 0
+
+    def _spawn(self, i: int, profile: DetectorProfile):
+        names = tuple([shm.name for shm in shms]
+                      for shms in (self._shms, self._coarse_shms, self._mask_shms))
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(self._bands[i], names, self.shape, self.coarse_shape, self._task_qs[i],
+                  self._result_q, asdict(profile), self.pyramid_levels),
+            name=f"detect-{i}",
+            daemon=True,
+        )
+        proc.start()
+        return proc
+
+    def _check_workers(self):
+        """Restart workers that died; their lost frames time out as usual."""
+        for i, proc in enumerate(self._procs):
+            if not proc.is_alive():
+                print(f"⚠️ Detection worker {proc.name} exited ({proc.exitcode}), restarting")
+                # fresh task queue: the dead process may have held its read lock
+                self._task_qs[i] = self._ctx.Queue()
+                self._procs[i] = self._spawn(i, self.profile.profile)
+                self.restarts += 1
+
+    def _release_slot(self, slot, seq):
+        """Return a slot to the free list if it still belongs to seq.
+
+        Caller holds self._lock. A late result for a frame that already timed
+        out finds its slot handed to a newer frame and leaves it alone.
+        """
+        if slot is not None and self._slot_owner.get(slot) == seq:
+            del self._slot_owner[slot]
+            self._free.put(slot)
+
+    # ------------------------------------------------------------------
+    # profile handling, same interface as BoxDetector
+    # ------------------------------------------------------------------
+    def set_profile(self, profile: DetectorProfile):
+        self.profile = CompiledProfile(profile)
+        self._detector.set_profile(profile)
+        for task_q in self._task_qs:
+            task_q.put(("profile", asdict(profile)))
+
+    # ------------------------------------------------------------------
+    # dispatch / collect
+    # ------------------------------------------------------------------
+    def submit(self, packet) -> bool:
+        """Queue a packet for detection; synthetic packets pass straight through."""
+        if packet.synthetic:
+            # no work, but go through the result queue so collect() wakes up
+            with self._lock:
+                self._pending[packet.seq] = [packet, time.monotonic(), None, 0]
+            self._result_q.put((packet.seq, None))
+            return True
+
+        if packet.frame.shape != self.shape:
+            raise ValueError(f"frame shape {packet.frame.shape} != slot shape {self.shape}")
+
+        try:
+            slot = self._free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return False
+
+        np.copyto(self._slots[slot], packet.frame)
+        with self._lock:
+            self._pending[packet.seq] = [packet, time.monotonic(), slot, 0]
+            self._slot_owner[slot] = packet.seq
+        try:
+            # every worker sees every frame, so each band's model stays in step
+            for task_q in self._task_qs:
+                task_q.put(("frame", slot, packet.seq))
+        except Exception as e:
+            print(f"Detection dispatch error: {e}")
+            with self._lock:
+                del self._pending[packet.seq]
+                self._release_slot(slot, packet.seq)
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        return True
+
+    def collect(self, timeout: float = 0.1, focus=None) -> list:
+        """Wait for worker results and return packets that are now in order.
+
+        focus(t) optionally returns the predicted (cx, cy, w, h) of the
+        followed target at time t, for the ROI (see BoxDetector.detect).
+        """
+        try:
+            seq, slot = self._result_q.get(timeout=timeout)
+        except queue.Empty:
+            return self._release_in_order(focus)
+
+        with self._lock:
+            entry = self._pending.get(seq)
+            # late bands of a frame that timed out find no entry (or a new one)
+            if entry is not None and slot is not None and entry[2] == slot:
+                entry[3] += 1
+                if entry[3] == self.workers:
+                    self.completed += 1
+        return self._release_in_order(focus)
+
+    def _release_in_order(self, focus) -> list:
+        ready = []
+        now = time.monotonic()
+        expired = 0
+        with self._lock:
+            while self._pending:
+                seq = min(self._pending)
+                packet, submitted, slot, done = self._pending[seq]
+                if slot is None or done >= self.workers:
+                    ready.append(self._pending.pop(seq))
+                elif now - submitted > self.max_wait:
+                    # lost or very late result, don't hold the line for it;
+                    # the slot goes back too, or a dead worker would leak it
+                    del self._pending[seq]
+                    self._release_slot(slot, seq)
+                    expired += 1
+                else:
+                    break
+        if expired:
+            self.timed_out += expired
+            # the usual reason a result never comes back
+            self._check_workers()
+
+        out = []
+        for packet, _, slot, _ in ready:
+            if slot is not None:
+                # the search runs here, in capture order, so the ROI state
+                # follows frames the same way as in BoxDetector.detect
+                self._locate(packet, slot, focus)
+                with self._lock:
+                    self._release_slot(slot, packet.seq)
+            out.append(packet)
+        if out:
+            self.candidates = out[-1].candidates
+        return out
+
+    def _locate(self, packet, slot, focus):
+        try:
+            f = focus(packet.timestamp) if focus is not None else None
+            packet.box_position = self._detector.locate(
+                packet.frame, self._coarse[slot], self._masks[slot], packet.timestamp, f
+            )
+            packet.candidates = self._detector.candidates
+        except Exception as e:
+            print(f"Detection error: {e}")
+            packet.box_position = None
+            packet.candidates = np.empty((0, 5), dtype=np.float32)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "dropped": self.dropped,
+            "timed_out": self.timed_out,
+            "restarts": self.restarts,
+            "in_flight": len(self._pending),
+        }
+
+    def close(self):
+        for task_q in self._task_qs:
+            task_q.put(None)
+        for proc in self._procs:
+            proc.join(timeout=1.0)
+            if proc.is_alive():
+                proc.terminate()
+        self._slots = self._coarse = self._masks = []
+        for shm in self._shms + self._coarse_shms + self._mask_shms:
+            shm.close()
+            shm.unlink()
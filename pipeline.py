@@ -0,0 +1,169 @@
+# pipeline.py
+"""Staged background pipeline for the vision / control loop.
+
+Each stage runs in its own thread and hands work to the next one through a
+small bounded queue. When a consumer falls behind, the oldest item is
+dropped instead of blocking the producer, so the camera never waits on the
+dashboard.
+"""
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional
+
+
+@dataclass
+class FramePacket:
+    """One camera frame and everything computed from it along the pipeline."""
+    seq: int
+    frame: Any                      # BGR image (numpy array)
+    timestamp: float                # capture time, time.monotonic() seconds
+    synthetic: bool = False         # True when produced by create_test_frame
+    box_position: Optional[tuple] = None  # (cx, cy, w, h) or None
+    candidates: Any = None          # (K, 5) [cx, cy, w, h, area] detector blobs
+    mask: Any = None
+    trail: Optional[tuple] = None   # (xs, ys, ts) trajectory snapshot for overlays
+
+
+class DropOldestQueue:
+    """Bounded FIFO that discards the oldest item instead of blocking the producer."""
+
+    def __init__(self, maxsize: int = 2):
+        self._items = deque(maxlen=max(1, maxsize))
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None):
+        """Pop the oldest item, or return None if nothing arrived in time."""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class PipelineStage:
+    """Worker thread that applies fn to items from inbox and forwards results.
+
+    A stage without an inbox is a source: fn() is called in a loop and is
+    expected to block (e.g. on the camera) to set the pace.
+    Returning None from fn drops the item; returning a list forwards each
+    element as its own item.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable,
+        inbox: Optional[DropOldestQueue] = None,
+        outbox: Optional[DropOldestQueue] = None,
+        poll_timeout: float = 0.1,
+        histogram=None,
+    ):
+        self.name = name
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.poll_timeout = poll_timeout
+        self.histogram = histogram  # optional metrics.RollingHistogram of fn's run time
+
+        self.processed = 0
+        self.errors = 0
+        self.latency_ms = 0.0       # exponential moving average
+        self.max_latency_ms = 0.0
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._loop, name=f"stage-{self.name}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 1.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            if self.inbox is not None:
+                item = self.inbox.get(self.poll_timeout)
+                if item is None:
+                    continue
+
+            t0 = time.perf_counter()
+            try:
+                out = self.fn(item) if self.inbox is not None else self.fn()
+            except Exception as e:
+                self.errors += 1
+                print(f"{self.name} stage error: {e}")
+                time.sleep(0.1)
+                continue
+            self._record(time.perf_counter() - t0)
+
+            if out is None or self.outbox is None:
+                continue
+            if isinstance(out, list):
+                for each in out:
+                    self.outbox.put(each)
+            else:
+                self.outbox.put(out)
+
+    def _record(self, elapsed: float):
+        if self.histogram is not None:
+            self.histogram.observe(elapsed)
+        ms = elapsed * 1000.0
+        self.processed += 1
+        if self.processed == 1:
+            self.latency_ms = ms
+        else:
+            self.latency_ms += 0.1 * (ms - self.latency_ms)
+        if ms > self.max_latency_ms:
+            self.max_latency_ms = ms
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": len(self.inbox) if self.inbox is not None else 0,
+            "dropped": self.inbox.dropped if self.inbox is not None else 0,
+            "latency_ms": round(self.latency_ms, 3),
+            "max_latency_ms": round(self.max_latency_ms, 3),
+            "processed": self.processed,
+            "errors": self.errors,
+        }
+
+
+class Pipeline:
+    """Ordered collection of stages that start and stop together."""
+
+    def __init__(self, stages: List[PipelineStage]):
+        self.stages = stages
+
+    def start(self):
+        # start consumers first so the source never fills an unattended queue
+        for stage in reversed(self.stages):
+            stage.start()
+
+    def stop(self):
+        for stage in self.stages:
+            stage.stop()
+
+    def stats(self) -> dict:
+        return {stage.name: stage.stats() for stage in self.stages}
@@ -0,0 +1,284 @@
+# recording.py
+"""Session recorder and reader for headless replay (see replay.py).
+
+A recording is a directory:
+
+    meta.json               version, encoding, frame size, chunking
+    chunk_00000.frames      frame payloads back to back
+    chunk_00000.index       one FRAME_DTYPE record per frame
+    chunk_00001.frames ...
+    motor.bin               one MOTOR_DTYPE record per control tick
+
+Payloads are JPEG bytes ("jpeg") or the raw BGR array ("raw"). JPEG
+payloads are re-encoded from the decoded frame: cv2.VideoCapture decodes
+the camera's MJPG inside retrieve(), and the pipeline needs that decoded
+frame anyway. A new chunk starts every RECORD_CHUNK_FRAMES frames, so a
+crash loses at most the open chunk's tail and files stay small enough to
+copy off the robot one by one.
+Index and motor records are fixed size numpy structs: reading them back is
+one np.fromfile, and frame payloads are sliced out of an np.memmap of the
+chunk, so raw frames come back as zero copy views. The writer appends with
+plain buffered writes, since a JPEG chunk's final size isn't known up front.
+
+Recorder.record_frame / record_motor only enqueue; a background thread
+encodes and writes, and drops (and counts) frames if the disk can't keep
+up instead of stalling the pipeline.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import config
+
+
+RECORDING_VERSION = 1
+
+FRAME_DTYPE = np.dtype([
+    ("seq", "<u4"),
+    ("t", "<f8"),           # capture time, time.monotonic() seconds
+    ("offset", "<u8"),      # payload position in the chunk's .frames file
+    ("length", "<u4"),
+    ("has_box", "u1"),
+    ("box", "<f4", (4,)),   # cx, cy, w, h of the tracked target
+])
+
+MOTOR_DTYPE = np.dtype([
+    ("t", "<f8"),
+    ("cmd", "<f4", (4,)),   # fl, fr, rl, rr
+])
+
+
+def _chunk_path(path: str, index: int, ext: str) -> str:
+    return os.path.join(path, f"chunk_{index:05d}.{ext}")
+
+
+class Recorder:
+    def __init__(
+        self,
+        path: str,
+        encoding: str = config.RECORD_ENCODING,
+        chunk_frames: int = config.RECORD_CHUNK_FRAMES,
+        jpeg_quality: int = config.RECORD_JPEG_QUALITY,
+        queue_size: int = config.RECORD_QUEUE_SIZE,
+    ):
+        if encoding not in ("jpeg", "raw"):
+            raise ValueError(f"unknown recording encoding {encoding!r}")
+        self.path = path
+        self.encoding = encoding
+        self.chunk_frames = chunk_frames
+        self.jpeg_quality = jpeg_quality
+
+        self._queue = queue.Queue(queue_size)
+        self._thread = None
+        self._chunk = -1
+        self._frames_file = None
+        self._index_file = None
+        self._chunk_count = 0
+        self._offset = 0
+        self._motor_file = None
+        self._meta = None
+
+        self.frames = 0
+        self.motor = 0
+        self.dropped = 0
+        self.bytes = 0
+
+    def start(self):
+        os.makedirs(self.path, exist_ok=True)
+        self._motor_file = open(os.path.join(self.path, "motor.bin"), "ab")
+        self._thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+        self._thread.start()
+        print(f"⏺️  Recording to {self.path} ({self.encoding})")
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._close_chunk()
+        self._motor_file.close()
+        print(f"⏹️  Recorded {self.frames} frames, {self.motor} motor commands "
+              f"({self.bytes / 1e6:.1f} MB, {self.dropped} dropped)")
+
+    # ------------------------------------------------------------------
+    # producers (pipeline / control threads)
+    # ------------------------------------------------------------------
+    def record_frame(self, frame, t: float, seq: int, box=None):
+        """Queue a frame for writing. The frame must not be modified afterwards."""
+        try:
+            self._queue.put_nowait(("frame", frame, t, seq, box))
+        except queue.Full:
+            self.dropped += 1
+
+    def record_motor(self, cmd, t: float):
+        try:
+            self._queue.put_nowait(("motor", cmd, t))
+        except queue.Full:
+            self.dropped += 1
+
+    # ------------------------------------------------------------------
+    # writer thread
+    # ------------------------------------------------------------------
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                if item[0] == "frame":
+                    self._write_frame(*item[1:])
+                else:
+                    self._write_motor(*item[1:])
+            except Exception as e:
+                print(f"Recorder error: {e}")
+
+    def _write_meta(self, frame):
+        h, w = frame.shape[:2]
+        self._meta = {
+            "version": RECORDING_VERSION,
+            "encoding": self.encoding,
+            "width": w,
+            "height": h,
+            "shape": list(frame.shape),
+            "dtype": str(frame.dtype),
+            "chunk_frames": self.chunk_frames,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(self._meta, f, indent=2)
+
+    def _open_chunk(self):
+        self._close_chunk()
+        self._chunk += 1
+        self._frames_file = open(_chunk_path(self.path, self._chunk, "frames"), "wb")
+        self._index_file = open(_chunk_path(self.path, self._chunk, "index"), "wb")
+        self._chunk_count = 0
+        self._offset = 0
+
+    def _close_chunk(self):
+        for f in (self._frames_file, self._index_file):
+            if f is not None:
+                f.close()
+        self._frames_file = self._index_file = None
+
+    def _write_frame(self, frame, t, seq, box):
+        if self._meta is None:
+            self._write_meta(frame)
+        if self._frames_file is None or self._chunk_count >= self.chunk_frames:
+            self._open_chunk()
+
+        if self.encoding == "jpeg":
+            ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if not ok:
+                return
+            payload = buf
+        else:
+            payload = np.ascontiguousarray(frame)
+
+        rec = np.zeros(1, dtype=FRAME_DTYPE)
+        rec["seq"] = seq
+        rec["t"] = t
+        rec["offset"] = self._offset
+        rec["length"] = payload.nbytes
+        if box is not None:
+            rec["has_box"] = 1
+            rec["box"] = box
+
+        self._frames_file.write(memoryview(payload).cast("B"))
+        self._index_file.write(rec.tobytes())
+        # index entries must never point past what is on disk; motor records
+        # are flushed at the same pace so a crash loses the same time span
+        self._frames_file.flush()
+        self._index_file.flush()
+        self._motor_file.flush()
+
+        self._offset += payload.nbytes
+        self._chunk_count += 1
+        self.frames += 1
+        self.bytes += payload.nbytes
+
+    def _write_motor(self, cmd, t):
+        rec = np.zeros(1, dtype=MOTOR_DTYPE)
+        rec["t"] = t
+        rec["cmd"] = (cmd.fl, cmd.fr, cmd.rl, cmd.rr)
+        self._motor_file.write(rec.tobytes())
+        self.motor += 1
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "frames": self.frames,
+            "motor": self.motor,
+            "dropped": self.dropped,
+            "bytes": self.bytes,
+            "queued": self._queue.qsize(),
+        }
+
+
+class Recording:
+    """Read side of a recording directory."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta["version"] != RECORDING_VERSION:
+            raise ValueError(f"unsupported recording version {self.meta['version']}")
+        self.encoding = self.meta["encoding"]
+
+        # (chunk number, index records) for every chunk with frames in it
+        self.chunks = []
+        i = 0
+        while os.path.exists(_chunk_path(path, i, "index")):
+            index = np.fromfile(_chunk_path(path, i, "index"), dtype=FRAME_DTYPE)
+            if len(index):
+                self.chunks.append((i, index))
+            i += 1
+
+        motor_path = os.path.join(path, "motor.bin")
+        if os.path.exists(motor_path):
+            self.motor = np.fromfile(motor_path, dtype=MOTOR_DTYPE)
+        else:
+            self.motor = np.zeros(0, dtype=MOTOR_DTYPE)
+
+    def __len__(self):
+        return sum(len(index) for _, index in self.chunks)
+
+    @property
+    def index(self) -> np.ndarray:
+        """All frame records in recording order."""
+        if not self.chunks:
+            return np.zeros(0, dtype=FRAME_DTYPE)
+        return np.concatenate([index for _, index in self.chunks])
+
+    @property
+    def duration(self) -> float:
+        index = self.index
+        return float(index["t"][-1] - index["t"][0]) if len(index) else 0.0
+
+    def _decode(self, data: np.ndarray):
+        if self.encoding == "jpeg":
+            return cv2.imdecode(data, cv2.IMREAD_COLOR)
+        return data.view(np.dtype(self.meta["dtype"])).reshape(self.meta["shape"])
+
+    def frames(self):
+        """Yield (record, frame) in order. Raw frames are read-only memmap views."""
+        for chunk, index in self.chunks:
+            path = _chunk_path(self.path, chunk, "frames")
+            if os.path.getsize(path) == 0:
+                continue
+            data = np.memmap(path, dtype=np.uint8, mode="r")
+            for rec in index:
+                start = int(rec["offset"])
+                end = start + int(rec["length"])
+                if end > len(data):
+                    break       # truncated tail of an interrupted recording
+                yield rec, self._decode(data[start:end])
+            del data
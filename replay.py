@@ -0,0 +1,222 @@
+# replay.py
+"""Headless replay of a recorded session (see recording.py).
+
+Feeds the recorded frames through the same chain as the live tracker,
+without Flask, the camera or the serial port:
+
+    BoxDetector.detect -> MultiTargetTracker -> TrajectoryBuffer
+        -> MotionPlanner.compute -> MecanumController.compute -> odometry
+
+Time is the recorded capture time throughout: the planner's staleness
+check and the control loop run on it, and control ticks are simulated at
+CONTROL_RATE_HZ between frames like the live FixedRateLoop. Playback is at
+recorded speed (--speed to scale it) or as fast as possible (--fast).
+
+At the end it prints per-stage timings, how often the replayed tracker
+had a target box on the same frames as the recorded one, and how far the replayed motor commands are
+from the recorded ones.
+
+    python replay.py recordings/2024-05-01_12-00-00 --fast
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import config
+from detector import BoxDetector, DetectorProfile
+from mecanum_controller import MecanumController
+from motion_planner import MotionPlanner, SlidingLinearFit
+from multi_tracker import MultiTargetTracker
+from odometry import MecanumOdometry
+from recording import Recording
+from trajectory import TrajectoryBuffer
+
+
+class StageTimer:
+    """Wall time per stage, summarized as mean / p50 / p99 / max."""
+
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, stage: str, seconds: float):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def summary(self) -> dict:
+        out = {}
+        for stage, values in self.samples.items():
+            ms = np.asarray(values) * 1000.0
+            out[stage] = {
+                "n": len(ms),
+                "mean_ms": float(ms.mean()),
+                "p50_ms": float(np.percentile(ms, 50)),
+                "p99_ms": float(np.percentile(ms, 99)),
+                "max_ms": float(ms.max()),
+                "total_s": float(ms.sum() / 1000.0),
+            }
+        return out
+
+    def print_summary(self):
+        print(f"{'stage':<10} {'n':>7} {'mean':>8} {'p50':>8} {'p99':>8} {'max':>8}  (ms)")
+        for stage, s in self.summary().items():
+            print(f"{stage:<10} {s['n']:>7} {s['mean_ms']:>8.3f} {s['p50_ms']:>8.3f} "
+                  f"{s['p99_ms']:>8.3f} {s['max_ms']:>8.3f}")
+
+
+class Replayer:
+    def __init__(self, recording: Recording, profile: str = None,
+                 control_rate_hz: float = config.CONTROL_RATE_HZ):
+        self.recording = recording
+        width, height = recording.meta["width"], recording.meta["height"]
+
+        self.now = 0.0              # recorded time of the frame / tick being processed
+        detector_profile = DetectorProfile.from_config(profile) if profile else None
+        self.detector = BoxDetector(detector_profile)
+        self.targets = MultiTargetTracker(width=width, height=height)
+        self.trajectory = TrajectoryBuffer(
+            capacity=500, fit=SlidingLinearFit(stable=config.MOTION_FIT_STABLE)
+        )
+        self.planner = MotionPlanner(width=width, height=height, clock=lambda: self.now)
+        self.mecanum = MecanumController()
+        self.odom = MecanumOdometry()
+        self.period = 1.0 / control_rate_hz
+
+        self.timer = StageTimer()
+        self.target_id = None
+        self.commands = []          # (t, fl, fr, rl, rr) replayed
+        self.frames = 0
+        self.box_agree = 0
+
+    # ------------------------------------------------------------------
+    # the live pipeline's tracking stage and control tick, minus the locks
+    # ------------------------------------------------------------------
+    def _track(self, candidates, t: float):
+        """Returns the target box seen this frame (what the recorder stores) or None."""
+        track = self.targets.step(candidates, t)
+        track_id = track.id if track is not None else None
+        if track_id != self.target_id:
+            self.trajectory.clear()
+            self.target_id = track_id
+        box = None
+        if track is not None and track.updated:
+            box = track.box
+            self.trajectory.append(box[0], box[1], t)
+        self.trajectory.expire(t - config.TRAIL_SECONDS)
+        return box
+
+    def _control(self, t: float, dt: float):
+        if len(self.trajectory) < 2:
+            return
+        target = None
+        track = self.targets.selected
+        if track is not None:
+            target = track.filter.predict(t + config.CONTROL_LATENCY_S)
+
+        t0 = time.perf_counter()
+        motion, reg = self.planner.compute(self.trajectory, self.trajectory.fit, target)
+        t1 = time.perf_counter()
+        self.timer.add("planning", t1 - t0)
+        cmd = self.mecanum.compute(motion, dt) if motion is not None else None
+        if cmd is None:
+            return
+        self.odom.step(cmd, dt)
+        self.timer.add("control", time.perf_counter() - t1)
+        self.commands.append((t, cmd.fl, cmd.fr, cmd.rl, cmd.rr))
+
+    def run(self, speed: float = 1.0):
+        """Replay everything; speed <= 0 means as fast as possible."""
+        wall_start = time.perf_counter()
+        t_first = None
+        next_tick = None
+        frames = self.recording.frames()
+
+        while True:
+            t0 = time.perf_counter()
+            try:
+                rec, frame = next(frames)
+            except StopIteration:
+                break
+            t = float(rec["t"])
+            self.timer.add("read", time.perf_counter() - t0)
+
+            if t_first is None:
+                t_first = t
+                next_tick = t
+            if speed > 0:
+                delay = wall_start + (t - t_first) / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            # control ticks that fell due before this frame arrived
+            while next_tick < t:
+                self.now = next_tick
+                self._control(next_tick, self.period)
+                next_tick += self.period
+
+            self.now = t
+            t0 = time.perf_counter()
+            self.detector.detect(frame, t, self.targets.predicted_box(t))
+            t1 = time.perf_counter()
+            box = self._track(self.detector.candidates, t)
+            self.timer.add("detect", t1 - t0)
+            self.timer.add("track", time.perf_counter() - t1)
+
+            # has_box is the live tracker's output, so compare like for like
+            self.frames += 1
+            if (box is not None) == bool(rec["has_box"]):
+                self.box_agree += 1
+
+        self.wall_s = time.perf_counter() - wall_start
+        return self.report()
+
+    def command_error(self):
+        """Mean |replayed - recorded| wheel power, nearest recorded command in time."""
+        recorded = self.recording.motor
+        if not self.commands or len(recorded) == 0:
+            return None
+        replayed = np.asarray(self.commands)
+        t = recorded["t"]
+        # searchsorted gives the first command at or after each tick; the
+        # one before it may be closer
+        after = np.searchsorted(t, replayed[:, 0]).clip(0, len(recorded) - 1)
+        before = (after - 1).clip(0, len(recorded) - 1)
+        closer = np.abs(t[before] - replayed[:, 0]) < np.abs(t[after] - replayed[:, 0])
+        idx = np.where(closer, before, after)
+        return float(np.abs(recorded["cmd"][idx] - replayed[:, 1:]).mean())
+
+    def report(self) -> dict:
+        return {
+            "frames": self.frames,
+            "recorded_s": self.recording.duration,
+            "wall_s": self.wall_s,
+            "box_agreement": self.box_agree / self.frames if self.frames else None,
+            "commands": len(self.commands),
+            "command_error": self.command_error(),
+            "stages": self.timer.summary(),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recorded session headless")
+    parser.add_argument("path", help="recording directory")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed factor")
+    parser.add_argument("--fast", action="store_true", help="as fast as possible")
+    parser.add_argument("--profile", default=None, help="detector profile (config.DETECTOR_PROFILES)")
+    args = parser.parse_args()
+
+    recording = Recording(args.path)
+    print(f"▶️  {args.path}: {len(recording)} frames, {recording.duration:.1f} s, "
+          f"{len(recording.motor)} motor commands ({recording.encoding})")
+    replayer = Replayer(recording, profile=args.profile)
+    report = replayer.run(0.0 if args.fast else args.speed)
+
+    print(f"\nReplayed {report['frames']} frames in {report['wall_s']:.2f} s "
+          f"({report['frames'] / max(report['wall_s'], 1e-9):.1f} fps, "
+          f"recorded {report['recorded_s']:.2f} s)")
+    replayer.timer.print_summary()
+    if report["box_agreement"] is not None:
+        print(f"target box agreement with recording: {100 * report['box_agreement']:.1f}%")
+    if report["command_error"] is not None:
+        print(f"mean |motor command - recorded|: {report['command_error']:.3f} "
+              f"over {report['commands']} ticks")
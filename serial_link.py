@@ -0,0 +1,558 @@
+# serial_link.py
+"""Non-blocking motor command link to the STM32.
+
+The control loop hands commands to SerialWriter.submit(), which only drops
+the command into a latest-value slot and returns. A background thread does
+the actual serial.write, so a stall on the USB CDC link never holds up
+control or video. If the link is slow, commands that were never sent are
+overwritten by newer ones instead of queuing up.
+
+Identical consecutive commands (after quantizing to whole percents) are not
+re-sent, except as a keepalive every SERIAL_KEEPALIVE_S so the firmware's
+watchdog knows the host is alive.
+
+SerialLinkManager finds the port in the background: it probes candidate
+ports with an identify handshake, attaches the one that answers to the
+writer, measures round trip latency with periodic pings, and reconnects
+with exponential backoff when the link drops. Nothing here blocks startup.
+
+Wire formats
+------------
+ascii   host -> STM32   "FL,FR,RL,RR\\n" integer percents, e.g. "100,100,50,0\\n"
+                        "?ID\\n"          identify (only with SERIAL_ASCII_IDENTIFY)
+                        "PING <n>\\n"     latency probe
+        STM32 -> host   "ID <device id>\\n"
+                        "PONG <n>\\n"
+        Motor lines are compatible with the existing firmware. That firmware
+        doesn't know "?ID", so by default ascii ports are attached without
+        an identify handshake (and without pings, which need one).
+
+binary  every frame is 11 bytes, little endian:
+            0xAA 0x55            sync
+            type    uint8        message type, replies set the high bit
+            seq     uint16       increments per packet, wraps
+            payload 4 bytes
+            crc     uint16       CRC-16/CCITT-FALSE over type..payload
+
+        0x01 motor      payload fl fr rl rr as int8 percent, -100..100
+        0x02 ping       payload unused;   reply 0x82 echoes seq
+        0x03 identify   payload unused;   reply 0x83 payload = device id
+"""
+
+import glob
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Optional
+
+import serial
+
+import config
+from mecanum_controller import MotorCommand
+
+
+SYNC = b"\xAA\x55"
+MSG_MOTOR = 0x01
+MSG_PING = 0x02
+MSG_IDENT = 0x03
+MSG_REPLY = 0x80
+_BODY = struct.Struct("<BH4s")
+_CRC = struct.Struct("<H")
+MOTOR_PAYLOAD = struct.Struct("<4b")
+FRAME_SIZE = len(SYNC) + _BODY.size + _CRC.size
+
+PROTOCOLS = ("ascii", "binary")
+
+
+def crc16_ccitt(data: bytes, crc: int = 0xFFFF) -> int:
+    """CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF)."""
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+    return crc
+
+
+def to_percents(cmd: MotorCommand) -> tuple:
+    """Scale -1..1 wheel powers to clamped integer percents."""
+    def to_pct(val):
+        return int(max(-100, min(100, val * 100)))
+    return (to_pct(cmd.fl), to_pct(cmd.fr), to_pct(cmd.rl), to_pct(cmd.rr))
+
+
+def encode_ascii(pcts: tuple) -> bytes:
+    return ("%d,%d,%d,%d\n" % pcts).encode("ascii")
+
+
+def encode_frame(msg: int, seq: int, payload: bytes = b"\0\0\0\0") -> bytes:
+    body = _BODY.pack(msg, seq & 0xFFFF, payload)
+    return SYNC + body + _CRC.pack(crc16_ccitt(body))
+
+
+def decode_frame(frame: bytes):
+    """Returns (type, seq, payload), or None if the frame is invalid."""
+    if len(frame) != FRAME_SIZE or not frame.startswith(SYNC):
+        return None
+    body = frame[len(SYNC):len(SYNC) + _BODY.size]
+    (crc,) = _CRC.unpack(frame[-_CRC.size:])
+    if crc != crc16_ccitt(body):
+        return None
+    return _BODY.unpack(body)
+
+
+def encode_binary(pcts: tuple, seq: int) -> bytes:
+    return encode_frame(MSG_MOTOR, seq, MOTOR_PAYLOAD.pack(*pcts))
+
+
+def decode_binary(frame: bytes):
+    """Inverse of encode_binary; returns (seq, pcts) or None if invalid."""
+    decoded = decode_frame(frame)
+    if decoded is None or decoded[0] != MSG_MOTOR:
+        return None
+    return decoded[1], MOTOR_PAYLOAD.unpack(decoded[2])
+
+
+class FrameParser:
+    """Splits a byte stream into ASCII lines and binary frames."""
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def feed(self, data: bytes) -> list:
+        """Returns a list of str lines and (type, seq, payload) tuples."""
+        self._buf += data
+        out = []
+        buf = self._buf
+        while buf:
+            if buf[0] == SYNC[0]:
+                if len(buf) < FRAME_SIZE:
+                    break
+                decoded = decode_frame(bytes(buf[:FRAME_SIZE]))
+                if decoded is None:
+                    del buf[0]          # not a frame after all, resync
+                    continue
+                out.append(decoded)
+                del buf[:FRAME_SIZE]
+                continue
+            end = buf.find(b"\n")
+            if end < 0:
+                if len(buf) > 256:
+                    buf.clear()         # line noise without a newline
+                break
+            line = bytes(buf[:end]).decode("ascii", errors="replace").strip()
+            del buf[:end + 1]
+            if line:
+                out.append(line)
+        return out
+
+
+class SerialWriter:
+    def __init__(
+        self,
+        port=None,
+        protocol: str = config.SERIAL_PROTOCOL,
+        keepalive_s: float = config.SERIAL_KEEPALIVE_S,
+        on_error: Optional[Callable] = None,
+        on_write: Optional[Callable] = None,
+    ):
+        if protocol not in PROTOCOLS:
+            raise ValueError(f"unknown serial protocol: {protocol}")
+        self.port = port                # open serial.Serial, or None
+        self.protocol = protocol
+        self.keepalive_s = keepalive_s
+        self.on_error = on_error        # called with the exception after a failed write
+        self.on_write = on_write        # called with (origin, written_at, seconds) per write
+
+        self._cond = threading.Condition()
+        self._port_lock = threading.Lock()
+        self._slot: Optional[tuple] = None     # latest percents not yet written
+        self._slot_origin = None        # capture time the slot command was planned from
+        self._last_sent: Optional[tuple] = None
+        self._last_send_time = 0.0
+        self._seq = 0
+
+        self.sent = 0
+        self.deduped = 0
+        self.overwritten = 0            # replaced in the slot before being written
+        self.errors = 0
+        self.write_ms = 0.0             # last serial.write duration
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="serial-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 1.0):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def attach(self, port):
+        """Start writing to a newly opened port."""
+        with self._port_lock:
+            self.port = port
+        with self._cond:
+            # the new port has not seen any command yet, so don't dedupe
+            self._last_sent = None
+
+    def detach(self):
+        with self._port_lock:
+            self.port = None
+
+    def submit(self, cmd: MotorCommand, origin: float = None):
+        """Make cmd the next command to write. Never blocks on the port.
+
+        origin is an optional monotonic timestamp (capture time of the frame
+        cmd was planned from), handed back to on_write for latency metrics.
+        """
+        pcts = to_percents(cmd)
+        with self._cond:
+            if self._slot is not None:
+                self.overwritten += 1
+            self._slot = pcts
+            if origin is not None:
+                # a newer command planned from the same frame keeps its origin
+                self._slot_origin = origin
+            self._cond.notify()
+
+    def write_raw(self, data: bytes):
+        """Write bytes outside the command stream (pings, handshakes)."""
+        with self._port_lock:
+            if self.port is None:
+                raise serial.SerialException("port not attached")
+            self.port.write(data)
+
+    def encode(self, pcts: tuple) -> bytes:
+        if self.protocol == "binary":
+            packet = encode_binary(pcts, self._seq)
+            self._seq = (self._seq + 1) & 0xFFFF
+            return packet
+        return encode_ascii(pcts)
+
+    def _next(self):
+        """Wait for something to write; returns (percents, origin) or (None, None)."""
+        with self._cond:
+            if self._slot is None:
+                wait = None
+                if self._last_sent is not None:
+                    wait = max(0.0, self._last_send_time + self.keepalive_s - time.monotonic())
+                self._cond.wait(wait)
+            pcts, self._slot = self._slot, None
+            origin, self._slot_origin = self._slot_origin, None
+
+        now = time.monotonic()
+        keepalive_due = now - self._last_send_time >= self.keepalive_s
+        if pcts is None:
+            # nothing new: repeat the last command as a keepalive
+            return (self._last_sent if keepalive_due else None), None
+        if pcts == self._last_sent and not keepalive_due:
+            self.deduped += 1
+            return None, None
+        return pcts, origin
+
+    def _loop(self):
+        while not self._stop.is_set():
+            pcts, origin = self._next()
+            if pcts is None or self._stop.is_set():
+                continue
+
+            t0 = time.perf_counter()
+            try:
+                with self._port_lock:
+                    if self.port is None:
+                        continue
+                    self.port.write(self.encode(pcts))
+            except Exception as e:
+                self.errors += 1
+                print(f"Motor serial error: {e}")
+                self.detach()
+                if self.on_error is not None:
+                    self.on_error(e)
+                continue
+            elapsed = time.perf_counter() - t0
+            self.write_ms = elapsed * 1000.0
+            self._last_sent = pcts
+            self._last_send_time = time.monotonic()
+            self.sent += 1
+            if self.on_write is not None:
+                self.on_write(origin, self._last_send_time, elapsed)
+
+    def stats(self) -> dict:
+        return {
+            "protocol": self.protocol,
+            "connected": self.port is not None,
+            "sent": self.sent,
+            "deduped": self.deduped,
+            "overwritten": self.overwritten,
+            "errors": self.errors,
+            "write_ms": round(self.write_ms, 3),
+        }
+
+
+LINK_STATES = ("searching", "connected", "backoff", "stopped")
+
+
+class SerialLinkManager:
+    """Discovers, verifies and keeps the STM32 port attached to a SerialWriter."""
+
+    def __init__(
+        self,
+        writer: SerialWriter,
+        ports: Optional[list] = None,
+        baudrate: int = config.SERIAL_BAUDRATE,
+        on_state: Optional[Callable] = None,
+        identify: Optional[bool] = None,
+    ):
+        self.writer = writer
+        self.protocol = writer.protocol
+        if identify is None:
+            identify = self.protocol == "binary" or config.SERIAL_ASCII_IDENTIFY
+        self.identify = identify        # send the identify request when probing
+        self.ports = ports              # explicit candidates; None = discover
+        self.baudrate = baudrate
+        self.on_state = on_state        # called with stats() on every state change
+        writer.on_error = self._on_write_error
+
+        self.state = "stopped"
+        self.port_name = None
+        self.device_id = None           # None until a handshake succeeded
+        self.latency_ms = None          # ping round trip (EMA)
+        self.reconnects = 0
+        self.backoff_s = config.SERIAL_RECONNECT_MIN_S
+
+        self._lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._ping_seq = 0
+        self._open_failures = set()
+        if config.SERIAL_REQUIRE_HANDSHAKE and not self.identify:
+            print("⚠ SERIAL_REQUIRE_HANDSHAKE is set but ascii ports are not identified "
+                  "(SERIAL_ASCII_IDENTIFY = False); no port will be accepted")
+
+    # ------------------------------------------------------------------
+    # lifecycle
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="serial-link", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 1.0):
+        self._stop.set()
+        self._lost.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._set_state("stopped")
+
+    def _set_state(self, state: str):
+        if state == self.state:
+            return
+        self.state = state
+        if self.on_state is not None:
+            try:
+                self.on_state(self.stats())
+            except Exception as e:
+                print(f"Serial state callback error: {e}")
+
+    def _on_write_error(self, e):
+        self._lost.set()
+
+    # ------------------------------------------------------------------
+    # discovery and handshake
+    # ------------------------------------------------------------------
+    def candidates(self) -> list:
+        if self.ports is not None:
+            return list(self.ports)
+        if sys.platform.startswith('darwin'):
+            patterns = config.SERIAL_PORT_PATTERNS_MAC
+        else:
+            patterns = config.SERIAL_PORT_PATTERNS
+        found = []
+        if config.SERIAL_PORT and glob.glob(config.SERIAL_PORT):
+            found.append(config.SERIAL_PORT)
+        for pattern in patterns:
+            for path in sorted(glob.glob(pattern)):
+                if path not in found:
+                    found.append(path)
+        return found
+
+    def _identify_request(self) -> bytes:
+        if self.protocol == "binary":
+            return encode_frame(MSG_IDENT, 0)
+        return b"?ID\n"
+
+    def _ping_request(self, seq: int) -> bytes:
+        if self.protocol == "binary":
+            return encode_frame(MSG_PING, seq)
+        return f"PING {seq}\n".encode("ascii")
+
+    @staticmethod
+    def _parse_reply(item):
+        """Map a parsed line / frame to ("id", name) or ("pong", seq)."""
+        if isinstance(item, str):
+            parts = item.split()
+            if len(parts) == 2 and parts[0] == "ID":
+                return "id", parts[1]
+            if len(parts) == 2 and parts[0] == "PONG" and parts[1].isdigit():
+                return "pong", int(parts[1])
+            return None
+        msg, seq, payload = item
+        if msg == MSG_IDENT | MSG_REPLY:
+            return "id", payload.rstrip(b"\0").decode("ascii", errors="replace")
+        if msg == MSG_PING | MSG_REPLY:
+            return "pong", seq
+        return None
+
+    def _probe(self, path: str):
+        """Open path and run the identify handshake; returns (port, device id)."""
+        try:
+            port = serial.Serial(path, self.baudrate, timeout=config.SERIAL_TIMEOUT,
+                                 write_timeout=config.SERIAL_HANDSHAKE_TIMEOUT_S)
+        except Exception as e:
+            # report once per path, not on every backoff retry
+            if path not in self._open_failures:
+                self._open_failures.add(path)
+                print(f"⚠ Failed to open {path}: {e}")
+            return None, None
+        self._open_failures.discard(path)
+        if not self.identify:
+            return port, None
+
+        try:
+            port.reset_input_buffer()
+            port.write(self._identify_request())
+            parser = FrameParser()
+            deadline = time.monotonic() + config.SERIAL_HANDSHAKE_TIMEOUT_S
+            while time.monotonic() < deadline and not self._stop.is_set():
+                for item in parser.feed(port.read(64)):
+                    reply = self._parse_reply(item)
+                    if reply is not None and reply[0] == "id":
+                        return port, reply[1]
+        except Exception as e:
+            print(f"⚠ Handshake on {path} failed: {e}")
+            port.close()
+            return None, None
+        return port, None
+
+    def _connect(self):
+        """Probe every candidate; returns (port, path, device id) or Nones."""
+        fallback = None
+        for path in self.candidates():
+            if self._stop.is_set():
+                break
+            port, device_id = self._probe(path)
+            if port is None:
+                continue
+            if device_id == config.SERIAL_DEVICE_ID:
+                if fallback is not None:
+                    fallback[0].close()
+                return port, path, device_id
+            if device_id is not None:
+                print(f"⚠ {path} identified as {device_id}, not {config.SERIAL_DEVICE_ID}")
+                port.close()
+            elif fallback is None and not config.SERIAL_REQUIRE_HANDSHAKE:
+                fallback = (port, path, None)
+            else:
+                port.close()
+        return fallback if fallback is not None else (None, None, None)
+
+    # ------------------------------------------------------------------
+    # main loop
+    # ------------------------------------------------------------------
+    def _loop(self):
+        while not self._stop.is_set():
+            self._set_state("searching")
+            port, path, device_id = self._connect()
+            if port is None:
+                self._set_state("backoff")
+                self._stop.wait(self.backoff_s)
+                self.backoff_s = min(self.backoff_s * 2.0, config.SERIAL_RECONNECT_MAX_S)
+                continue
+
+            self.backoff_s = config.SERIAL_RECONNECT_MIN_S
+            self.port_name = path
+            self.device_id = device_id
+            self.latency_ms = None
+            self._lost.clear()
+            self.writer.attach(port)
+            verified = "" if device_id else " (no handshake reply)"
+            print(f"✓ Motor link established: {path} @ {self.baudrate}{verified}")
+            self._set_state("connected")
+
+            self._monitor(port, verified=device_id is not None)
+
+            self.writer.detach()
+            try:
+                port.close()
+            except Exception:
+                pass
+            if not self._stop.is_set():
+                print(f"⚠ Motor link lost on {path}, reconnecting")
+                self.reconnects += 1
+                self.port_name = None
+
+    def _monitor(self, port, verified: bool):
+        """Read replies and ping until the link is lost or we are stopped."""
+        parser = FrameParser()
+        pending = {}                    # ping seq -> send time
+        next_ping = time.monotonic()
+        missed = 0
+        while not self._lost.is_set():
+            now = time.monotonic()
+            if verified and now >= next_ping:
+                next_ping = now + config.SERIAL_PING_S
+                # anything older than a ping interval was never answered
+                stale = [seq for seq, t in pending.items() if now - t > config.SERIAL_PING_S]
+                for seq in stale:
+                    del pending[seq]
+                missed += len(stale)
+                if missed >= config.SERIAL_PING_MISSES:
+                    print(f"⚠ Motor link: {missed} pings unanswered")
+                    return
+                self._ping_seq = (self._ping_seq + 1) & 0xFFFF
+                pending[self._ping_seq] = now
+                try:
+                    self.writer.write_raw(self._ping_request(self._ping_seq))
+                except Exception:
+                    return
+
+            try:
+                data = port.read(max(1, port.in_waiting))
+            except Exception:
+                return
+            if not data:
+                continue
+            for item in parser.feed(data):
+                reply = self._parse_reply(item)
+                if reply is None or reply[0] != "pong" or reply[1] not in pending:
+                    continue
+                rtt = (time.monotonic() - pending.pop(reply[1])) * 1000.0
+                missed = 0
+                if self.latency_ms is None:
+                    self.latency_ms = rtt
+                else:
+                    self.latency_ms += 0.2 * (rtt - self.latency_ms)
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "port": self.port_name,
+            "device_id": self.device_id,
+            "verified": self.device_id is not None,
+            "latency_ms": round(self.latency_ms, 3) if self.latency_ms is not None else None,
+            "reconnects": self.reconnects,
+            "writer": self.writer.stats(),
+        }
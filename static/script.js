@@ -5,6 +5,7 @@ const socket = io();
         let trajectoryPoints = [];
         const TRAJECTORY_WINDOW_MS = 500;
         let lastDetectionTime = 0;
+        let statusShowsTarget = true;   // so the first render switches to idle
         const DETECTION_TIMEOUT_MS = 50;
         let trajMaxX = 1920;  
         let trajMaxY = 1080;
@@ -19,40 +20,161 @@ const socket = io();
         const MIN_TRAJ_POINTS = 4;
 
 
-        socket.on('detection_update', function(data) {
-            updateStatus(data);
-            updateTrajectory(data);
-            addLog(data);
-        });
+        // Handlers by event name. The server bundles per-frame and per-tick
+        // updates into one 'telemetry' packet; the old one-event-per-value
+        // names are still registered so an older server keeps working.
+        const eventHandlers = {
+            detection_update: function (data) {
+                updateStatus(data);
+                updateTrajectory(data);
+                overlayOnDetection(data);
+                addLog(data);
+            },
+            system_stats: function (data) {
+                updateStats(data);
+                if (data.serial) updateSerialStatus(data.serial);
+            },
+            serial_status: function (data) {
+                updateSerialStatus(data);
+            },
+            logs_cleared: function () {
+                document.getElementById('logs').innerHTML = '';
+                trajectoryPoints = [];
+                logEntries = 0;
+                updateLogCount();
+                markDirty('trajectory', 'motion', 'regression');
+            },
+            motion_update: function (data) {
+                updateMotionWidgetBackend(data);
+            },
+            trajectory_fit: function (data) {
+                updateRegressionPlotBackend(data);
+                overlayOnFit(data);
+            },
+            overlay_config: function (data) {
+                overlayConfig = data;
+                const canvas = document.getElementById('overlayCanvas');
+                if (canvas) canvas.style.display = data.mode === 'client' ? 'block' : 'none';
+                overlayDirty = true;
+            },
+            motor_update: function (data) {
+                updateMotorWidget(data);
+            },
+            pose_update: function (data) {
+                updatePoseWidget(data);
+            },
+            detector_profiles: function (data) {
+                updateDetectorProfiles(data);
+            },
+            pipeline_stats: function (data) {
+                updateLatencyStats(data);
+            },
+            trajectory_update: function (data) {
+                loadTrajectorySnapshot(data);
+            }
+        };
 
-        socket.on('system_stats', function(data) {
-            updateStats(data);
+        Object.keys(eventHandlers).forEach(function (name) {
+            socket.on(name, eventHandlers[name]);
         });
 
-        socket.on('logs_cleared', function() {
-            document.getElementById('logs').innerHTML = '';
-            trajectoryPoints = [];
-            logEntries = 0;
-            updateLogCount();
-            updatePlot();
-        });
+        // telemetry packet key -> legacy event it replaces
+        // v1 is JSON, v2 packs the fixed-layout values as float32 (wire.py)
+        const TELEMETRY_VERSIONS = [1, 2];
+        const TELEMETRY_KEYS = {
+            motion: 'motion_update',
+            fit: 'trajectory_fit',
+            motor: 'motor_update',
+            pose: 'pose_update',
+            stats: 'system_stats',
+            serial: 'serial_status'
+        };
 
-        socket.on('motion_update', function (data) {
-            updateMotionWidgetBackend(data);
-        });
+        function f32(buf) {
+            return buf instanceof ArrayBuffer ? new Float32Array(buf) : null;
+        }
 
-        socket.on('trajectory_fit', function (data) {
-            updateRegressionPlotBackend(data);
-        });
+        // typed array -> the objects the v1 handlers take
+        const BINARY_DECODERS = {
+            detections: function (a) {
+                const out = [];
+                for (let i = 0; i + 6 <= a.length; i += 6) {
+                    out.push({ x: a[i], y: a[i + 1], width: a[i + 2], height: a[i + 3],
+                               track_id: a[i + 4], dt: a[i + 5] });
+                }
+                return out;
+            },
+            motion: a => ({ has_data: a[0] > 0, vx: a[1], vy: a[2], ax: a[3], ay: a[4] }),
+            fit: a => a[0] > 0
+                ? { has_data: true, line_x: [a[1], a[2]], line_y: [a[3], a[4]] }
+                : { has_data: false, line_x: null, line_y: null },
+            motor: a => ({ fl: a[0], fr: a[1], rl: a[2], rr: a[3] }),
+            pose: a => ({ x: a[0], y: a[1], theta: a[2] })
+        };
 
-        socket.on('motor_update', function (data) {
-            updateMotorWidget(data);
+        function handleTelemetry(packet) {
+            if (!packet || TELEMETRY_VERSIONS.indexOf(packet.v) < 0) {
+                console.warn('Unsupported telemetry packet', packet && packet.v);
+                return;
+            }
+            if (packet.v === 2) {
+                Object.keys(BINARY_DECODERS).forEach(function (key) {
+                    const a = f32(packet[key]);
+                    if (a) packet[key] = BINARY_DECODERS[key](a);
+                });
+            }
+            (packet.detections || []).forEach(eventHandlers.detection_update);
+            Object.keys(TELEMETRY_KEYS).forEach(function (key) {
+                if (packet[key] != null) eventHandlers[TELEMETRY_KEYS[key]](packet[key]);
+            });
+        }
+
+        socket.on('telemetry', function (packet, ack) {
+            // the ack tells the server we kept up; it skips us otherwise
+            if (typeof ack === 'function') ack();
+            handleTelemetry(packet);
         });
 
-        socket.on('pose_update', function (data) {
-            updatePoseWidget(data);
+        // trajectory history, decimated server side to this many points
+        function trajectoryPixelWidth() {
+            const el = document.getElementById('overlayCanvas') || document.getElementById('videoFeed');
+            return Math.max(3, Math.round(el && el.clientWidth ? el.clientWidth : 800));
+        }
+
+        socket.on('connect', function () {
+            socket.emit('get_trajectory', { width: trajectoryPixelWidth() });
         });
 
+        // binary snapshot: <HHid header (version, n, track id, t_ref),
+        // then float32 x[n], y[n], age[n] in seconds before t_ref
+        function loadTrajectorySnapshot(data) {
+            const now = Date.now();
+            let points = [];
+            let trackId = null;
+            if (data instanceof ArrayBuffer) {
+                const view = new DataView(data);
+                if (view.getUint16(0, true) !== 1) return;
+                const n = view.getUint16(2, true);
+                const id = view.getInt32(4, true);
+                trackId = id >= 0 ? id : null;
+                const xs = new Float32Array(data, 16, n);
+                const ys = new Float32Array(data, 16 + 4 * n, n);
+                const ages = new Float32Array(data, 16 + 8 * n, n);
+                for (let i = 0; i < n; i++) {
+                    points.push({ x: xs[i], y: ys[i], t: now - ages[i] * 1000 });
+                }
+            } else if (Array.isArray(data)) {
+                // older servers: JSON [[x, y, t], ...], t on the server clock
+                const last = data.length ? data[data.length - 1][2] : 0;
+                points = data.map(p => ({ x: p[0], y: p[1], t: now - (last - p[2]) * 1000 }));
+            }
+            overlayTrail = points;
+            overlayTrackId = trackId;
+            overlayDirty = true;
+            trajectoryPoints = points.filter(p => now - p.t <= TRAJECTORY_WINDOW_MS);
+            markDirty('trajectory', 'motion', 'regression');
+        }
+
         const keys = {
                 ArrowUp: false,
                 ArrowDown: false,
@@ -95,6 +217,169 @@ const socket = io();
             socket.emit('toggle_tracking', { enabled: enabled });
         }
 
+        function setDetectorProfile(name) {
+            socket.emit('set_detector_profile', { name: name });
+        }
+
+        // ---- video overlay: trail, box and fit drawn over the raw stream ----
+        let overlayConfig = { mode: 'client', trail_seconds: 3.0, width: 1920, height: 1080 };
+        let overlayTrail = [];      // {x, y, t}, t = receive time in ms
+        let overlayBox = null;      // {x, y, width, height, t}
+        let overlayFit = null;      // {line_x, line_y}
+        let overlayTrackId = null;
+        let overlayDirty = false;
+        const OVERLAY_BOX_TIMEOUT_MS = 250;
+        const OVERLAY_TRAIL_LEVELS = 16;
+
+        function overlayOnDetection(data) {
+            const now = Date.now();
+            if (data.track_id !== overlayTrackId) {
+                // new target: the server restarts its trail too
+                overlayTrail = [];
+                overlayTrackId = data.track_id;
+            }
+            overlayTrail.push({ x: data.x, y: data.y, t: now });
+            // drawOverlay expires the trail too, but it does not run while the tab is hidden
+            const tailMs = overlayConfig.trail_seconds * 1000;
+            while (now - overlayTrail[0].t > tailMs) overlayTrail.shift();
+            overlayBox = { x: data.x, y: data.y, width: data.width, height: data.height, t: now };
+            overlayDirty = true;
+        }
+
+        function overlayOnFit(data) {
+            overlayFit = data && data.has_data ? data : null;
+            overlayDirty = true;
+        }
+
+        function drawOverlay() {
+            const canvas = document.getElementById('overlayCanvas');
+            const img = document.getElementById('videoFeed');
+            if (!canvas || !img || overlayConfig.mode !== 'client') return;
+
+            const now = Date.now();
+            const tailMs = overlayConfig.trail_seconds * 1000;
+            while (overlayTrail.length && now - overlayTrail[0].t > tailMs) {
+                overlayTrail.shift();
+            }
+            if (overlayBox && now - overlayBox.t > OVERLAY_BOX_TIMEOUT_MS) {
+                overlayBox = null;
+                overlayDirty = true;
+            }
+            // the trail fades with age, so it needs redrawing while it exists
+            if (!overlayDirty && overlayTrail.length < 2) return;
+            overlayDirty = overlayTrail.length >= 2;
+
+            if (canvas.width !== img.clientWidth || canvas.height !== img.clientHeight) {
+                canvas.width = img.clientWidth;
+                canvas.height = img.clientHeight;
+            }
+            const ctx = canvas.getContext('2d');
+            ctx.clearRect(0, 0, canvas.width, canvas.height);
+
+            // detections are in camera pixels, the <img> may be scaled
+            const sx = canvas.width / overlayConfig.width;
+            const sy = canvas.height / overlayConfig.height;
+
+            // trail, newer segments brighter, one path per brightness level
+            if (overlayTrail.length >= 2) {
+                const levels = [];
+                for (let i = 1; i < overlayTrail.length; i++) {
+                    const frac = Math.min(1, Math.max(0, 1 - (now - overlayTrail[i].t) / tailMs));
+                    const lv = Math.min(OVERLAY_TRAIL_LEVELS - 1, Math.floor(frac * OVERLAY_TRAIL_LEVELS));
+                    (levels[lv] = levels[lv] || []).push(i);
+                }
+                ctx.lineWidth = 3;
+                ctx.lineCap = 'round';
+                levels.forEach((segments, lv) => {
+                    if (!segments) return;
+                    const intensity = Math.round(60 + 195 * (lv + 0.5) / OVERLAY_TRAIL_LEVELS);
+                    ctx.strokeStyle = `rgb(0, 0, ${intensity})`;
+                    ctx.beginPath();
+                    segments.forEach(i => {
+                        const a = overlayTrail[i - 1];
+                        const b = overlayTrail[i];
+                        ctx.moveTo(a.x * sx, a.y * sy);
+                        ctx.lineTo(b.x * sx, b.y * sy);
+                    });
+                    ctx.stroke();
+                });
+            }
+
+            // regression line
+            if (overlayFit && overlayFit.line_x && overlayFit.line_y) {
+                ctx.strokeStyle = 'rgba(250, 204, 21, 0.9)';
+                ctx.lineWidth = 2;
+                ctx.setLineDash([6, 4]);
+                ctx.beginPath();
+                ctx.moveTo(overlayFit.line_x[0] * sx, overlayFit.line_y[0] * sy);
+                ctx.lineTo(overlayFit.line_x[1] * sx, overlayFit.line_y[1] * sy);
+                ctx.stroke();
+                ctx.setLineDash([]);
+            }
+
+            // box and center
+            if (overlayBox) {
+                const b = overlayBox;
+                ctx.strokeStyle = 'rgb(0, 255, 0)';
+                ctx.lineWidth = 2;
+                ctx.strokeRect((b.x - b.width / 2) * sx, (b.y - b.height / 2) * sy, b.width * sx, b.height * sy);
+                ctx.fillStyle = 'rgb(255, 0, 0)';
+                ctx.beginPath();
+                ctx.arc(b.x * sx, b.y * sy, 4, 0, 2 * Math.PI);
+                ctx.fill();
+            }
+        }
+
+        function updateSerialStatus(data) {
+            const el = document.getElementById('statSerial');
+            if (!el || !data) return;
+
+            let text = data.state;
+            if (data.state === 'connected') {
+                text = data.verified ? 'connected' : 'connected (?)';
+                if (data.latency_ms !== null && data.latency_ms !== undefined) {
+                    text += ` ${data.latency_ms.toFixed(1)} ms`;
+                }
+            }
+            el.textContent = text;
+            el.title = data.port ? `${data.port}${data.device_id ? ' / ' + data.device_id : ''}` : '';
+        }
+
+        // rolling p50 / p99 from metrics.py; without a motor port nothing
+        // is written, so show capture -> control command instead
+        function updateLatencyStats(data) {
+            const el = document.getElementById('statLatency');
+            if (!el || !data) return;
+
+            let s = data.glass_to_motor;
+            let label = 'capture → serial write';
+            if (!s || !s.count) {
+                s = data.latency && data.latency.control;
+                label = 'capture → control command (no motor port)';
+            }
+            if (!s || !s.count) {
+                el.textContent = '--';
+                el.title = '';
+                return;
+            }
+            el.textContent = `${s.p50_ms.toFixed(0)} / ${s.p99_ms.toFixed(0)} ms`;
+            el.title = `p50 / p99 ${label}, last ${data.window_s} s`;
+        }
+
+        function updateDetectorProfiles(data) {
+            const select = document.getElementById('detectorProfile');
+            if (!select || !data) return;
+
+            select.innerHTML = '';
+            (data.available || []).forEach(name => {
+                const opt = document.createElement('option');
+                opt.value = name;
+                opt.textContent = name.replace(/_/g, ' ');
+                select.appendChild(opt);
+            });
+            select.value = data.active;
+        }
+
                 function clearLogs() {
             const logsDiv = document.getElementById('logs');
             const logContainer = document.getElementById('logContainer');
@@ -122,6 +407,7 @@ const socket = io();
 
             const now = Date.now();
             lastDetectionTime = now;  // remember last time we saw a target
+            statusShowsTarget = true;
 
             const x = Math.round(data.x);
             const y = Math.round(data.y);
@@ -140,9 +426,9 @@ const socket = io();
             globalText.textContent = 'Vision Online';
         }
 
-        function updateIdleStatusIfStale() {
-            const now = Date.now();
-            if (now - lastDetectionTime > DETECTION_TIMEOUT_MS) {
+        function updateIdleStatusIfStale(now) {
+            if (statusShowsTarget && now - lastDetectionTime > DETECTION_TIMEOUT_MS) {
+                statusShowsTarget = false;
                 const statusDiv = document.getElementById('status');
                 const statusModeLabel = document.getElementById('statusModeLabel');
                 const statusLine1 = document.getElementById('statusLine1');
@@ -172,109 +458,45 @@ const socket = io();
             });
 
             // Keep only points from the last TRAJECTORY_WINDOW_MS
-            trajectoryPoints = trajectoryPoints.filter(p => now - p.t <= TRAJECTORY_WINDOW_MS);
+            expireTrajectory(now);
 
-            updatePlot();
+            markDirty('trajectory', 'motion', 'regression');
         }
 
-        function updateMotionWidgetBackend(motion) {
-            const textV = document.getElementById('motionVelocityText');
-            const textA = document.getElementById('motionAccelText');
-
-            if (!motion || !motion.has_data) {
-                if (textV) textV.textContent = 'v_des: vx=0.0, vy=0.0 px/s';
-                if (textA) textA.textContent = 'a_des: ax=0.0, ay=0.0 px/s²';
-                // optional: clear arrows from Plotly plot
-                return;
-            }
-
-            const vx = motion.vx || 0;
-            const vy = motion.vy || 0;
-            const ax = motion.ax || 0;
-            const ay = motion.ay || 0;
-
-            if (textV) {
-                textV.textContent = `v_des: vx=${vx.toFixed(1)}, vy=${vy.toFixed(1)} px/s`;
-            }
-            if (textA) {
-                textA.textContent = `a_des: ax=${ax.toFixed(1)}, ay=${ay.toFixed(1)} px/s²`;
-            }
+        // the server's planner output and fit, preferred over the local
+        // estimates below while they have data
+        let serverMotion = null;
+        let serverFit = null;
 
-            // if you built a Plotly vector plot, update it here using vx, vy, ax, ay
-            // for example: draw quiver arrows centered at frame center
+        function updateMotionWidgetBackend(motion) {
+            serverMotion = motion && motion.has_data ? motion : null;
+            markDirty('motion');
         }
 
         function updateRegressionPlotBackend(data) {
-            const plotId = 'regressionPlot';
-            const el = document.getElementById(plotId);
-            if (!el) return;
-
-            const layout = {
-                margin: { l: 40, r: 10, t: 10, b: 30 },
-                xaxis: {
-                    title: { text: 'X (px)', font: { size: 9 } },
-                    range: [0, trajMaxX],
-                    gridcolor: '#1f2933',
-                    zeroline: false
-                },
-                yaxis: {
-                    title: { text: 'Y (px)', font: { size: 9 } },
-                    range: [trajMaxY, 0],
-                    gridcolor: '#1f2933',
-                    zeroline: false,
-                    scaleanchor: 'x'
-                },
-                showlegend: true,
-                legend: { orientation: 'h', y: -0.2, x: 0.0 },
-                paper_bgcolor: 'rgba(0,0,0,0)',
-                plot_bgcolor: 'rgba(0,0,0,0)',
-                font: { color: '#f9fafb', size: 9 }
-            };
-
-            if (!data || !data.has_data || trajectoryPoints.length < MIN_TRAJ_POINTS) {
-                Plotly.react(plotId, [], layout, { displayModeBar: false, staticPlot: true });
-                return;
-            }
-
-            const xs = trajectoryPoints.map(p => p.x);
-            const ys = trajectoryPoints.map(p => p.y);
-
-            const scatterTrace = {
-                x: xs,
-                y: ys,
-                mode: 'markers',
-                type: 'scatter',
-                name: 'trajectory',
-                marker: { size: 6 }
-            };
+            serverFit = data && data.has_data && data.line_x && data.line_y ? data : null;
+            markDirty('regression');
+        }
 
-            const lineTrace = {
-                x: data.line_x || [],
-                y: data.line_y || [],
-                mode: 'lines',
-                type: 'scatter',
-                name: 'line of best fit',
-                line: { width: 2, dash: 'dot' }
-            };
+        let latestPose = null;
+        let poseLayout = null;
 
-            Plotly.react(
-                plotId,
-                [scatterTrace, lineTrace],
-                layout,
-                { displayModeBar: false, staticPlot: true }
-            );
+        function updatePoseWidget(data) {
+            if (!data) return;
+            latestPose = data;
+            markDirty('pose');
         }
 
-        function updatePoseWidget(data) {
+        function drawPoseWidget() {
             const plotId = 'posePlot';
             const el = document.getElementById(plotId);
-            if (!el || !data) {
+            if (!el || !latestPose) {
                 return;
             }
 
-            const x = data.x || 0.0;
-            const y = data.y || 0.0;
-            const theta = data.theta || 0.0;
+            const x = latestPose.x || 0.0;
+            const y = latestPose.y || 0.0;
+            const theta = latestPose.theta || 0.0;
 
             // robot body as a short arrow
             const bodyLen = 0.3; // meters, just for drawing
@@ -291,7 +513,8 @@ const socket = io();
                 marker: { size: 6 }
             };
 
-            const layout = {
+            // same layout object every time, so Plotly.react only restyles
+            poseLayout = poseLayout || {
                 margin: { l: 40, r: 10, t: 10, b: 30 },
                 xaxis: {
                     title: { text: 'x (m)', font: { size: 9 } },
@@ -312,7 +535,7 @@ const socket = io();
                 font: { color: '#f9fafb', size: 9 }
             };
 
-            Plotly.react(plotId, [bodyTrace], layout, { displayModeBar: false, staticPlot: true });
+            Plotly.react(plotId, [bodyTrace], poseLayout, { displayModeBar: false, staticPlot: true });
 
             const poseText = document.getElementById('poseText');
             if (poseText) {
@@ -371,77 +594,167 @@ const socket = io();
 
 
 
-        function updatePlot() {
-            const plotEl = document.getElementById('trajectoryPlot');
-            if (!plotEl) return;
-
-            const now = Date.now();
+        // ---- canvas plots: the trajectory, motion and regression widgets
+        // are a handful of points and lines, much cheaper to draw by hand
+        // than to push through Plotly on every update ----
+        const PLOT_COLORS = ['#1f77b4', '#ff7f0e'];   // Plotly's first two trace colors
+        const PLOT_MARGIN = { l: 40, r: 10, t: 8, b: 30 };
+        const canvasPlots = {};
+
+        function canvasPlot(id) {
+            if (canvasPlots[id] !== undefined) return canvasPlots[id];
+            const el = document.getElementById(id);
+            let plot = null;
+            if (el) {
+                const canvas = document.createElement('canvas');
+                canvas.style.display = 'block';
+                el.innerHTML = '';
+                el.appendChild(canvas);
+                plot = { el, canvas, ctx: canvas.getContext('2d') };
+            }
+            canvasPlots[id] = plot;
+            return plot;
+        }
 
-            // drop old points
-            trajectoryPoints = trajectoryPoints.filter(
-                p => now - p.t <= TRAJECTORY_WINDOW_MS
-            );
+        function formatTick(v) {
+            return Math.abs(v) >= 10 ? String(Math.round(v)) : v.toFixed(1);
+        }
 
-            const layoutBase = {
-                margin: { l: 40, r: 10, t: 4, b: 30 },
-                xaxis: {
-                    title: { text: 'X (px)', font: { size: 10 } },
-                    range: [0, trajMaxX],
-                    gridcolor: '#1f2933',
-                    zeroline: false
-                },
-                yaxis: {
-                    title: { text: 'Y (px)', font: { size: 10 } },
-                    range: [trajMaxY, 0],
-                    gridcolor: '#1f2933',
-                    zeroline: false,
-                    scaleanchor: 'x'
-                },
-                showlegend: false,
-                paper_bgcolor: 'rgba(0,0,0,0)',
-                plot_bgcolor: 'rgba(0,0,0,0)',
-                font: { color: '#f9fafb', size: 10 }
-            };
+        // Size the canvas to its container, clear it and draw grid and axes.
+        // x = [left, right] and y = [top, bottom] in data units, one scale
+        // for both axes (like Plotly's scaleanchor). Returns { ctx, px, py }
+        // mapping data to canvas pixels, or null if there is nothing to draw on.
+        function beginPlot(id, x, y, axes) {
+            const plot = canvasPlot(id);
+            if (!plot) return null;
+            const w = plot.el.clientWidth;
+            const h = plot.el.clientHeight;
+            if (!w || !h) return null;
+
+            const dpr = window.devicePixelRatio || 1;
+            if (plot.canvas.width !== Math.round(w * dpr) || plot.canvas.height !== Math.round(h * dpr)) {
+                plot.canvas.width = Math.round(w * dpr);
+                plot.canvas.height = Math.round(h * dpr);
+                plot.canvas.style.width = w + 'px';
+                plot.canvas.style.height = h + 'px';
+            }
+            const ctx = plot.ctx;
+            ctx.setTransform(dpr, 0, 0, dpr, 0, 0);
+            ctx.clearRect(0, 0, w, h);
+
+            const m = PLOT_MARGIN;
+            const spanX = Math.abs(x[1] - x[0]) || 1;
+            const spanY = Math.abs(y[1] - y[0]) || 1;
+            const scale = Math.min((w - m.l - m.r) / spanX, (h - m.t - m.b) / spanY);
+            const pw = scale * spanX;
+            const ph = scale * spanY;
+            const left = m.l + (w - m.l - m.r - pw) / 2;
+            const top = m.t + (h - m.t - m.b - ph) / 2;
+            const px = v => left + (v - x[0]) / (x[1] - x[0]) * pw;
+            const py = v => top + (v - y[0]) / (y[1] - y[0]) * ph;
+
+            ctx.lineWidth = 1;
+            ctx.strokeStyle = '#1f2933';
+            ctx.fillStyle = '#f9fafb';
+            ctx.font = '9px sans-serif';
+            ctx.beginPath();
+            for (let i = 0; i <= 4; i++) {
+                const gx = left + pw * i / 4;
+                const gy = top + ph * i / 4;
+                ctx.moveTo(gx, top);
+                ctx.lineTo(gx, top + ph);
+                ctx.moveTo(left, gy);
+                ctx.lineTo(left + pw, gy);
+            }
+            ctx.stroke();
+            if (axes.zeroline) {
+                ctx.strokeStyle = '#6b7280';
+                ctx.beginPath();
+                ctx.moveTo(px(0), top);
+                ctx.lineTo(px(0), top + ph);
+                ctx.moveTo(left, py(0));
+                ctx.lineTo(left + pw, py(0));
+                ctx.stroke();
+            }
 
-            if (trajectoryPoints.length === 0) {
-                Plotly.react(
-                    'trajectoryPlot',
-                    [],
-                    layoutBase,
-                    { displayModeBar: false, staticPlot: true }  // no zoom or drag
-                );
-                return;
+            ctx.textAlign = 'center';
+            ctx.textBaseline = 'top';
+            for (let i = 0; i <= 4; i += 2) {
+                ctx.fillText(formatTick(x[0] + (x[1] - x[0]) * i / 4), left + pw * i / 4, top + ph + 3);
+            }
+            ctx.fillText(axes.x, left + pw / 2, top + ph + 15);
+            ctx.textAlign = 'right';
+            ctx.textBaseline = 'middle';
+            for (let i = 0; i <= 4; i += 2) {
+                ctx.fillText(formatTick(y[0] + (y[1] - y[0]) * i / 4), left - 3, top + ph * i / 4);
             }
+            ctx.save();
+            ctx.translate(9, top + ph / 2);
+            ctx.rotate(-Math.PI / 2);
+            ctx.textAlign = 'center';
+            ctx.fillText(axes.y, 0, 0);
+            ctx.restore();
+
+            return { ctx, px, py, left, top };
+        }
 
-            const xs = trajectoryPoints.map(p => p.x);
-            const ys = trajectoryPoints.map(p => p.y);
-            const opacities = trajectoryPoints.map(p => {
-                const age = now - p.t;
-                const alpha = Math.max(0, Math.min(1, 1 - age / TRAJECTORY_WINDOW_MS));
-                return alpha;
+        function drawLegend(p, entries) {
+            const ctx = p.ctx;
+            ctx.font = '9px sans-serif';
+            ctx.textAlign = 'left';
+            ctx.textBaseline = 'middle';
+            entries.forEach((e, i) => {
+                const y = p.top + 6 + 11 * i;
+                ctx.strokeStyle = e.color;
+                ctx.lineWidth = 2;
+                ctx.setLineDash(e.dash || []);
+                ctx.beginPath();
+                ctx.moveTo(p.left + 4, y);
+                ctx.lineTo(p.left + 18, y);
+                ctx.stroke();
+                ctx.setLineDash([]);
+                ctx.fillStyle = '#f9fafb';
+                ctx.fillText(e.name, p.left + 22, y);
             });
+        }
 
-            const trace = {
-                x: xs,
-                y: ys,
-                mode: 'lines+markers',
-                type: 'scatter',
-                line: {
-                    width: 5,
-                    shape: 'spline'
-                },
-                marker: {
-                    size: 9,
-                    opacity: opacities
-                }
-            };
+        function drawDot(ctx, x, y, r) {
+            ctx.beginPath();
+            ctx.arc(x, y, r, 0, 2 * Math.PI);
+            ctx.fill();
+        }
+
+        function expireTrajectory(now) {
+            const n = trajectoryPoints.length;
+            let i = 0;
+            while (i < n && now - trajectoryPoints[i].t > TRAJECTORY_WINDOW_MS) i++;
+            if (i === 0) return false;
+            trajectoryPoints.splice(0, i);
+            return true;
+        }
 
-            Plotly.react(
-                'trajectoryPlot',
-                [trace],
-                layoutBase,
-                { displayModeBar: false, staticPlot: true }
-            );
+        function drawTrajectoryPlot(now) {
+            const p = beginPlot('trajectoryPlot', [0, trajMaxX], [0, trajMaxY], { x: 'X (px)', y: 'Y (px)' });
+            if (!p || trajectoryPoints.length === 0) return;
+            const ctx = p.ctx;
+
+            ctx.strokeStyle = PLOT_COLORS[0];
+            ctx.lineWidth = 5;
+            ctx.lineJoin = 'round';
+            ctx.beginPath();
+            trajectoryPoints.forEach((pt, i) => {
+                if (i === 0) ctx.moveTo(p.px(pt.x), p.py(pt.y));
+                else ctx.lineTo(p.px(pt.x), p.py(pt.y));
+            });
+            ctx.stroke();
+
+            // markers fade out over the trajectory window
+            ctx.fillStyle = PLOT_COLORS[0];
+            trajectoryPoints.forEach(pt => {
+                ctx.globalAlpha = Math.max(0, Math.min(1, 1 - (now - pt.t) / TRAJECTORY_WINDOW_MS));
+                drawDot(ctx, p.px(pt.x), p.py(pt.y), 4.5);
+            });
+            ctx.globalAlpha = 1;
         }
 
         function computeDesiredMotion() {
@@ -541,46 +854,19 @@ const socket = io();
 
 
 
-        function updateMotionWidget() {
-            const plotId = 'motionVectorPlot';
-            const plotEl = document.getElementById(plotId);
-            if (!plotEl) {
-                return;
-            }
-
-            const layout = {
-                margin: { l: 30, r: 10, t: 10, b: 30 },
-                xaxis: {
-                    title: { text: 'vx / ax (norm)', font: { size: 9 } },
-                    range: [-1, 1],
-                    gridcolor: '#1f2933',
-                    zeroline: true
-                },
-                yaxis: {
-                    title: { text: 'vy / ay (norm)', font: { size: 9 } },
-                    range: [-1, 1],
-                    gridcolor: '#1f2933',
-                    zeroline: true,
-                    scaleanchor: 'x'
-                },
-                showlegend: true,
-                legend: {
-                    orientation: 'h',
-                    y: -0.2,
-                    x: 0.0
-                },
-                paper_bgcolor: 'rgba(0,0,0,0)',
-                plot_bgcolor: 'rgba(0,0,0,0)',
-                font: { color: '#f9fafb', size: 9 }
-            };
-
-            const motion = computeDesiredMotion();
+        function drawMotionWidget() {
+            const p = beginPlot('motionVectorPlot', [-1, 1], [1, -1],
+                                { x: 'vx / ax (norm)', y: 'vy / ay (norm)', zeroline: true });
 
             const velTextEl = document.getElementById('motionVelocityText');
             const accTextEl = document.getElementById('motionAccelText');
 
+            const motion = serverMotion
+                ? { vx: serverMotion.vx || 0, vy: serverMotion.vy || 0,
+                    ax: serverMotion.ax || 0, ay: serverMotion.ay || 0, hasData: true }
+                : computeDesiredMotion();
+
             if (!motion.hasData) {
-                Plotly.react(plotId, [], layout, { displayModeBar: false, staticPlot: true });
                 if (velTextEl) {
                     velTextEl.textContent = 'v_des: vx=0.0, vy=0.0 px/s';
                 }
@@ -590,45 +876,37 @@ const socket = io();
                 return;
             }
 
-            // normalize vectors so they fit nicely in [-1, 1] and flip y for display
-            const vMag = Math.hypot(motion.vx, motion.vy);
-            const aMag = Math.hypot(motion.ax, motion.ay);
-            const maxMag = Math.max(vMag, aMag, 1e-6);
-            const scale = 0.8 / maxMag;
-
-            function normForPlot(x, y) {
-                return {
-                    x: x * scale,
-                    y: -y * scale   // invert y so "up" is up in the widget
-                };
+            if (p) {
+                // normalize vectors so they fit nicely in [-1, 1] and flip y for display
+                const vMag = Math.hypot(motion.vx, motion.vy);
+                const aMag = Math.hypot(motion.ax, motion.ay);
+                const scale = 0.8 / Math.max(vMag, aMag, 1e-6);
+                const ctx = p.ctx;
+
+                [
+                    { x: motion.vx, y: motion.vy, name: 'v_des', color: PLOT_COLORS[0] },
+                    { x: motion.ax, y: motion.ay, name: 'a_des', color: PLOT_COLORS[1], dash: [2, 3] }
+                ].forEach(v => {
+                    const x1 = p.px(v.x * scale);
+                    const y1 = p.py(-v.y * scale);   // invert y so "up" is up in the widget
+                    ctx.strokeStyle = v.color;
+                    ctx.fillStyle = v.color;
+                    ctx.lineWidth = 3;
+                    ctx.setLineDash(v.dash || []);
+                    ctx.beginPath();
+                    ctx.moveTo(p.px(0), p.py(0));
+                    ctx.lineTo(x1, y1);
+                    ctx.stroke();
+                    ctx.setLineDash([]);
+                    drawDot(ctx, p.px(0), p.py(0), 3);
+                    drawDot(ctx, x1, y1, 3);
+                });
+                drawLegend(p, [
+                    { name: 'v_des', color: PLOT_COLORS[0] },
+                    { name: 'a_des', color: PLOT_COLORS[1], dash: [2, 3] }
+                ]);
             }
 
-            const vNorm = normForPlot(motion.vx, motion.vy);
-            const aNorm = normForPlot(motion.ax, motion.ay);
-
-            const traces = [
-                {
-                    x: [0, vNorm.x],
-                    y: [0, vNorm.y],
-                    mode: 'lines+markers',
-                    type: 'scatter',
-                    name: 'v_des',
-                    line: { width: 3 },
-                    marker: { size: 6 }
-                },
-                {
-                    x: [0, aNorm.x],
-                    y: [0, aNorm.y],
-                    mode: 'lines+markers',
-                    type: 'scatter',
-                    name: 'a_des',
-                    line: { width: 3, dash: 'dot' },
-                    marker: { size: 6 }
-                }
-            ];
-
-            Plotly.react(plotId, traces, layout, { displayModeBar: false, staticPlot: true });
-
             if (velTextEl) {
                 velTextEl.textContent =
                     `v_des: vx=${motion.vx.toFixed(1)}, vy=${motion.vy.toFixed(1)} px/s`;
@@ -639,97 +917,42 @@ const socket = io();
             }
         }
 
-                function updateRegressionPlot() {
-            const plotId = 'regressionPlot';
-            const plotEl = document.getElementById(plotId);
-            if (!plotEl) {
-                return;
-            }
-
-            const now = Date.now();
-            // keep the same time window as trajectory
-            trajectoryPoints = trajectoryPoints.filter(
-                p => now - p.t <= TRAJECTORY_WINDOW_MS
-            );
-
-            const layout = {
-                margin: { l: 40, r: 10, t: 10, b: 30 },
-                xaxis: {
-                    title: { text: 'X (px)', font: { size: 9 } },
-                    range: [0, trajMaxX],
-                    gridcolor: '#1f2933',
-                    zeroline: false
-                },
-                yaxis: {
-                    title: { text: 'Y (px)', font: { size: 9 } },
-                    range: [trajMaxY, 0],
-                    gridcolor: '#1f2933',
-                    zeroline: false,
-                    scaleanchor: 'x'
-                },
-                showlegend: true,
-                legend: {
-                    orientation: 'h',
-                    y: -0.2,
-                    x: 0.0
-                },
-                paper_bgcolor: 'rgba(0,0,0,0)',
-                plot_bgcolor: 'rgba(0,0,0,0)',
-                font: { color: '#f9fafb', size: 9 }
-            };
-
-            if (trajectoryPoints.length < MIN_TRAJ_POINTS) {
-                Plotly.react(plotId, [], layout, { displayModeBar: false, staticPlot: true });
-                return;
-            }
-
-            const xs = trajectoryPoints.map(p => p.x);
-            const ys = trajectoryPoints.map(p => p.y);
+        function drawRegressionPlot() {
+            const p = beginPlot('regressionPlot', [0, trajMaxX], [0, trajMaxY], { x: 'X (px)', y: 'Y (px)' });
+            if (!p || trajectoryPoints.length < MIN_TRAJ_POINTS) return;
+            const ctx = p.ctx;
 
-            const scatterTrace = {
-                x: xs,
-                y: ys,
-                mode: 'markers',
-                type: 'scatter',
-                name: 'trajectory',
-                marker: { size: 6 }
-            };
+            ctx.fillStyle = PLOT_COLORS[0];
+            trajectoryPoints.forEach(pt => drawDot(ctx, p.px(pt.x), p.py(pt.y), 3));
 
-            const fit = computeLinearFit(trajectoryPoints);
-            let lineTrace = null;
-
-            if (fit) {
-                if (fit.slope === null) {
+            // line of best fit: the server's if it has one, else fit locally
+            let line = serverFit ? { x: serverFit.line_x, y: serverFit.line_y } : null;
+            if (!line) {
+                const fit = computeLinearFit(trajectoryPoints);
+                if (fit && fit.slope === null) {
                     // vertical line at meanX
-                    const x0 = fit.meanX;
-                    const x1 = fit.meanX;
-                    lineTrace = {
-                        x: [x0, x1],
-                        y: [0, trajMaxY],
-                        mode: 'lines',
-                        type: 'scatter',
-                        name: 'line of best fit',
-                        line: { width: 2, dash: 'dot' }
-                    };
-                } else {
-                    const x0 = 0;
-                    const x1 = trajMaxX;
-                    const y0 = fit.slope * x0 + fit.intercept;
-                    const y1 = fit.slope * x1 + fit.intercept;
-                    lineTrace = {
-                        x: [x0, x1],
-                        y: [y0, y1],
-                        mode: 'lines',
-                        type: 'scatter',
-                        name: 'line of best fit',
-                        line: { width: 2, dash: 'dot' }
-                    };
+                    line = { x: [fit.meanX, fit.meanX], y: [0, trajMaxY] };
+                } else if (fit) {
+                    line = { x: [0, trajMaxX], y: [fit.intercept, fit.slope * trajMaxX + fit.intercept] };
                 }
             }
-
-            const traces = lineTrace ? [scatterTrace, lineTrace] : [scatterTrace];
-
-            Plotly.react(plotId, traces, layout, { displayModeBar: false, staticPlot: true });
+            const legend = [{ name: 'trajectory', color: PLOT_COLORS[0] }];
+            if (line) {
+                ctx.save();
+                ctx.beginPath();
+                ctx.rect(p.px(0), p.py(0), p.px(trajMaxX) - p.px(0), p.py(trajMaxY) - p.py(0));
+                ctx.clip();
+                ctx.strokeStyle = PLOT_COLORS[1];
+                ctx.lineWidth = 2;
+                ctx.setLineDash([2, 3]);
+                ctx.beginPath();
+                ctx.moveTo(p.px(line.x[0]), p.py(line.y[0]));
+                ctx.lineTo(p.px(line.x[1]), p.py(line.y[1]));
+                ctx.stroke();
+                ctx.restore();
+                legend.push({ name: 'line of best fit', color: PLOT_COLORS[1], dash: [2, 3] });
+            }
+            drawLegend(p, legend);
         }
 
 
@@ -862,12 +1085,69 @@ const socket = io();
             }
         }
 
-        updateIdleStatusIfStale();
-        updatePlot();
-        updateMotionWidget();
-        updateRegressionPlot();
+        // ---- render loop: socket handlers only update state and mark plots
+        // dirty; one requestAnimationFrame callback draws what changed, and
+        // nothing is scheduled at all while the tab is hidden ----
+        const dirty = { trajectory: true, motion: true, regression: true, pose: true };
+        const TRAJECTORY_FADE_MS = 50;     // redraw interval while markers fade out
+        const PLOTLY_MIN_INTERVAL_MS = 100;
+        let renderHandle = null;
+        let lastTrajectoryDraw = 0;
+        let lastPoseDraw = 0;
+
+        function markDirty(...plots) {
+            plots.forEach(name => { dirty[name] = true; });
+        }
+
+        function renderFrame() {
+            renderHandle = requestAnimationFrame(renderFrame);
+            const now = Date.now();
+
+            if (expireTrajectory(now)) markDirty('trajectory', 'motion', 'regression');
+            updateIdleStatusIfStale(now);
+
+            if (dirty.trajectory || (trajectoryPoints.length && now - lastTrajectoryDraw >= TRAJECTORY_FADE_MS)) {
+                dirty.trajectory = false;
+                lastTrajectoryDraw = now;
+                drawTrajectoryPlot(now);
+            }
+            if (dirty.motion) {
+                dirty.motion = false;
+                drawMotionWidget();
+            }
+            if (dirty.regression) {
+                dirty.regression = false;
+                drawRegressionPlot();
+            }
+            // the pose is still a Plotly plot, so cap how often it redraws
+            if (dirty.pose && now - lastPoseDraw >= PLOTLY_MIN_INTERVAL_MS) {
+                dirty.pose = false;
+                lastPoseDraw = now;
+                drawPoseWidget();
+            }
+            drawOverlay();
+        }
+
+        function startRendering() {
+            if (renderHandle !== null) return;
+            // state kept changing while hidden
+            markDirty('trajectory', 'motion', 'regression', 'pose');
+            overlayDirty = true;
+            renderHandle = requestAnimationFrame(renderFrame);
+        }
+
+        function stopRendering() {
+            if (renderHandle === null) return;
+            cancelAnimationFrame(renderHandle);
+            renderHandle = null;
+        }
+
+        document.addEventListener('visibilitychange', function () {
+            if (document.hidden) stopRendering();
+            else startRendering();
+        });
+        window.addEventListener('resize', function () {
+            markDirty('trajectory', 'motion', 'regression');
+        });
 
-        setInterval(updatePlot, 100);
-        setInterval(updateMotionWidget, 100);
-        setInterval(updateRegressionPlot, 100);
-        setInterval(updateIdleStatusIfStale, 100);
+        if (!document.hidden) startRendering();
@@ -0,0 +1,133 @@
+# synthetic_scene.py
+"""Synthetic camera frames: the test mode scene and benchmark workloads.
+
+render_test_frame draws the moving brown box that ArducamTracker shows
+when no camera is connected; TestScene renders the same scene into a
+reused buffer for the live test mode. The extra knobs (box size, speed, a textured
+box, sensor noise) turn the same scene into something the detector can
+actually lock on to at any resolution, for bench.py.
+"""
+
+import cv2
+import numpy as np
+
+
+BROWN_BGR = (42, 42, 165)
+
+
+def scene_box(width: int, height: int, counter: int, box_size=(80, 60), speed: float = 1.0):
+    """(cx, cy, w, h) of the test box in frame number counter.
+
+    The box follows a Lissajous path around the center; speed scales how
+    far it moves per frame.
+    """
+    # amplitudes relative to 1920x1080, where the original scene was tuned
+    k = counter * speed
+    center_x = width // 2 + int(300 * width / 1920 * np.sin(k * 0.02))
+    center_y = height // 2 + int(200 * height / 1080 * np.cos(k * 0.03))
+    w, h = box_size
+    return center_x, center_y, w, h
+
+
+def draw_labels(frame, width: int, height: int):
+    cv2.putText(frame, "ARDUCAM TEST MODE - No Camera Detected",
+                (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+    cv2.putText(frame, f"Resolution: {width}x{height}",
+                (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+    cv2.putText(frame, "Check USB connection and run arducam_setup.py",
+                (50, 140), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+
+class TestScene:
+    """The test mode scene for one frame size, rendered without allocating.
+
+    Background and banner text are rendered once; each frame is a blit of
+    that into the caller's buffer plus the box. The banner is drawn over
+    the box and putText blends its edges, so in the (small frame) case
+    where the box reaches into the banner rows the frame is rendered the
+    long way instead. Output matches render_test_frame without noise.
+    """
+
+    def __init__(self, width: int, height: int, box_size=(80, 60), speed: float = 1.0,
+                 texture=None, label: bool = True):
+        self.width = width
+        self.height = height
+        self.box_size = box_size
+        self.speed = speed
+        self.texture = texture
+
+        self.label = label
+        self.background = np.full((height, width, 3), 100, dtype=np.uint8)
+        self._label_rows = 0
+        if label:
+            draw_labels(self.background, width, height)
+            rows = np.flatnonzero(np.any(self.background != 100, axis=(1, 2)))
+            self._label_rows = int(rows[-1]) + 1 if len(rows) else 0
+
+    def render(self, counter: int, out=None):
+        """Return (frame, (cx, cy, w, h)); frame is out if given."""
+        if out is None:
+            out = np.empty_like(self.background)
+        center_x, center_y, w, h = scene_box(self.width, self.height, counter,
+                                             self.box_size, self.speed)
+        x0, y0 = center_x - w // 2, center_y - h // 2
+
+        overlaps_label = self._label_rows > 0 and y0 < self._label_rows
+        if overlaps_label:
+            out.fill(100)
+        else:
+            np.copyto(out, self.background)
+        if self.texture is not None:
+            th, tw = self.texture.shape[:2]
+            out[max(0, y0):y0 + th, max(0, x0):x0 + tw] = self.texture[
+                max(0, -y0):self.height - y0, max(0, -x0):self.width - x0
+            ]
+        else:
+            cv2.rectangle(out, (x0, y0), (center_x + w // 2, center_y + h // 2), BROWN_BGR, -1)
+
+        if overlaps_label:
+            draw_labels(out, self.width, self.height)
+        return out, (center_x, center_y, w, h)
+
+
+def render_test_frame(
+    width: int,
+    height: int,
+    counter: int,
+    box_size=(80, 60),
+    speed: float = 1.0,
+    texture=None,
+    noise: float = 0.0,
+    rng=None,
+    label: bool = True,
+):
+    """Return (frame, (cx, cy, w, h)) for frame number counter.
+
+    Renders the scene from scratch; TestScene is the same without the per
+    call setup. texture is an optional (h, w, 3) uint8 image pasted instead
+    of the flat brown fill (gives the motion detector edges inside the
+    box), noise the std dev of Gaussian sensor noise.
+    """
+    frame, box = TestScene(width, height, box_size, speed, texture, label=False).render(counter)
+
+    if noise > 0:
+        rng = rng or np.random.default_rng()
+        noisy = frame + rng.normal(0.0, noise, frame.shape)
+        frame = np.clip(noisy, 0, 255).astype(np.uint8)
+
+    if label:
+        draw_labels(frame, width, height)
+
+    return frame, box
+
+
+def box_texture(w: int, h: int, cell: int = 24, seed: int = 0):
+    """Brownish patchy texture for a w x h box.
+
+    Patches are cell pixels wide so they survive the detector's pyramid
+    downscale (per pixel noise would average out to flat brown).
+    """
+    rng = np.random.default_rng(seed)
+    shade = rng.integers(-50, 50, (h // cell + 1, w // cell + 1, 1), dtype=np.int16)
+    shade = np.repeat(np.repeat(shade, cell, axis=0), cell, axis=1)[:h, :w]
+    return np.clip(np.asarray(BROWN_BGR, dtype=np.int16) + shade, 0, 255).astype(np.uint8)
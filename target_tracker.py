@@ -0,0 +1,143 @@
+# target_tracker.py
+"""Constant acceleration Kalman filter between detection and planning.
+
+Thrown trash follows a ballistic arc, which in image space is (close to)
+constant acceleration. The filter smooths noisy centroids, coasts through
+missed detections and predicts position / velocity at any future time so
+the planner can aim at where the object will be once our commands land.
+
+The x and y axes share the same motion model and noise, so they also share
+one 3x3 covariance; the state is a (2, 3) array of [pos, vel, acc] rows.
+"""
+
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+import numpy as np
+
+import config
+
+
+@dataclass
+class TargetEstimate:
+    t: float
+    x: float
+    y: float
+    vx: float = 0.0
+    vy: float = 0.0
+    ax: float = 0.0
+    ay: float = 0.0
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class KalmanTargetTracker:
+    def __init__(
+        self,
+        meas_std: float = config.KALMAN_MEAS_STD,
+        jerk_std: float = config.KALMAN_JERK_STD,
+        max_coast: float = config.KALMAN_MAX_COAST_S,
+    ):
+        self.r = meas_std ** 2          # measurement variance (px^2)
+        self.q = jerk_std ** 2          # white jerk spectral density
+        self.max_coast = max_coast      # seconds without a hit before dropping the track
+
+        # initial uncertainty for velocity / acceleration of a new track
+        self.init_vel_var = config.KALMAN_INIT_VEL_STD ** 2
+        self.init_acc_var = config.KALMAN_INIT_ACC_STD ** 2
+
+        self.reset()
+
+    def reset(self):
+        self.X = np.zeros((2, 3))   # rows: x axis, y axis; cols: pos, vel, acc
+        self.P = np.eye(3)
+        self.t = None               # time of the current state
+        self.t_meas = None          # time of the last measurement
+
+    @property
+    def active(self) -> bool:
+        return self.t is not None
+
+    def _transition(self, dt: float):
+        F = np.array([
+            [1.0, dt, 0.5 * dt * dt],
+            [0.0, 1.0, dt],
+            [0.0, 0.0, 1.0],
+        ])
+        dt2 = dt * dt
+        dt3 = dt2 * dt
+        Q = self.q * np.array([
+            [dt3 * dt2 / 20.0, dt3 * dt / 8.0, dt3 / 6.0],
+            [dt3 * dt / 8.0, dt3 / 3.0, dt2 / 2.0],
+            [dt3 / 6.0, dt2 / 2.0, dt],
+        ])
+        return F, Q
+
+    def _predict(self, t: float):
+        dt = t - self.t
+        if dt <= 0.0:
+            return
+        F, Q = self._transition(dt)
+        self.X = self.X @ F.T
+        self.P = F @ self.P @ F.T + Q
+        self.t = t
+
+    def update(self, x: float, y: float, t: float) -> TargetEstimate:
+        """Fold in a detection at time t and return the filtered estimate."""
+        if not self.active:
+            self.X[:] = 0.0
+            self.X[0, 0] = x
+            self.X[1, 0] = y
+            self.P = np.diag([self.r, self.init_vel_var, self.init_acc_var])
+            self.t = t
+            self.t_meas = t
+            return self.estimate()
+
+        self._predict(t)
+
+        # measure position only: H = [1, 0, 0]
+        S = self.P[0, 0] + self.r
+        K = self.P[:, 0] / S
+        innov = np.array([x, y]) - self.X[:, 0]
+        self.X += np.outer(innov, K)
+        self.P -= np.outer(K, self.P[0, :])
+        self.t_meas = t
+        return self.estimate()
+
+    def coast(self, t: float) -> Optional[TargetEstimate]:
+        """Advance without a detection; drops the track after max_coast."""
+        if not self.active:
+            return None
+        if t - self.t_meas > self.max_coast:
+            self.reset()
+            return None
+        self._predict(t)
+        return self.estimate()
+
+    def estimate(self) -> Optional[TargetEstimate]:
+        if not self.active:
+            return None
+        X = self.X
+        return TargetEstimate(
+            t=self.t,
+            x=float(X[0, 0]), y=float(X[1, 0]),
+            vx=float(X[0, 1]), vy=float(X[1, 1]),
+            ax=float(X[0, 2]), ay=float(X[1, 2]),
+        )
+
+    def predict(self, t: float) -> Optional[TargetEstimate]:
+        """Predicted state at an arbitrary time, without touching the filter."""
+        if not self.active:
+            return None
+        dt = max(0.0, t - self.t)
+        (px, vx, ax), (py, vy, ay) = self.X
+        return TargetEstimate(
+            t=t,
+            x=float(px + vx * dt + 0.5 * ax * dt * dt),
+            y=float(py + vy * dt + 0.5 * ay * dt * dt),
+            vx=float(vx + ax * dt),
+            vy=float(vy + ay * dt),
+            ax=float(ax),
+            ay=float(ay),
+        )
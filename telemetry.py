@@ -0,0 +1,164 @@
+# telemetry.py
+"""Coalesced, rate limited telemetry for the dashboard.
+
+Instead of one Socket.IO message per value per frame, producers (tracking
+stage, control loop, serial link) drop their latest values into a
+TelemetryBus. At TELEMETRY_HZ, independent of camera fps and control rate,
+the bus sends one versioned 'telemetry' packet with only what changed since
+the last one:
+
+    {"v": 1, "seq": 42, "t": 1234.5,
+     "detections": [...],           # every detection since the last packet
+     "motion": {...}, "fit": {...}, "motor": {...}, "pose": {...},
+     "stats": {...}, "serial": {...}}
+
+Every TELEMETRY_KEYFRAME_EVERY packets, and on request when a client
+connects, the packet is a keyframe instead: it repeats the latest value of
+every key ever set. A value that is set once (serial link state) or rarely
+would otherwise never reach a client that connected later or had that
+packet dropped by TelemetryFanout.
+
+With an encode function (wire.encode_telemetry) the finished packet is
+converted to the binary version 2 layout before it is emitted.
+
+Values are stored as is and converted with to_dict() only when a packet is
+built, so a 100 Hz producer costs a dict assignment per tick. Objects
+handed to set() must not be modified afterwards.
+
+TelemetryFanout sends packets to each Socket.IO client separately and
+waits for the client's ack. A client that still has TELEMETRY_MAX_IN_FLIGHT
+packets unacknowledged is skipped, so a slow client loses packets instead
+of building a backlog.
+"""
+
+import threading
+import time
+from functools import partial
+
+import config
+from control_loop import FixedRateLoop
+
+
+TELEMETRY_VERSION = 1
+TELEMETRY_EVENT = "telemetry"
+
+
+class TelemetryBus:
+    def __init__(self, emit, rate_hz: float = config.TELEMETRY_HZ, encode=None,
+                 keyframe_every: int = config.TELEMETRY_KEYFRAME_EVERY):
+        self.emit = emit                # emit(event, data), e.g. TelemetryFanout.send
+        self.encode = encode            # packet -> packet, e.g. wire.encode_telemetry
+        self.keyframe_every = keyframe_every
+        self._lock = threading.Lock()
+        self._values = {}               # key -> latest value (dict or has to_dict)
+        self._lists = {}                # key -> items appended since last packet
+        self._state = {}                # key -> latest value ever set, for keyframes
+        self._keyframe = False          # next packet is a keyframe
+        self._seq = 0
+        self.sent = 0
+        self.keyframes = 0
+        self.loop = FixedRateLoop("telemetry", lambda dt, now: self.flush(now), rate_hz)
+
+    def start(self):
+        self.loop.start()
+
+    def stop(self):
+        self.loop.stop()
+
+    def set(self, key: str, value):
+        """Latest value wins; earlier ones since the last packet are dropped."""
+        with self._lock:
+            self._values[key] = value
+            self._state[key] = value
+
+    def request_keyframe(self):
+        """Make the next packet a keyframe, e.g. when a client connects."""
+        with self._lock:
+            self._keyframe = True
+
+    def append(self, key: str, item):
+        """Every item is kept until the next packet."""
+        with self._lock:
+            self._lists.setdefault(key, []).append(item)
+
+    def flush(self, now: float = None):
+        """Build and emit one packet if anything changed; returns it or None."""
+        with self._lock:
+            keyframe = bool(self._state) and (self._keyframe or (
+                self.keyframe_every > 0 and (self._seq + 1) % self.keyframe_every == 0
+            ))
+            if keyframe:
+                values = dict(self._state)
+                self._keyframe = False
+            elif not self._values and not self._lists:
+                return None
+            else:
+                values = self._values
+            self._values = {}
+            lists, self._lists = self._lists, {}
+
+        self._seq += 1
+        packet = {
+            "v": TELEMETRY_VERSION,
+            "seq": self._seq,
+            "t": now if now is not None else time.monotonic(),
+        }
+        for key, value in values.items():
+            packet[key] = value.to_dict() if hasattr(value, "to_dict") else value
+        packet.update(lists)
+        if self.encode is not None:
+            packet = self.encode(packet)
+        self.emit(TELEMETRY_EVENT, packet)
+        self.sent += 1
+        if keyframe:
+            self.keyframes += 1
+        return packet
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "keyframes": self.keyframes, "loop": self.loop.stats()}
+
+
+class TelemetryFanout:
+    def __init__(self, socketio, max_in_flight: int = config.TELEMETRY_MAX_IN_FLIGHT,
+                 ack_timeout: float = config.TELEMETRY_ACK_TIMEOUT_S):
+        self.socketio = socketio
+        self.max_in_flight = max_in_flight
+        self.ack_timeout = ack_timeout  # forget packets that were never acked
+        self._lock = threading.Lock()
+        self._clients = {}              # sid -> [in flight, time of last send]
+        self.sent = 0
+        self.dropped = 0
+
+    def connect(self, sid):
+        with self._lock:
+            self._clients[sid] = [0, 0.0]
+
+    def disconnect(self, sid):
+        with self._lock:
+            self._clients.pop(sid, None)
+
+    def _ack(self, sid, *args):
+        with self._lock:
+            state = self._clients.get(sid)
+            if state is not None and state[0] > 0:
+                state[0] -= 1
+
+    def send(self, event: str, packet):
+        now = time.monotonic()
+        targets = []
+        with self._lock:
+            for sid, state in self._clients.items():
+                if state[0] >= self.max_in_flight and now - state[1] < self.ack_timeout:
+                    self.dropped += 1
+                    continue
+                if state[0] >= self.max_in_flight:
+                    state[0] = 0        # acks were lost, start over
+                state[0] += 1
+                state[1] = now
+                targets.append(sid)
+        for sid in targets:
+            self.socketio.emit(event, packet, to=sid, callback=partial(self._ack, sid))
+            self.sent += 1
+
+    def stats(self) -> dict:
+        return {"clients": len(self._clients), "sent": self.sent, "dropped": self.dropped}
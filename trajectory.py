@@ -0,0 +1,121 @@
+# trajectory.py
+"""Preallocated ring buffer for (x, y, t) trajectory points.
+
+Storage is struct of arrays (x, y, t as float64). Every point is written
+twice, at i and i + capacity, so the live window is always one contiguous
+slice and can be handed out as a view without copying or wrapping.
+Expiring old points is a binary search on t, which is monotonic.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+from motion_planner import SlidingLinearFit
+
+
+class TrajectoryBuffer:
+    def __init__(self, capacity: int = 500, fit: Optional[SlidingLinearFit] = None):
+        self.capacity = capacity
+        self._x = np.zeros(2 * capacity, dtype=np.float64)
+        self._y = np.zeros(2 * capacity, dtype=np.float64)
+        self._t = np.zeros(2 * capacity, dtype=np.float64)
+        self._end = 0      # next write index in [0, capacity)
+        self._n = 0
+
+        # running regression kept in sync with the window (optional)
+        self.fit = fit
+
+    # ------------------------------------------------------------------
+    # sequence protocol, enough for MotionPlanner.compute
+    # ------------------------------------------------------------------
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, i: int):
+        n = self._n
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("trajectory index out of range")
+        j = self._start + i
+        return float(self._x[j]), float(self._y[j]), float(self._t[j])
+
+    @property
+    def _start(self) -> int:
+        return (self._end - self._n) % self.capacity
+
+    # ------------------------------------------------------------------
+    # zero copy views of the live window (valid until the next append)
+    # ------------------------------------------------------------------
+    @property
+    def xs(self):
+        s = self._start
+        return self._x[s:s + self._n]
+
+    @property
+    def ys(self):
+        s = self._start
+        return self._y[s:s + self._n]
+
+    @property
+    def ts(self):
+        s = self._start
+        return self._t[s:s + self._n]
+
+    def snapshot(self):
+        """Copies of (xs, ys, ts) that are safe to hand to another thread."""
+        s = self._start
+        e = s + self._n
+        return self._x[s:e].copy(), self._y[s:e].copy(), self._t[s:e].copy()
+
+    def to_list(self):
+        """[[x, y, t], ...] for JSON consumers."""
+        xs, ys, ts = self.snapshot()
+        return np.column_stack((xs, ys, ts)).tolist()
+
+    # ------------------------------------------------------------------
+    # mutation
+    # ------------------------------------------------------------------
+    def append(self, x: float, y: float, t: float):
+        if self._n == self.capacity:
+            # evict the oldest point explicitly so the fit sees it leave
+            s = self._start
+            if self.fit is not None:
+                self.fit.remove(self._x[s], self._y[s])
+            self._n -= 1
+
+        e = self._end
+        m = e + self.capacity
+        self._x[e] = self._x[m] = x
+        self._y[e] = self._y[m] = y
+        self._t[e] = self._t[m] = t
+        self._end = (e + 1) % self.capacity
+        self._n += 1
+
+        if self.fit is not None:
+            self.fit.add(x, y)
+
+    def expire(self, cutoff: float) -> int:
+        """Drop points with t < cutoff; returns how many were dropped."""
+        if self._n == 0:
+            return 0
+        s = self._start
+        ts = self._t[s:s + self._n]
+        k = int(np.searchsorted(ts, cutoff, side="left"))
+        if k == 0:
+            return 0
+
+        if self.fit is not None:
+            if k == self._n:
+                self.fit.reset()
+            else:
+                for x, y in zip(self._x[s:s + k].tolist(), self._y[s:s + k].tolist()):
+                    self.fit.remove(x, y)
+        self._n -= k
+        return k
+
+    def clear(self):
+        self._n = 0
+        if self.fit is not None:
+            self.fit.reset()
@@ -0,0 +1,153 @@
+# web_bridge.py
+"""Channels between the real-time process and the dashboard web process.
+
+In split mode (config.WEB_SPLIT_PROCESS) the camera, detection, planning and
+serial link live in one process and Flask / Socket.IO in another, so
+dashboard traffic can't take GIL time from the control loop.
+
+- Raw frames go through a shared memory slot (FrameChannel) guarded by a
+  sequence lock: the writer never waits on the reader, and the reader retries
+  if it caught a frame half written. The web process encodes them, so stream
+  profiles, full resolution /snapshot and encode / send metrics work as in
+  the single process mode.
+- Telemetry (the coalesced 'telemetry' packets and the few one-off events)
+  goes through a bounded multiprocessing queue. TelemetryLink has the same emit() signature as
+  SocketIO, and drops events instead of blocking when the web side lags.
+- Dashboard commands (manual_drive, toggle_tracking, ...) come back through a
+  second queue and are dispatched on a thread in the real-time process.
+"""
+
+import queue
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from frame_hub import FrameHub
+
+
+HEADER_BYTES = 32       # uint64 write counter, uint64 seq, float64 capture time, spare
+
+
+class FrameChannel:
+    """Single latest-frame slot in shared memory (one writer, one reader).
+
+    Carries the raw frame, so the web process can encode every stream
+    profile and full resolution snapshots itself.
+    """
+
+    def __init__(self, shape, name: str = None, cond=None):
+        self.shape = tuple(shape)
+        nbytes = int(np.prod(self.shape))
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=HEADER_BYTES + nbytes)
+            self.owner = True
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.name = self._shm.name
+        self._header = np.ndarray((2,), dtype=np.uint64, buffer=self._shm.buf[:16])
+        self._time = np.ndarray((1,), dtype=np.float64, buffer=self._shm.buf[16:24])
+        self._data = np.ndarray(self.shape, dtype=np.uint8,
+                                buffer=self._shm.buf[HEADER_BYTES:HEADER_BYTES + nbytes])
+        self._cond = cond           # multiprocessing.Condition shared by both ends
+        self.written = 0
+        self.mismatched = 0         # frames of another shape, not written
+
+    def write(self, frame, seq: int, timestamp: float = None) -> bool:
+        if frame.shape != self.shape:
+            self.mismatched += 1
+            return False
+        counter = int(self._header[0])
+        self._header[0] = counter + 1           # odd: write in progress
+        np.copyto(self._data, frame)
+        self._header[1] = seq
+        self._time[0] = timestamp if timestamp is not None else np.nan
+        self._header[0] = counter + 2           # even: consistent
+        self.written += 1
+        if self._cond is not None:
+            with self._cond:
+                self._cond.notify_all()
+        return True
+
+    def read(self, out, last_counter: int = -1):
+        """Copy a newer frame into out.
+
+        Returns (seq, capture time or None, counter), or (-1, None,
+        last_counter) if there is no newer consistent frame.
+        """
+        for _ in range(3):
+            before = int(self._header[0])
+            if before == last_counter or before == 0:
+                return -1, None, last_counter
+            if before & 1:
+                time.sleep(0.0005)
+                continue
+            seq = int(self._header[1])
+            timestamp = float(self._time[0])
+            np.copyto(out, self._data)
+            if int(self._header[0]) == before:
+                return seq, (None if np.isnan(timestamp) else timestamp), before
+        return -1, None, last_counter
+
+    def wait(self, timeout: float):
+        if self._cond is None:
+            time.sleep(timeout)
+            return
+        with self._cond:
+            self._cond.wait(timeout)
+
+    def close(self):
+        del self._header, self._time, self._data
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
+
+
+class SharedFrameSink(FrameHub):
+    """FrameHub for the real-time process: copies frames into a FrameChannel.
+
+    Encoding happens in the web process, per stream profile, so the
+    real-time process only pays for one memcpy per frame. The viewer count
+    (plus pending snapshots) is kept by the web process in a shared integer,
+    so the presentation stage still skips drawing and copying with nobody
+    watching.
+    """
+
+    def __init__(self, channel: FrameChannel, subscribers):
+        super().__init__()
+        self.channel = channel
+        self._shared_subscribers = subscribers   # multiprocessing.Value('i')
+
+    @property
+    def subscribers(self) -> int:
+        return self._shared_subscribers.value
+
+    def publish_frame(self, frame, seq: int, timestamp: float = None) -> bool:
+        if not self.has_subscribers:
+            return False
+        return self.channel.write(frame, seq, timestamp)
+
+    def stats(self) -> dict:
+        out = super().stats()
+        out["mismatched"] = self.channel.mismatched
+        return out
+
+
+class TelemetryLink:
+    """Stand-in for SocketIO.emit that forwards events to the web process."""
+
+    def __init__(self, events):
+        self.events = events
+        self.sent = 0
+        self.dropped = 0
+
+    def emit(self, event: str, data=None, to=None, **kwargs):
+        try:
+            self.events.put_nowait((event, data, to))
+            self.sent += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "dropped": self.dropped}
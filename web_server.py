@@ -0,0 +1,154 @@
+# web_server.py
+"""Dashboard web process for the split deployment mode.
+
+Serves index.html, /video_feed and Socket.IO. It never touches the camera,
+detector or serial port: raw frames arrive through a FrameChannel and are
+encoded here per stream profile, telemetry events come through a queue, and
+dashboard commands are sent back to the real-time process through another
+queue. See web_bridge.py.
+
+The encode / send histograms are recorded here and sent back once per
+METRICS_EMIT_S, so /metrics and pipeline_stats (both rendered by the
+real-time process) include them.
+"""
+
+import os
+import queue
+import threading
+import time
+
+from flask import Flask, render_template, request, Response
+from flask_socketio import SocketIO
+
+import config
+from frame_hub import FrameHub, StreamProfile
+from frame_pool import FramePool
+from metrics import METRICS_TEXT_EVENT, WEB_METRICS_EVENT, WEB_STAGES, PipelineMetrics
+from telemetry import TELEMETRY_EVENT, TelemetryFanout
+from web_bridge import FrameChannel
+
+
+# Socket.IO events forwarded to the real-time process
+COMMAND_EVENTS = ("manual_drive", "toggle_tracking", "set_detector_profile", "get_trajectory")
+
+
+def run_web_server(channel_name, frame_shape, frame_cond, subscribers, events, commands,
+                   camera_info: dict, host: str = config.WEB_HOST, port: int = config.WEB_PORT):
+    """Entry point of the web process."""
+    if config.WEB_PROCESS_NICE:
+        try:
+            os.nice(config.WEB_PROCESS_NICE)
+        except OSError:
+            pass
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    app = Flask(__name__, template_folder=os.path.join(current_dir, 'templates'))
+    socketio = SocketIO(app, cors_allowed_origins="*")
+
+    channel = FrameChannel(frame_shape, name=channel_name, cond=frame_cond)
+
+    def set_subscribers(count):
+        subscribers.value = count
+
+    web_metrics = PipelineMetrics()     # encode / send only, see pump_metrics
+    hub = FrameHub(on_subscribers=set_subscribers, metrics=web_metrics)
+    fanout = TelemetryFanout(socketio)
+    metrics_text = [""]     # latest /metrics body from the real-time process
+
+    def send_command(event, data=None, sid=None):
+        try:
+            commands.put_nowait((event, data, sid))
+        except queue.Full:
+            print(f"Dropped dashboard command: {event}")
+
+    @app.route('/')
+    def index():
+        return render_template("index.html")
+
+    @app.route('/video_feed')
+    def video_feed():
+        profile = StreamProfile.from_query(request.args)
+        adaptive = request.args.get('adaptive', '1') != '0'
+        return Response(hub.stream(profile, adaptive),
+                        mimetype='multipart/x-mixed-replace; boundary=frame')
+
+    @app.route('/snapshot')
+    def snapshot():
+        jpeg = hub.snapshot()
+        if jpeg is None:
+            return "No frame available", 503
+        return Response(jpeg, mimetype='image/jpeg')
+
+    @app.route('/test')
+    def test():
+        return "Flask is working! If you see this, the server is running."
+
+    @app.route('/camera_info')
+    def camera_info_route():
+        return camera_info
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(metrics_text[0], mimetype='text/plain; version=0.0.4')
+
+    @socketio.on('connect')
+    def handle_connect():
+        print('Client connected to WebSocket')
+        fanout.connect(request.sid)
+        # the real-time process answers this client with the current state
+        send_command('connect', sid=request.sid)
+
+    @socketio.on('disconnect')
+    def handle_disconnect(*args):
+        fanout.disconnect(request.sid)
+
+    def forward(event):
+        def handler(data=None):
+            send_command(event, data, request.sid)
+        return handler
+
+    for event in COMMAND_EVENTS:
+        socketio.on_event(event, forward(event))
+
+    def pump_frames():
+        # the hub keeps the latest frame while viewers encode it, so read
+        # into pooled buffers rather than one that gets overwritten
+        pool = FramePool("web_frames")
+        counter = -1
+        while True:
+            frame = pool.acquire(frame_shape)
+            seq, timestamp, counter = channel.read(frame, counter)
+            if seq < 0:
+                channel.wait(0.5)
+                continue
+            hub.publish_frame(frame, seq, timestamp)
+
+    def pump_metrics():
+        while True:
+            time.sleep(config.METRICS_EMIT_S)
+            send_command(WEB_METRICS_EVENT, web_metrics.export(WEB_STAGES))
+
+    def pump_events():
+        while True:
+            try:
+                event, data, to = events.get()
+            except (EOFError, OSError):
+                break
+            if event == TELEMETRY_EVENT:
+                # per client, skipping clients that fall behind
+                fanout.send(event, data)
+            elif event == METRICS_TEXT_EVENT:
+                metrics_text[0] = data
+            else:
+                socketio.emit(event, data, to=to)
+
+    threading.Thread(target=pump_frames, name="web-frames", daemon=True).start()
+    threading.Thread(target=pump_events, name="web-events", daemon=True).start()
+    threading.Thread(target=pump_metrics, name="web-metrics", daemon=True).start()
+
+    try:
+        socketio.run(app, host=host, port=port, debug=False, allow_unsafe_werkzeug=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        channel.close()
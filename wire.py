@@ -0,0 +1,164 @@
+# wire.py
+"""Binary encodings for dashboard traffic.
+
+Socket.IO sends bytes values as binary attachments, and the browser gets
+them as ArrayBuffers it can wrap in Float32Array views without any JSON
+parsing. Everything here is little endian float32.
+
+Trajectory snapshot ('trajectory_update'):
+
+    header  <HHid  version, point count n, track id (-1: none),
+                   t_ref (monotonic seconds)
+    x       float32[n]
+    y       float32[n]
+    age     float32[n]   t_ref - t, seconds
+
+Times go out relative to t_ref because float32 can't hold monotonic
+seconds to the millisecond after a few hours of uptime.
+
+Telemetry packet, version 2: the same dict as version 1 (see telemetry.py)
+with the fixed-layout values replaced by packed arrays:
+
+    detections  float32[k * 6]   x, y, width, height, track_id, dt
+    motion      float32[5]       has_data, vx, vy, ax, ay
+    fit         float32[5]       has_data, x0, x1, y0, y1 (NaN if none)
+    motor       float32[4]       fl, fr, rl, rr
+    pose        float32[3]       x, y, theta
+
+dt is the detection timestamp minus the packet "t". stats and serial are
+irregular and stay JSON.
+
+Long trajectories are decimated with Largest Triangle Three Buckets down
+to the pixel width of the plot that draws them: more points than pixels
+can't be seen anyway.
+"""
+
+import math
+import struct
+
+import numpy as np
+
+
+TRAJECTORY_VERSION = 1
+TRAJECTORY_HEADER = struct.Struct("<HHid")  # 16 bytes, keeps the arrays 4-byte aligned
+TELEMETRY_BINARY_VERSION = 2
+
+DETECTION_FIELDS = ("x", "y", "width", "height", "track_id")
+MOTION_FIELDS = ("has_data", "vx", "vy", "ax", "ay")
+MOTOR_FIELDS = ("fl", "fr", "rl", "rr")
+POSE_FIELDS = ("x", "y", "theta")
+
+
+# ----------------------------------------------------------------------
+# decimation
+# ----------------------------------------------------------------------
+def lttb_indices(xs, ys, n_out: int) -> np.ndarray:
+    """Indices of the n_out points Largest Triangle Three Buckets keeps.
+
+    Points are bucketed in order (time order for a trajectory); from each
+    bucket the point forming the largest triangle with the previously kept
+    point and the mean of the next bucket is kept, measured in the x/y
+    plane, so corners of the path survive. First and last are always kept.
+    """
+    n = len(xs)
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])
+
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    # n - 2 inner points split into n_out - 2 buckets; the last point is a
+    # bucket of its own so every bucket has a "next" mean
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64).tolist() + [n]
+    counts = np.diff(edges)
+    mean_x = (np.add.reduceat(xs, edges[:-1]) / counts).tolist()
+    mean_y = (np.add.reduceat(ys, edges[:-1]) / counts).tolist()
+
+    # the selection chain is sequential; plain floats beat numpy calls on
+    # buckets of a few points
+    px, py = xs.tolist(), ys.tolist()
+    out = [0]
+    a = 0
+    for i in range(n_out - 2):
+        ax, ay = px[a], py[a]
+        cx, cy = mean_x[i + 1], mean_y[i + 1]
+        best = -1.0
+        for j in range(edges[i], edges[i + 1]):
+            area = abs((ax - cx) * (py[j] - ay) - (ax - px[j]) * (cy - ay))
+            if area > best:
+                best, a = area, j
+        out.append(a)
+    out.append(n - 1)
+    return np.asarray(out, dtype=np.int64)
+
+
+# ----------------------------------------------------------------------
+# trajectory snapshots
+# ----------------------------------------------------------------------
+def encode_trajectory(xs, ys, ts, max_points: int, t_ref: float = None,
+                      track_id: int = None) -> bytes:
+    """Pack a trajectory, decimated to at most max_points."""
+    n = len(xs)
+    if n and t_ref is None:
+        t_ref = float(ts[-1])
+    keep = lttb_indices(xs, ys, max_points)
+    count = len(keep)
+    out = bytearray(TRAJECTORY_HEADER.size + 12 * count)
+    TRAJECTORY_HEADER.pack_into(out, 0, TRAJECTORY_VERSION, count,
+                                -1 if track_id is None else track_id, t_ref or 0.0)
+    body = np.frombuffer(out, dtype=np.float32, offset=TRAJECTORY_HEADER.size).reshape(3, count)
+    if count:
+        body[0] = np.asarray(xs)[keep]
+        body[1] = np.asarray(ys)[keep]
+        body[2] = t_ref - np.asarray(ts)[keep]
+    return bytes(out)
+
+
+def decode_trajectory(data: bytes):
+    """Inverse of encode_trajectory: (xs, ys, ts) float arrays."""
+    version, count, _, t_ref = TRAJECTORY_HEADER.unpack_from(data, 0)
+    if version != TRAJECTORY_VERSION:
+        raise ValueError(f"unsupported trajectory version {version}")
+    body = np.frombuffer(data, dtype=np.float32, count=3 * count,
+                         offset=TRAJECTORY_HEADER.size).reshape(3, count)
+    return body[0].astype(np.float64), body[1].astype(np.float64), t_ref - body[2].astype(np.float64)
+
+
+# ----------------------------------------------------------------------
+# telemetry packets
+# ----------------------------------------------------------------------
+def _pack(values) -> bytes:
+    return np.asarray(values, dtype=np.float32).tobytes()
+
+
+def _nan(value) -> float:
+    return math.nan if value is None else value
+
+
+def encode_telemetry(packet: dict) -> dict:
+    """Turn a version 1 telemetry packet into version 2 (in place)."""
+    packet["v"] = TELEMETRY_BINARY_VERSION
+    t = packet["t"]
+
+    detections = packet.get("detections")
+    if detections is not None:
+        packet["detections"] = _pack([
+            [_nan(d.get(k)) for k in DETECTION_FIELDS] + [d.get("timestamp", t) - t]
+            for d in detections
+        ])
+    motion = packet.get("motion")
+    if motion is not None:
+        packet["motion"] = _pack([float(motion[k]) for k in MOTION_FIELDS])
+    fit = packet.get("fit")
+    if fit is not None:
+        line_x = fit.get("line_x") or (None, None)
+        line_y = fit.get("line_y") or (None, None)
+        packet["fit"] = _pack([float(fit["has_data"])] + [_nan(v) for v in (*line_x, *line_y)])
+    motor = packet.get("motor")
+    if motor is not None:
+        packet["motor"] = _pack([motor[k] for k in MOTOR_FIELDS])
+    pose = packet.get("pose")
+    if pose is not None:
+        packet["pose"] = _pack([pose[k] for k in POSE_FIELDS])
+    return packet